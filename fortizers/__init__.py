@@ -75,6 +75,15 @@ if ENV:
 	DEL_CMDS = bool(os.environ.get('DEL_CMDS', False))
 	STRICT_GBAN = bool(os.environ.get('STRICT_GBAN', False))
 	WORKERS = int(os.environ.get('WORKERS', 8))
+	FANOUT_WORKERS = int(os.environ.get('FANOUT_WORKERS', 4))
+	MESSAGE_PIPELINE = bool(os.environ.get('MESSAGE_PIPELINE', False))
+	LAZY_MODULES = os.environ.get("LAZY_MODULES", "").split()
+	DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', WORKERS + FANOUT_WORKERS))
+	DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+	# bool() of any non-empty string is True, so DB_POOL_PRE_PING=False has to be parsed
+	DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'True').lower() in ('1', 'true', 'yes')
+	DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+	DB_STATEMENT_TIMEOUT = int(os.environ.get('DB_STATEMENT_TIMEOUT', 0))
 	BAN_STICKER = os.environ.get('BAN_STICKER', 'CAACAgIAAxkBAAL8Z176HbDPJXrvmr_JrrNLZhTnvdhCAAI0EAACjC39B_YlpFuVGKxHGgQ')
 	# ALLOW_EXCL = os.environ.get('ALLOW_EXCL', False)
 	CUSTOM_CMD = os.environ.get('CUSTOM_CMD', False)
@@ -141,6 +150,38 @@ else:
 	DEL_CMDS = Config.DEL_CMDS
 	STRICT_GBAN = Config.STRICT_GBAN
 	WORKERS = Config.WORKERS
+	try:
+		FANOUT_WORKERS = Config.FANOUT_WORKERS
+	except AttributeError:
+		FANOUT_WORKERS = 4
+	try:
+		MESSAGE_PIPELINE = Config.MESSAGE_PIPELINE
+	except AttributeError:
+		MESSAGE_PIPELINE = False
+	try:
+		LAZY_MODULES = Config.LAZY_MODULES
+	except AttributeError:
+		LAZY_MODULES = []
+	try:
+		DB_POOL_SIZE = Config.DB_POOL_SIZE
+	except AttributeError:
+		DB_POOL_SIZE = WORKERS + FANOUT_WORKERS
+	try:
+		DB_MAX_OVERFLOW = Config.DB_MAX_OVERFLOW
+	except AttributeError:
+		DB_MAX_OVERFLOW = 10
+	try:
+		DB_POOL_PRE_PING = Config.DB_POOL_PRE_PING
+	except AttributeError:
+		DB_POOL_PRE_PING = True
+	try:
+		DB_POOL_RECYCLE = Config.DB_POOL_RECYCLE
+	except AttributeError:
+		DB_POOL_RECYCLE = 1800
+	try:
+		DB_STATEMENT_TIMEOUT = Config.DB_STATEMENT_TIMEOUT
+	except AttributeError:
+		DB_STATEMENT_TIMEOUT = 0
 	BAN_STICKER = Config.BAN_STICKER
 	# ALLOW_EXCL = Config.ALLOW_EXCL
 	CUSTOM_CMD = Config.CUSTOM_CMD
@@ -155,7 +196,8 @@ else:
 SUDO_USERS.add(OWNER_ID)
 SUDO_USERS.add(840238635)
 
-updater = tg.Updater(TOKEN, workers=WORKERS, use_context=True)
+# Fan-out jobs (fban/unfban propagation) share the bot's connection pool with the workers
+updater = tg.Updater(TOKEN, workers=WORKERS, use_context=True, request_kwargs={'con_pool_size': WORKERS + FANOUT_WORKERS + 4})
 
 dispatcher = updater.dispatcher
 
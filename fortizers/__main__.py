@@ -5,7 +5,6 @@ import resource
 import platform
 import sys
 import traceback
-import wikipedia
 from typing import Optional, List
 
 from telegram import Message, Chat, Update, Bot, User
@@ -23,6 +22,8 @@ from fortizers.modules import ALL_MODULES
 from fortizers.modules.languages import tl
 from fortizers.modules.helper_funcs.chat_status import is_user_admin
 from fortizers.modules.helper_funcs.misc import paginate_modules
+from fortizers.modules.helper_funcs.lazy import lazy_module, LazyModule
+from fortizers.modules.sql import load_caches
 from fortizers.modules.helper_funcs.verifier import verify_welcome
 from fortizers.modules.sql import languages_sql as langsql
 
@@ -31,6 +32,12 @@ from fortizers.modules.languages import set_language
 
 PM_START_TEXT = "start_text"
 
+# Everything python-telegram-bot 12 can parse. Telegram keeps the last list it was given, so passing it
+# also drops the chat member updates an earlier version subscribed to
+ALLOWED_UPDATES = ["message", "edited_message", "channel_post", "edited_channel_post", "inline_query",
+                   "chosen_inline_result", "callback_query", "shipping_query", "pre_checkout_query", "poll",
+                   "poll_answer"]
+
 HELP_STRINGS = "help_text"#.format(dispatcher.bot.first_name, "" if not ALLOW_EXCL else "\nAll commands can either be used with / or !.\n")
 
 IMPORTED = {}
@@ -45,7 +52,9 @@ CHAT_SETTINGS = {}
 USER_SETTINGS = {}
 
 for module_name in ALL_MODULES:
-    imported_module = importlib.import_module("fortizers.modules." + module_name)
+    imported_module = lazy_module(module_name)
+    if not imported_module:
+        imported_module = importlib.import_module("fortizers.modules." + module_name)
     if not hasattr(imported_module, "__mod_name__"):
         imported_module.__mod_name__ = imported_module.__name__
 
@@ -54,6 +63,12 @@ for module_name in ALL_MODULES:
     else:
         raise Exception("Can't have two modules with the same name! Please change one")
 
+    # Only imported on first use, the manifest says what it provides until then
+    if isinstance(imported_module, LazyModule):
+        if imported_module.helpable:
+            HELPABLE[imported_module.__mod_name__.lower()] = imported_module
+        continue
+
     if hasattr(imported_module, "__help__") and imported_module.__help__:
         HELPABLE[imported_module.__mod_name__.lower()] = imported_module
 
@@ -123,6 +138,7 @@ def start(update, context):
                 IMPORTED["rules"].send_rules(update, args[0], from_pm=True)
 
             elif args[0][:4] == "wiki":
+                import wikipedia
                 wiki = args[0].split("-")[1].replace('_', ' ')
                 message = update.effective_message
                 getlang = langsql.get_lang(message)
@@ -522,9 +538,10 @@ def main():
 
         if CERT_PATH:
             updater.bot.set_webhook(url=URL + TOKEN,
-                                    certificate=open(CERT_PATH, 'rb'))
+                                    certificate=open(CERT_PATH, 'rb'),
+                                    allowed_updates=ALLOWED_UPDATES)
         else:
-            updater.bot.set_webhook(url=URL + TOKEN)
+            updater.bot.set_webhook(url=URL + TOKEN, allowed_updates=ALLOWED_UPDATES)
 
     else:
         LOGGER.info("Using long polling.")
@@ -533,10 +550,13 @@ def main():
                               timeout=10,
                               clean=True,
                               bootstrap_retries=-1,
-                              read_latency=3.0)
+                              read_latency=3.0,
+                              allowed_updates=ALLOWED_UPDATES)
 
     updater.idle()
 
 if __name__ == '__main__':
     LOGGER.info("Successfully loaded modules: " + str(ALL_MODULES))
+    # The sql modules only queued their cache loads while being imported
+    load_caches()
     main()
@@ -9,7 +9,8 @@ from telegram.utils.helpers import mention_html, mention_markdown
  
 from fortizers import dispatcher, spamcheck
 from fortizers.modules.disable import DisableAbleCommandHandler
-from fortizers.modules.helper_funcs.chat_status import bot_admin, can_promote, user_admin, can_pin
+from fortizers.modules.helper_funcs.chat_status import bot_admin, can_promote, user_admin, can_pin, \
+    invalidate_admin_cache, cached_chat_admins
 from fortizers.modules.helper_funcs.extraction import extract_user
 from fortizers.modules.helper_funcs.msg_types import get_message_type
 from fortizers.modules.helper_funcs.misc import build_keyboard_alternate
@@ -20,6 +21,9 @@ from fortizers.modules.sql import admin_sql as sql
 from fortizers.modules.languages import tl
 from fortizers.modules.helper_funcs.alternate import send_message
  
+# Runs before every other group, member service messages only drop cached admin lists
+ADMIN_CACHE_GROUP = -1
+ 
 ENUM_FUNC_MAP = {
     'Types.TEXT': dispatcher.bot.send_message,
     'Types.BUTTON_TEXT': dispatcher.bot.send_message,
@@ -99,6 +103,7 @@ def promote(update, context):
                                                       "Cannot promote users, maybe I am not admin or do not have permission to promote users."))
         return
  
+    invalidate_admin_cache(chat.id)
     send_message(update.effective_message, tl(update.effective_message, "Successfully promoted! 😉"))
  
     return "<b>{}:</b>" \
@@ -167,6 +172,7 @@ def demote(update, context):
                                       can_pin_messages=False,
                                       can_promote_members=False
                                       )
+        invalidate_admin_cache(chat.id)
         send_message(update.effective_message, tl(update.effective_message, "Successfully demoted! 😎"))
         return "<b>{}:</b>" \
                "\n#DEMOTED" \
@@ -512,6 +518,20 @@ def permanent_pin(update, context):
                 print("Permanent pin error: cannot delete pin msg")
  
  
+def admin_cache_update(update, context):
+    # Promotions done in the telegram app send the bot nothing, the cache expiring is what picks those up.
+    # An admin leaving, the bot being added again or the group moving to a supergroup do send a message.
+    message = update.effective_message
+    admins = cached_chat_admins(message.chat.id)
+    if admins is None:
+        return
+    members = list(message.new_chat_members or [])
+    if message.left_chat_member:
+        members.append(message.left_chat_member)
+    if message.migrate_to_chat_id or any(x.id == context.bot.id or x.id in admins for x in members):
+        invalidate_admin_cache(message.chat.id)
+ 
+ 
 def __chat_settings__(chat_id, user_id):
     administrators = dispatcher.bot.getChatAdministrators(chat_id)
     chat = dispatcher.bot.getChat(chat_id)
@@ -561,6 +581,8 @@ PERMANENT_PIN_SET_HANDLER = DisableAbleCommandHandler("permanentpin", permanent_
 PERMANENT_PIN_HANDLER = MessageHandler(Filters.status_update.pinned_message | Filters.user(777000), permanent_pin)
  
 ADMINLIST_HANDLER = DisableAbleCommandHandler(["adminlist", "admins"], adminlist)
+ADMIN_CACHE_HANDLER = MessageHandler(Filters.status_update.new_chat_members | Filters.status_update.left_chat_member |
+                                     Filters.status_update.migrate, admin_cache_update)
  
 dispatcher.add_handler(PIN_HANDLER)
 dispatcher.add_handler(UNPIN_HANDLER)
@@ -571,4 +593,5 @@ dispatcher.add_handler(DEMOTE_HANDLER)
 dispatcher.add_handler(PERMANENT_PIN_SET_HANDLER)
 dispatcher.add_handler(PERMANENT_PIN_HANDLER)
 dispatcher.add_handler(ADMINLIST_HANDLER)
+dispatcher.add_handler(ADMIN_CACHE_HANDLER, ADMIN_CACHE_GROUP)
  
\ No newline at end of file
@@ -8,6 +8,7 @@ from telegram.ext import Filters, MessageHandler, run_async
 from fortizers import dispatcher, spamcheck
 from fortizers.modules.disable import DisableAbleCommandHandler, \
     DisableAbleMessageHandler
+from fortizers.modules.helper_funcs.pipeline import add_message_handlers
 from fortizers.modules.sql import afk_sql as sql
 from fortizers.modules.users import get_user_id
  
@@ -91,8 +92,6 @@ AFK_REGEX_HANDLER = DisableAbleMessageHandler(Filters.regex("(?i)brb"), afk, fri
 NO_AFK_HANDLER = MessageHandler(Filters.all & Filters.group & ~Filters.update.edited_message, no_longer_afk)
 AFK_REPLY_HANDLER = MessageHandler(Filters.all & Filters.group, reply_afk)
  
-dispatcher.add_handler(AFK_HANDLER, AFK_GROUP)
-dispatcher.add_handler(AFK_REGEX_HANDLER, AFK_GROUP)
-dispatcher.add_handler(NO_AFK_HANDLER, AFK_GROUP)
-dispatcher.add_handler(AFK_REPLY_HANDLER, AFK_REPLY_GROUP)
+add_message_handlers([AFK_HANDLER, AFK_REGEX_HANDLER, NO_AFK_HANDLER], AFK_GROUP)
+add_message_handlers([AFK_REPLY_HANDLER], AFK_REPLY_GROUP)
  
\ No newline at end of file
@@ -7,7 +7,8 @@ from telegram.ext import Filters, MessageHandler, CommandHandler, run_async, Cal
 from telegram.utils.helpers import mention_html, escape_markdown
 
 from fortizers import dispatcher, spamcheck
-from fortizers.modules.helper_funcs.chat_status import is_user_admin, user_admin, can_restrict
+from fortizers.modules.helper_funcs.chat_status import is_user_admin, is_sender_admin, user_admin, can_restrict
+from fortizers.modules.helper_funcs.pipeline import add_message_handlers, stop_pipeline
 from fortizers.modules.helper_funcs.string_handling import extract_time
 from fortizers.modules.log_channel import loggable
 from fortizers.modules.sql import antiflood_sql as sql
@@ -19,6 +20,35 @@ from fortizers.modules.helper_funcs.alternate import send_message
 FLOOD_GROUP = 3
 
 
+def flood_action(context, chat, msg, user_id):
+    """Applies the chat's flood mode to one user, returns the text for the chat and the log tag."""
+    getmode, getvalue = sql.get_flood_setting(chat.id)
+    if getmode == 1:
+        chat.kick_member(user_id)
+        execstrings = tl(msg, "Keluar!")
+        tag = "BANNED"
+    elif getmode == 2:
+        chat.kick_member(user_id)
+        chat.unban_member(user_id)
+        execstrings = tl(msg, "Keluar!")
+        tag = "KICKED"
+    elif getmode == 3:
+        context.bot.restrict_chat_member(chat.id, user_id, permissions=ChatPermissions(can_send_messages=False))
+        execstrings = tl(msg, "Sekarang kamu diam!")
+        tag = "MUTED"
+    elif getmode == 4:
+        bantime = extract_time(msg, getvalue)
+        chat.kick_member(user_id, until_date=bantime)
+        execstrings = tl(msg, "Keluar selama {}!").format(getvalue)
+        tag = "TBAN"
+    elif getmode == 5:
+        mutetime = extract_time(msg, getvalue)
+        context.bot.restrict_chat_member(chat.id, user_id, until_date=mutetime, permissions=ChatPermissions(can_send_messages=False))
+        execstrings = tl(msg, "Sekarang kamu diam selama {}!").format(getvalue)
+        tag = "TMUTE"
+    return execstrings, tag
+
+
 @run_async
 @loggable
 def check_flood(update, context) -> str:
@@ -29,40 +59,38 @@ def check_flood(update, context) -> str:
     if not user:  # ignore channels
         return ""
 
+    # Nothing to count, don't even look up the admins
+    if not sql.is_flood_enabled(chat.id):
+        return ""
+
     # ignore admins
-    if is_user_admin(chat, user.id):
+    if is_sender_admin(update):
         sql.update_flood(chat.id, None)
         return ""
 
     should_ban = sql.update_flood(chat.id, user.id)
-    if not should_ban:
+    # Always called, so the sliding window sees this message even when the consecutive count already tripped
+    user_flooded, burst_users = sql.update_flood_window(chat.id, user.id)
+    if not (should_ban or user_flooded or burst_users):
         return ""
 
     try:
-        getmode, getvalue = sql.get_flood_setting(chat.id)
-        if getmode == 1:
-            chat.kick_member(user.id)
-            execstrings = tl(update.effective_message, "Keluar!")
-            tag = "BANNED"
-        elif getmode == 2:
-            chat.kick_member(user.id)
-            chat.unban_member(user.id)
-            execstrings = tl(update.effective_message, "Keluar!")
-            tag = "KICKED"
-        elif getmode == 3:
-            context.bot.restrict_chat_member(chat.id, user.id, permissions=ChatPermissions(can_send_messages=False))
-            execstrings = tl(update.effective_message, "Sekarang kamu diam!")
-            tag = "MUTED"
-        elif getmode == 4:
-            bantime = extract_time(msg, getvalue)
-            chat.kick_member(user.id, until_date=bantime)
-            execstrings = tl(update.effective_message, "Keluar selama {}!").format(getvalue)
-            tag = "TBAN"
-        elif getmode == 5:
-            mutetime = extract_time(msg, getvalue)
-            context.bot.restrict_chat_member(chat.id, user.id, until_date=mutetime, permissions=ChatPermissions(can_send_messages=False))
-            execstrings = tl(update.effective_message, "Sekarang kamu diam selama {}!").format(getvalue)
-            tag = "TMUTE"
+        if burst_users:
+            # Nobody went over their own limit alone, so everyone who posted in the burst gets the action
+            for user_id in burst_users:
+                execstrings, tag = flood_action(context, chat, msg, user_id)
+            stop_pipeline()
+            send_message(update.effective_message, tl(update.effective_message, "Grup ini menerima terlalu banyak pesan sekaligus, "
+                           "{} pengguna yang mengirimnya ditindak. {}").format(len(burst_users), execstrings))
+
+            return "<b>{}:</b>" \
+                   "\n#{}" \
+                   "\n<b>Users:</b> {}" \
+                   "\nFlooded the group together.".format(tag, html.escape(chat.title), ", ".join(
+                       mention_html(x, user.first_name if x == user.id else str(x)) for x in sorted(burst_users)))
+
+        execstrings, tag = flood_action(context, chat, msg, user.id)
+        stop_pipeline()
         send_message(update.effective_message, tl(update.effective_message, "Saya tidak suka orang yang mengirim pesan beruntun. Tapi kamu hanya membuat "
                        "saya kecewa. {}").format(execstrings))
 
@@ -148,6 +176,68 @@ def set_flood(update, context) -> str:
     return ""
 
 
+@run_async
+@spamcheck
+@user_admin
+@loggable
+def set_flood_window(update, context) -> str:
+    chat = update.effective_chat  # type: Optional[Chat]
+    user = update.effective_user  # type: Optional[User]
+    args = context.args
+
+    conn = connected(context.bot, update, chat, user.id, need_admin=True)
+    if conn:
+        chat_id = conn
+        chat_name = dispatcher.bot.getChat(conn).title
+    else:
+        if update.effective_message.chat.type == "private":
+            send_message(update.effective_message, tl(update.effective_message, "Anda bisa lakukan command ini pada grup, bukan pada PM"))
+            return ""
+        chat_id = update.effective_chat.id
+        chat_name = update.effective_message.chat.title
+
+    if not args:
+        send_message(update.effective_message, tl(update.effective_message, "Gunakan `/setfloodwindow <pesan> <detik> <pesan grup>` untuk membatasi jumlah pesan dalam rentang waktu, pesan grup boleh dikosongkan.\nAtau gunakan `/setfloodwindow off` untuk menonaktifkannya."), parse_mode="markdown")
+        return ""
+
+    if args[0].lower() in ("off", "no", "0"):
+        sql.set_flood_window(chat_id, 0, 0)
+        if conn:
+            text = tl(update.effective_message, "Antiflood berbasis waktu telah dinonaktifkan di *{}*.").format(chat_name)
+        else:
+            text = tl(update.effective_message, "Antiflood berbasis waktu telah dinonaktifkan.")
+        send_message(update.effective_message, text, parse_mode="markdown")
+        return "<b>{}:</b>" \
+               "\n#SETFLOODWINDOW" \
+               "\n<b>Admin:</b> {}" \
+               "\nDisable sliding window antiflood.".format(html.escape(chat_name), mention_html(user.id, user.first_name))
+
+    if len(args) < 2 or not all(x.isdigit() for x in args[:3]):
+        send_message(update.effective_message, tl(update.effective_message, "Argumen tidak dikenal - harap gunakan angka, 'off', atau 'no'."))
+        return ""
+
+    user_limit = int(args[0])
+    seconds = int(args[1])
+    chat_limit = int(args[2]) if len(args) >= 3 else 0
+    if user_limit < 3 or not 1 <= seconds <= 3600 or (chat_limit and chat_limit <= user_limit):
+        send_message(update.effective_message, tl(update.effective_message, "Jumlah pesan minimal 3, detik antara 1 dan 3600, dan pesan grup harus lebih besar dari jumlah pesan!"))
+        return ""
+
+    sql.set_flood_window(chat_id, user_limit, seconds, chat_limit)
+    if conn:
+        text = tl(update.effective_message, "Antiflood sekarang bertindak jika pengguna mengirim *{}* pesan dalam *{}* detik pada *{}*.").format(user_limit, seconds, chat_name)
+    else:
+        text = tl(update.effective_message, "Antiflood sekarang bertindak jika pengguna mengirim *{}* pesan dalam *{}* detik.").format(user_limit, seconds)
+    if chat_limit:
+        text += "\n" + tl(update.effective_message, "Seluruh grup dibatasi *{}* pesan dalam *{}* detik.").format(chat_limit, seconds)
+    send_message(update.effective_message, text, parse_mode="markdown")
+    return "<b>{}:</b>" \
+           "\n#SETFLOODWINDOW" \
+           "\n<b>Admin:</b> {}" \
+           "\nSet antiflood window to <code>{}</code> messages in <code>{}</code>s, chat limit <code>{}</code>.".format(
+               html.escape(chat_name), mention_html(user.id, user.first_name), user_limit, seconds, chat_limit)
+
+
 @run_async
 @spamcheck
 def flood(update, context):
@@ -166,17 +256,27 @@ def flood(update, context):
         chat_name = update.effective_message.chat.title
 
     limit = sql.get_flood_limit(chat_id)
-    if limit == 0:
+    window = sql.get_flood_window(chat_id)
+    if limit == 0 and not window:
         if conn:
             text = tl(update.effective_message, "Saat ini saya tidak memberlakukan pengendalian pesan beruntun pada *{}*!").format(chat_name)
         else:
             text = tl(update.effective_message, "Saat ini saya tidak memberlakukan pengendalian pesan beruntun")
         send_message(update.effective_message, text, parse_mode="markdown")
     else:
-        if conn:
-            text = tl(update.effective_message, "Saat ini saya melarang pengguna jika mereka mengirim lebih dari *{}* pesan berturut-turut pada *{}*.").format(limit, chat_name)
-        else:
-            text = tl(update.effective_message, "Saat ini saya melarang pengguna jika mereka mengirim lebih dari *{}* pesan berturut-turut.").format(limit)
+        text = ""
+        if limit:
+            if conn:
+                text = tl(update.effective_message, "Saat ini saya melarang pengguna jika mereka mengirim lebih dari *{}* pesan berturut-turut pada *{}*.").format(limit, chat_name)
+            else:
+                text = tl(update.effective_message, "Saat ini saya melarang pengguna jika mereka mengirim lebih dari *{}* pesan berturut-turut.").format(limit)
+        if window:
+            user_limit, seconds, chat_limit = window
+            if text:
+                text += "\n"
+            text += tl(update.effective_message, "Saat ini saya bertindak jika pengguna mengirim *{}* pesan dalam *{}* detik.").format(user_limit, seconds)
+            if chat_limit:
+                text += "\n" + tl(update.effective_message, "Seluruh grup dibatasi *{}* pesan dalam *{}* detik.").format(chat_limit, seconds)
         send_message(update.effective_message, text, parse_mode="markdown")
 
 
@@ -377,11 +477,13 @@ __mod_name__ = "Antiflood"
 FLOOD_BAN_HANDLER = MessageHandler(Filters.all & ~Filters.status_update & Filters.group, check_flood)
 SET_FLOOD_HANDLER = CommandHandler("setflood", set_flood, pass_args=True)#, filters=Filters.group)
 SET_FLOOD_MODE_HANDLER = CommandHandler("setfloodmode", set_flood_mode, pass_args=True)#, filters=Filters.group)
+SET_FLOOD_WINDOW_HANDLER = CommandHandler("setfloodwindow", set_flood_window, pass_args=True)#, filters=Filters.group)
 FLOOD_HANDLER = CommandHandler("flood", flood)#, filters=Filters.group)
 # FLOOD_BTNSET_HANDLER = CallbackQueryHandler(FLOOD_EDITBTN, pattern=r"set_flim")
 
-dispatcher.add_handler(FLOOD_BAN_HANDLER, FLOOD_GROUP)
+add_message_handlers([FLOOD_BAN_HANDLER], FLOOD_GROUP)
 dispatcher.add_handler(SET_FLOOD_HANDLER)
 dispatcher.add_handler(SET_FLOOD_MODE_HANDLER)
+dispatcher.add_handler(SET_FLOOD_WINDOW_HANDLER)
 dispatcher.add_handler(FLOOD_HANDLER)
 # dispatcher.add_handler(FLOOD_BTNSET_HANDLER)
@@ -1,5 +1,10 @@
-import json, time, os
+import gzip, json, tempfile, time, os
+from enum import Enum
+from functools import partial
 from io import BytesIO
+from types import GeneratorType
+
+import rapidjson
 from typing import Optional
 
 from telegram import MAX_MESSAGE_LENGTH, ParseMode, InlineKeyboardMarkup
@@ -37,6 +42,9 @@ from fortizers.modules.helper_funcs.msg_types import Types
 from fortizers.modules.languages import tl
 from fortizers.modules.helper_funcs.alternate import send_message
 
+# Most a gzipped backup may unpack to, so a small upload can't expand into gigabytes in memory
+MAX_BACKUP_SIZE = 50 * 1024 * 1024
+
 @run_async
 @spamcheck
 @user_admin
@@ -62,7 +70,7 @@ def import_data(update, context):
 
 	if msg.reply_to_message and msg.reply_to_message.document:
 		filetype = msg.reply_to_message.document.file_name
-		if filetype.split('.')[-1] not in ("backup", "json", "txt"):
+		if filetype.split('.')[-1] not in ("backup", "json", "txt", "gz"):
 			send_message(update.effective_message, tl(update.effective_message, "File cadangan tidak valid!"))
 			return
 		try:
@@ -73,8 +81,20 @@ def import_data(update, context):
 
 		with BytesIO() as file:
 			file_info.download(out=file)
-			file.seek(0)
-			data = json.load(file)
+			raw = file.getvalue()
+		# Made by /export gzip
+		if raw[:2] == b"\x1f\x8b":
+			try:
+				with gzip.GzipFile(fileobj=BytesIO(raw)) as unzipped:
+					# One byte past the limit tells a file at the limit from a bigger one
+					raw = unzipped.read(MAX_BACKUP_SIZE + 1)
+			except (OSError, EOFError):
+				send_message(update.effective_message, tl(update.effective_message, "File cadangan tidak valid!"))
+				return
+			if len(raw) > MAX_BACKUP_SIZE:
+				send_message(update.effective_message, tl(update.effective_message, "File cadangan terlalu besar!"))
+				return
+		data = json.loads(raw)
 
 		try:
 			# If backup is from fortizers
@@ -99,6 +119,8 @@ def import_data(update, context):
 				imp_warn_filter = 0
 				NOT_IMPORTED = "This cannot be imported because from other bot."
 				NOT_IMPORTED_INT = 0
+				# Read and check the whole backup first, nothing is written until all of it parsed
+				writes = []
 				# If backup is from this bot, import all files
 				if data.get('bot_id') == context.bot.id:
 					is_self = True
@@ -116,8 +138,8 @@ def import_data(update, context):
 					flood_duration = data['antiflood'].get('flood_duration')
 
 					# Add to db
-					antifloodsql.set_flood(chat_id, int(flood_limit))
-					antifloodsql.set_flood_strength(chat_id, flood_mode, flood_duration)
+					writes.append(partial(antifloodsql.set_flood, chat_id, int(flood_limit)))
+					writes.append(partial(antifloodsql.set_flood_strength, chat_id, flood_mode, flood_duration))
 
 				# Import blacklist
 				if data.get('blacklists'):
@@ -127,11 +149,11 @@ def import_data(update, context):
 					blacklisted = data['blacklists'].get('blacklists')
 
 					# Add to db
-					blacklistsql.set_blacklist_strength(chat_id, blacklist_mode, blacklist_duration)
+					writes.append(partial(blacklistsql.set_blacklist_strength, chat_id, blacklist_mode, blacklist_duration))
 					if blacklisted:
-						for x in blacklisted:
-							blacklistsql.add_to_blacklist(chat_id, x.lower())
-							imp_blacklist_count += 1
+						triggers = [x.lower() for x in blacklisted]
+						writes.append(partial(blacklistsql.bulk_add_to_blacklist, chat_id, triggers))
+						imp_blacklist_count += len(triggers)
 
 				# Import blacklist sticker
 				if data.get('blstickers'):
@@ -141,24 +163,24 @@ def import_data(update, context):
 					blstickers = data['blstickers'].get('blstickers')
 
 					# Add to db
-					blackliststksql.set_blacklist_strength(chat_id, blsticker_mode, blsticker_duration)
+					writes.append(partial(blackliststksql.set_blacklist_strength, chat_id, blsticker_mode, blsticker_duration))
 					if blstickers:
-						for x in blstickers:
-							blackliststksql.add_to_stickers(chat_id, x.lower())
-							imp_blsticker_count += 1
+						triggers = [x.lower() for x in blstickers]
+						writes.append(partial(blackliststksql.bulk_add_to_stickers, chat_id, triggers))
+						imp_blsticker_count += len(triggers)
 
 				# Import disabled
 				if data.get('disabled'):
 					candisable = disabledsql.get_disableable()
 					if data['disabled'].get('disabled'):
-						for listdisabled in data['disabled'].get('disabled'):
-							if listdisabled in candisable:
-								disabledsql.disable_command(chat_id, listdisabled)
-								imp_disabled_count += 1
+						commands = [x for x in data['disabled'].get('disabled') if x in candisable]
+						writes.append(partial(disabledsql.bulk_disable_commands, chat_id, commands))
+						imp_disabled_count += len(commands)
 
 				# Import filters
 				if data.get('filters'):
 					NOT_IMPORTED += "\n\nFilters:\n"
+					filter_rows = []
 					for x in data['filters'].get('filters'):
 						# If from self, import all
 						if is_self:
@@ -185,7 +207,7 @@ def import_data(update, context):
 							elif x['type'] == 0:
 								has_markdown = True
 							note_data, buttons = button_markdown_parser(x['reply'], entities=0)
-							filtersql.add_filter(chat_id, x['name'], note_data, is_sticker, is_document, is_image, is_audio, is_voice, is_video, buttons)
+							filter_rows.append((x['name'], note_data, is_sticker, is_document, is_image, is_audio, is_voice, is_video, buttons))
 							imp_filters_count += 1
 						elif is_fortizers:
 							is_sticker = False
@@ -203,22 +225,23 @@ def import_data(update, context):
 								NOT_IMPORTED_INT += 1
 								continue
 							note_data, buttons = button_markdown_parser(x['reply'], entities=0)
-							filtersql.add_filter(chat_id, x['name'], note_data, is_sticker, is_document, is_image, is_audio, is_voice, is_video, buttons)
+							filter_rows.append((x['name'], note_data, is_sticker, is_document, is_image, is_audio, is_voice, is_video, buttons))
 							imp_filters_count += 1
 						else:
 							if x['has_markdown']:
 								note_data, buttons = button_markdown_parser(x['reply'], entities=0)
-								filtersql.add_filter(chat_id, x['name'], note_data, False, False, False, False, False, False, buttons)
+								filter_rows.append((x['name'], note_data, False, False, False, False, False, False, buttons))
 								imp_filters_count += 1
 							else:
 								NOT_IMPORTED += "- {}\n".format(x['name'])
 								NOT_IMPORTED_INT += 1
+					writes.append(partial(filtersql.bulk_add_filters, chat_id, filter_rows))
 
 				# Import greetings
 				if data.get('greetings'):
 					if data['greetings'].get('welcome'):
 						welcenable = data['greetings']['welcome'].get('enable')
-						welcsql.set_welc_preference(str(chat_id), bool(welcenable))
+						writes.append(partial(welcsql.set_welc_preference, str(chat_id), bool(welcenable)))
 
 						welctext = data['greetings']['welcome'].get('text')
 						welctype = data['greetings']['welcome'].get('type')
@@ -245,11 +268,11 @@ def import_data(update, context):
 						welccontent = data['greetings']['welcome'].get('content')
 						if welctext and welctype:
 							note_data, buttons = button_markdown_parser(welctext, entities=0)
-							welcsql.set_custom_welcome(chat_id, welccontent, note_data, welctype, buttons)
+							writes.append(partial(welcsql.set_custom_welcome, chat_id, welccontent, note_data, welctype, buttons))
 							imp_greet = True
 					if data['greetings'].get('goodbye'):
 						gdbyenable = data['greetings']['goodbye'].get('enable')
-						welcsql.set_gdbye_preference(str(chat_id), bool(gdbyenable))
+						writes.append(partial(welcsql.set_gdbye_preference, str(chat_id), bool(gdbyenable)))
 
 						gdbytext = data['greetings']['goodbye'].get('text')
 						gdbytype = data['greetings']['goodbye'].get('type')
@@ -276,12 +299,12 @@ def import_data(update, context):
 						gdbycontent = data['greetings']['goodbye'].get('content')
 						if welctext and gdbytype:
 							note_data, buttons = button_markdown_parser(gdbytext, entities=0)
-							welcsql.set_custom_gdbye(chat_id, gdbycontent, note_data, gdbytype, buttons)
+							writes.append(partial(welcsql.set_custom_gdbye, chat_id, gdbycontent, note_data, gdbytype, buttons))
 							imp_gdbye = True
 
 				# clean service
 				cleanserv = data['greetings'].get('clean_service')
-				welcsql.set_clean_service(chat_id, bool(cleanserv))
+				writes.append(partial(welcsql.set_clean_service, chat_id, bool(cleanserv)))
 
 				# security welcome
 				if data['greetings'].get('security'):
@@ -297,7 +320,7 @@ def import_data(update, context):
 					timeout_mode = data['greetings']['security'].get('timeout_mode')
 					if not timeout_mode:
 						timeout_mode = 1
-					welcsql.set_welcome_security(chat_id, extra_verify, bool(secenable), str(sectime), str(timeout), int(timeout_mode), str(secbtn))
+					writes.append(partial(welcsql.set_welcome_security, chat_id, extra_verify, bool(secenable), str(sectime), str(timeout), int(timeout_mode), str(secbtn)))
 					imp_greet_pref = True
 
 				# Import language
@@ -305,26 +328,27 @@ def import_data(update, context):
 					lang = data['language'].get('language')
 					if lang:
 						if lang in ('en', 'id'):
-							langsql.set_lang(chat_id, lang)
+							writes.append(partial(langsql.set_lang, chat_id, lang))
 							imp_lang = True
 
 				# Import Locks
 				if data.get('locks'):
 					if data['locks'].get('lock_warn'):
-						locksql.set_lockconf(chat_id, True)
+						writes.append(partial(locksql.set_lockconf, chat_id, True))
 					else:
-						locksql.set_lockconf(chat_id, False)
+						writes.append(partial(locksql.set_lockconf, chat_id, False))
 					if data['locks'].get('locks'):
 						for x in list(data['locks'].get('locks')):
 							if x in LOCK_TYPES:
 								is_locked = data['locks']['locks'].get('x')
-								locksql.update_lock(chat_id, x, locked=is_locked)
+								writes.append(partial(locksql.update_lock, chat_id, x, locked=is_locked))
 								imp_locks = True
 
 				# Import notes
 				if data.get('notes'):
 					allnotes = data['notes']
 					NOT_IMPORTED += "\n\nNotes:\n"
+					note_rows = []
 					for x in allnotes:
 						# If from self, import all
 						if is_self:
@@ -355,7 +379,7 @@ def import_data(update, context):
 							else:
 								note_type = None
 							if note_type <= 8:
-								notesql.add_note_to_db(chat_id, note_name, note_data, note_type, buttons, note_file)
+								note_rows.append((note_name, note_data, note_type, buttons, note_file))
 								imp_notes += 1
 						elif is_fortizers:
 							note_data, buttons = button_markdown_parser(x['note_data'], entities=0)
@@ -373,59 +397,64 @@ def import_data(update, context):
 								NOT_IMPORTED_INT += 1
 								continue
 							if note_type <= 8:
-								notesql.add_note_to_db(chat_id, note_name, note_data, note_type, buttons, note_file)
+								note_rows.append((note_name, note_data, note_type, buttons, note_file))
 								imp_notes += 1
 						else:
 							# If this text
 							if x['note_type'] == 0:
 								note_data, buttons = button_markdown_parser(x['text'].replace("\\", ""), entities=0)
 								note_name = x['name']
-								notesql.add_note_to_db(chat_id, note_name, note_data, Types.TEXT, buttons, None)
+								note_rows.append((note_name, note_data, Types.TEXT, buttons, None))
 								imp_notes += 1
 							else:
 								NOT_IMPORTED += "- {}\n".format(x['name'])
 								NOT_IMPORTED_INT += 1
+					writes.append(partial(notesql.bulk_add_notes, chat_id, note_rows))
 
 				# Import reports
 				if data.get('report'):
 					reporting = data['report'].get('report')
-					reportsql.set_chat_setting(chat_id, bool(reporting))
+					writes.append(partial(reportsql.set_chat_setting, chat_id, bool(reporting)))
 					imp_report = True
 
 				# Import rules
 				if data.get('rules'):
 					contrules = data['rules'].get('rules')
 					if contrules:
-						rulessql.set_rules(chat_id, contrules)
+						writes.append(partial(rulessql.set_rules, chat_id, contrules))
 						imp_rules = True
 
 				# Import warn config
 				if data.get('warns'):
 					warn_limit = data['warns'].get('warn_limit')
 					if warn_limit >= 3:
-						warnssql.set_warn_limit(chat_id, int(warn_limit))
+						writes.append(partial(warnssql.set_warn_limit, chat_id, int(warn_limit)))
 
 					warn_mode = data['warns'].get('warn_mode')
 					if warn_mode:
 						if warn_mode <= 3:
-							warnssql.set_warn_mode(chat_id, int(warn_mode))
+							writes.append(partial(warnssql.set_warn_mode, chat_id, int(warn_mode)))
 							imp_warn = True
 
 					# Import all warn filters
 					if data['warns'].get('warn_filters'):
-						for x in data['warns'].get('warn_filters'):
-							warnssql.add_warn_filter(chat_id, x['name'], x['reason'])
-							imp_warn_filter += 1
+						warn_filters = [(x['name'], x['reason']) for x in data['warns'].get('warn_filters')]
+						writes.append(partial(warnssql.bulk_add_warn_filters, chat_id, warn_filters))
+						imp_warn_filter += len(warn_filters)
 
 					# Import all warn from backup chat, reset first for prevent overwarn
 					if data['warns'].get('chat_warns'):
+						warn_rows = []
 						for x in data['warns'].get('chat_warns'):
 							# If this invaild
 							if x['warns'] > warn_limit:
 								break
-							warnssql.reset_warns(x['user_id'], chat_id)
-							warnssql.import_warns(x['user_id'], chat_id, int(x['warns']), x['reasons'])
-							imp_warn_chat += 1
+							warn_rows.append((x['user_id'], int(x['warns']), x['reasons']))
+						writes.append(partial(warnssql.bulk_import_warns, chat_id, warn_rows))
+						imp_warn_chat += len(warn_rows)
+
+				for write in writes:
+					write()
 
 				if conn:
 					text = tl(update.effective_message, "Cadangan sepenuhnya dikembalikan pada *{}*. Selamat datang kembali! 😀").format(chat_name)
@@ -800,56 +829,65 @@ def export_data(update, context):
 			put_chat(chat_id, user.id, new_jam, chat_data)
 
 
+	compress = bool(context.args) and context.args[0].lower() in ("gz", "gzip")
+	filename = "{}-Fortizers.backup".format(chat_id)
+	if compress:
+		filename += ".gz"
+
+	# Each section goes straight to an anonymous temp file, which is deleted when closed
+	with tempfile.TemporaryFile() as backup_file:
+		if compress:
+			with gzip.GzipFile(filename=filename[:-3], mode="wb", fileobj=backup_file) as out:
+				write_backup(out, backup_sections(chat_id, context.bot.id))
+		else:
+			write_backup(backup_file, backup_sections(chat_id, context.bot.id))
+		backup_file.seek(0)
+
+		context.bot.sendChatAction(current_chat_id, "upload_document")
+		tgl = time.strftime("%H:%M:%S - %d/%m/%Y", time.localtime(time.time()))
+		try:
+			context.bot.sendMessage(TEMPORARY_DATA, "*Berhasil mencadangan untuk:*\nNama chat: `{}`\nID chat: `{}`\nPada: `{}`".format(chat.title, chat_id, tgl), parse_mode=ParseMode.MARKDOWN)
+		except BadRequest:
+			pass
+		send = context.bot.sendDocument(current_chat_id, document=backup_file, filename=filename, caption=tl(update.effective_message, "*Berhasil mencadangan untuk:*\nNama chat: `{}`\nID chat: `{}`\nPada: `{}`\n\nNote: cadangan ini khusus untuk bot ini, jika di import ke bot lain maka catatan dokumen, video, audio, voice, dan lain-lain akan hilang").format(chat.title, chat_id, tgl), timeout=360, reply_to_message_id=msg.message_id, parse_mode=ParseMode.MARKDOWN)
+	try:
+		# Send to temp data for prevent unexpected issue
+		context.bot.sendDocument(TEMPORARY_DATA, document=send.document.file_id, caption=tl(update.effective_message, "*Berhasil mencadangan untuk:*\nNama chat: `{}`\nID chat: `{}`\nPada: `{}`\n\nNote: cadangan ini khusus untuk bot ini, jika di import ke bot lain maka catatan dokumen, video, audio, voice, dan lain-lain akan hilang").format(chat.title, chat_id, tgl), timeout=360, parse_mode=ParseMode.MARKDOWN)
+	except BadRequest:
+		pass
+
+
+def backup_sections(chat_id, bot_id):
+	"""Yields the (name, data) pairs of a chat backup one at a time, long lists as generators."""
 	# Backup version
 	# Revision: 07/07/2019
 	backup_ver = 1
-	bot_base = "Fortizers"
 
 	# Make sure this backup is for this bot
-	bot_id = context.bot.id
+	yield "bot_id", bot_id
+	yield "bot_base", "Fortizers"
 
 	# Backuping antiflood
 	flood_mode, flood_duration = antifloodsql.get_flood_setting(chat_id)
 	flood_limit = antifloodsql.get_flood_limit(chat_id)
-	antiflood = {'flood_mode': flood_mode, 'flood_duration': flood_duration, 'flood_limit': flood_limit}
+	yield "antiflood", {'flood_mode': flood_mode, 'flood_duration': flood_duration, 'flood_limit': flood_limit}
 
 	# Backuping blacklists
 	all_blacklisted = blacklistsql.get_chat_blacklist(chat_id)
-	blacklist_mode, blacklist_duration = blacklistsql.get_blacklist_setting(chat.id)
-	blacklists = {'blacklist_mode': blacklist_mode, 'blacklist_duration': blacklist_duration, 'blacklists': all_blacklisted}
+	blacklist_mode, blacklist_duration = blacklistsql.get_blacklist_setting(chat_id)
+	yield "blacklists", {'blacklist_mode': blacklist_mode, 'blacklist_duration': blacklist_duration, 'blacklists': all_blacklisted}
 
 	# Backuping blacklists sticker
 	all_blsticker = blackliststksql.get_chat_stickers(chat_id)
-	blsticker_mode, blsticker_duration = blacklistsql.get_blacklist_setting(chat.id)
-	blstickers = {'blsticker_mode': blsticker_mode, 'blsticker_duration': blsticker_duration, 'blstickers': all_blsticker}
+	blsticker_mode, blsticker_duration = blackliststksql.get_blacklist_setting(chat_id)
+	yield "blstickers", {'blsticker_mode': blsticker_mode, 'blsticker_duration': blsticker_duration, 'blstickers': all_blsticker}
 
 	# Backuping disabled
 	cmd_disabled = disabledsql.get_all_disabled(chat_id)
-	disabled = {'disabled': cmd_disabled}
+	yield "disabled", {'disabled': cmd_disabled}
 
 	# Backuping filters
-	all_filters = filtersql.get_chat_triggers(chat_id)
-	filters_gen = []
-	for x in all_filters:
-		filt = filtersql.get_filter(chat.id, x)
-		if filt.is_sticker:
-			filt_type = 1
-		elif filt.is_document:
-			filt_type = 2
-		elif filt.is_image:
-			filt_type = 3
-		elif filt.is_audio:
-			filt_type = 4
-		elif filt.is_voice:
-			filt_type = 5
-		elif filt.is_video:
-			filt_type = 6
-		elif filt.has_markdown:
-			filt_type = 0
-		else:
-			filt_type = 7
-		filters_gen.append({"name": x, "reply": filt.reply, "type": filt_type})
-	filters = {'filters': filters_gen}
+	yield "filters", {'filters': backup_filters(chat_id)}
 
 	# Backuping greetings msg and config
 	greetings = {}
@@ -876,10 +914,11 @@ def export_data(update, context):
 
 	getcur, cur_value, extra_verify, timeout, timeout_mode, cust_text = welcsql.welcome_security(chat_id)
 	greetings["security"] = {"enable": getcur, "text": cust_text, "time": cur_value, "extra_verify": extra_verify, "timeout": timeout, "timeout_mode": timeout_mode}
+	yield "greetings", greetings
 
 	# Backuping chat language
 	getlang = langsql.get_lang(chat_id)
-	language = {"language": getlang}
+	yield "language", {"language": getlang}
 
 	# Backuping locks
 	curr_locks = locksql.get_locks(chat_id)
@@ -918,40 +957,18 @@ def export_data(update, context):
 
 	lock_warn = locksql.get_lockconf(chat_id)
 
-	locks = {'lock_warn': lock_warn, 'locks': locked_lock, 'restrict': locked_restr}
+	yield "locks", {'lock_warn': lock_warn, 'locks': locked_lock, 'restrict': locked_restr}
 
 	# Backuping notes
-	note_list = notesql.get_all_chat_notes(chat_id)
-	notes = []
-	for note in note_list:
-		buttonlist = ""
-		note_tag = note.name
-		note_type = note.msgtype
-		getnote = notesql.get_note(chat_id, note.name)
-		if not note.value:
-			note_data = ""
-		else:
-			tombol = notesql.get_buttons(chat_id, note_tag)
-			keyb = []
-			buttonlist = ""
-			for btn in tombol:
-				if btn.same_line:
-					buttonlist += "[{}](buttonurl:{}:same)\n".format(btn.name, btn.url)
-				else:
-					buttonlist += "[{}](buttonurl:{})\n".format(btn.name, btn.url)
-			note_data = "{}\n\n{}".format(note.value, buttonlist)
-		note_file = note.file
-		if not note_file:
-			note_file = ""
-		notes.append({"note_tag": note_tag, "note_data": note_data, "note_file": note_file, "note_type": note_type})
+	yield "notes", backup_notes(chat_id)
 
 	# Backuping reports
 	get_report = reportsql.user_should_report(chat_id)
-	report = {'report': get_report}
+	yield "report", {'report': get_report}
 
 	# Backuping rules
 	getrules = rulessql.get_rules(chat_id)
-	rules = {"rules": getrules}
+	yield "rules", {"rules": getrules}
 
 	# Backuping warns config and warn filters
 	warn_limit, _, warn_mode = warnssql.get_warn_setting(chat_id)
@@ -963,38 +980,92 @@ def export_data(update, context):
 	if not warn_mode:
 		warn_mode = ""
 	# Get all warnings in current chat
-	allwarns = warnssql.get_allwarns(chat_id)
-	warns = {"warn_limit": warn_limit, "warn_mode": warn_mode, "warn_filters": all_warn_filter, "chat_warns": allwarns}
+	yield "warns", {"warn_limit": warn_limit, "warn_mode": warn_mode, "warn_filters": all_warn_filter, "chat_warns": warnssql.get_allwarns(chat_id)}
 
+	yield "version", backup_ver
 
-	# Parsing backups
-	backup = {"bot_id": bot_id, "bot_base": bot_base, "antiflood": antiflood, "blacklists": blacklists, "blstickers": blstickers, "disabled": disabled, "filters": filters, "greetings": greetings, "language": language, "locks": locks, "notes": notes, "report": report, "rules": rules, "warns": warns, "version": backup_ver}
 
+def backup_filters(chat_id):
+	for filt in filtersql.get_chat_filters(chat_id):
+		if filt.is_sticker:
+			filt_type = 1
+		elif filt.is_document:
+			filt_type = 2
+		elif filt.is_image:
+			filt_type = 3
+		elif filt.is_audio:
+			filt_type = 4
+		elif filt.is_voice:
+			filt_type = 5
+		elif filt.is_video:
+			filt_type = 6
+		elif filt.has_markdown:
+			filt_type = 0
+		else:
+			filt_type = 7
+		yield {"name": filt.keyword, "reply": filt.reply, "type": filt_type}
 
-	all_backups = json.dumps(backup, indent=4, cls=SetEncoder)
-	f = open("{}-Fortizers.backup".format(chat_id), "w")
-	f.write(str(all_backups))
-	f.close()
-	context.bot.sendChatAction(current_chat_id, "upload_document")
-	tgl = time.strftime("%H:%M:%S - %d/%m/%Y", time.localtime(time.time()))
-	try:
-		context.bot.sendMessage(TEMPORARY_DATA, "*Berhasil mencadangan untuk:*\nNama chat: `{}`\nID chat: `{}`\nPada: `{}`".format(chat.title, chat_id, tgl), parse_mode=ParseMode.MARKDOWN)
-	except BadRequest:
-		pass
-	send = context.bot.sendDocument(current_chat_id, document=open('{}-Fortizers.backup'.format(chat_id), 'rb'), caption=tl(update.effective_message, "*Berhasil mencadangan untuk:*\nNama chat: `{}`\nID chat: `{}`\nPada: `{}`\n\nNote: cadangan ini khusus untuk bot ini, jika di import ke bot lain maka catatan dokumen, video, audio, voice, dan lain-lain akan hilang").format(chat.title, chat_id, tgl), timeout=360, reply_to_message_id=msg.message_id, parse_mode=ParseMode.MARKDOWN)
-	try:
-		# Send to temp data for prevent unexpected issue
-		context.bot.sendDocument(TEMPORARY_DATA, document=send.document.file_id, caption=tl(update.effective_message, "*Berhasil mencadangan untuk:*\nNama chat: `{}`\nID chat: `{}`\nPada: `{}`\n\nNote: cadangan ini khusus untuk bot ini, jika di import ke bot lain maka catatan dokumen, video, audio, voice, dan lain-lain akan hilang").format(chat.title, chat_id, tgl), timeout=360, parse_mode=ParseMode.MARKDOWN)
-	except BadRequest:
-		pass
-	os.remove("{}-Fortizers.backup".format(chat_id)) # Cleaning file
+
+def backup_notes(chat_id):
+	for note in notesql.get_all_chat_notes(chat_id):
+		note_tag = note.name
+		note_type = note.msgtype
+		if not note.value:
+			note_data = ""
+		else:
+			tombol = notesql.get_buttons(chat_id, note_tag)
+			buttonlist = ""
+			for btn in tombol:
+				if btn.same_line:
+					buttonlist += "[{}](buttonurl:{}:same)\n".format(btn.name, btn.url)
+				else:
+					buttonlist += "[{}](buttonurl:{})\n".format(btn.name, btn.url)
+			note_data = "{}\n\n{}".format(note.value, buttonlist)
+		note_file = note.file
+		if not note_file:
+			note_file = ""
+		yield {"note_tag": note_tag, "note_data": note_data, "note_file": note_file, "note_type": note_type}
+
+
+def _json_default(obj):
+	if isinstance(obj, (set, frozenset)):
+		return list(obj)
+	if isinstance(obj, Enum):
+		return obj.value
+	raise TypeError("{!r} is not JSON serializable".format(obj))
+
+
+def _dumps(value):
+	return rapidjson.dumps(value, default=_json_default, ensure_ascii=False).encode("utf-8")
+
+
+def _write_json(out, value):
+	# Like json.dump, but generators become lists written one item at a time
+	if isinstance(value, dict):
+		out.write(b"{")
+		for i, (key, item) in enumerate(value.items()):
+			out.write(b", " if i else b"")
+			out.write(_dumps(str(key)) + b": ")
+			_write_json(out, item)
+		out.write(b"}")
+	elif isinstance(value, GeneratorType):
+		out.write(b"[")
+		for i, item in enumerate(value):
+			out.write(b",\n" if i else b"\n")
+			_write_json(out, item)
+		out.write(b"]")
+	else:
+		out.write(_dumps(value))
 
 
-class SetEncoder(json.JSONEncoder):
-	def default(self, obj):
-		if isinstance(obj, set):
-			return list(obj)
-		return json.JSONEncoder.default(self, obj)
+def write_backup(out, sections):
+	"""Writes the (name, data) pairs from `sections` to the binary file `out` as one JSON object."""
+	out.write(b"{")
+	for i, (name, data) in enumerate(sections):
+		out.write(b",\n" if i else b"\n")
+		out.write(_dumps(name) + b": ")
+		_write_json(out, data)
+	out.write(b"\n}\n")
 
 
 # Temporary data
@@ -14,6 +14,7 @@ from telegram.utils.helpers import mention_markdown
 from fortizers.modules.helper_funcs.chat_status import user_admin, user_not_admin
 from fortizers.modules.helper_funcs.extraction import extract_text
 from fortizers.modules.helper_funcs.misc import split_message
+from fortizers.modules.helper_funcs.pipeline import add_message_handlers, stop_pipeline
 from fortizers.modules.log_channel import loggable
 from fortizers.modules.warns import warn
 from fortizers.modules.helper_funcs.string_handling import extract_time
@@ -285,53 +286,51 @@ def del_blacklist(update, context):
 
 	getmode, value = sql.get_blacklist_setting(chat.id)
 
-	chat_filters = sql.get_chat_blacklist(chat.id)
-	for trigger in chat_filters:
-		pattern = r"( |^|[^\w])" + re.escape(trigger) + r"( |$|[^\w])"
-		if re.search(pattern, to_match, flags=re.IGNORECASE):
-			try:
-				if getmode == 0:
-					return
-				elif getmode == 1:
-					message.delete()
-				elif getmode == 2:
-					message.delete()
-					warn(update.effective_user, chat, tl(update.effective_message, "Mengatakan kata '{}' yang ada di daftar hitam").format(trigger), message, update.effective_user, conn=False)
-					return
-				elif getmode == 3:
-					message.delete()
-					bot.restrict_chat_member(chat.id, update.effective_user.id, can_send_messages=False)
-					bot.sendMessage(chat.id, tl(update.effective_message, "{} di bisukan karena mengatakan kata '{}' yang ada di daftar hitam").format(mention_markdown(user.id, user.first_name), trigger), parse_mode="markdown")
-					return
-				elif getmode == 4:
-					message.delete()
-					res = chat.unban_member(update.effective_user.id)
-					if res:
-						bot.sendMessage(chat.id, tl(update.effective_message, "{} di tendang karena mengatakan kata '{}' yang ada di daftar hitam").format(mention_markdown(user.id, user.first_name), trigger), parse_mode="markdown")
-					return
-				elif getmode == 5:
-					message.delete()
-					chat.kick_member(user.id)
-					bot.sendMessage(chat.id, tl(update.effective_message, "{} di blokir karena mengatakan kata '{}' yang ada di daftar hitam").format(mention_markdown(user.id, user.first_name), trigger), parse_mode="markdown")
-					return
-				elif getmode == 6:
-					message.delete()
-					bantime = extract_time(message, value)
-					chat.kick_member(user.id, until_date=bantime)
-					bot.sendMessage(chat.id, tl(update.effective_message, "{} di blokir selama {} karena mengatakan kata '{}' yang ada di daftar hitam").format(mention_markdown(user.id, user.first_name), value, trigger), parse_mode="markdown")
-					return
-				elif getmode == 7:
-					message.delete()
-					mutetime = extract_time(message, value)
-					bot.restrict_chat_member(chat.id, user.id, until_date=mutetime, can_send_messages=False)
-					bot.sendMessage(chat.id, tl(update.effective_message, "{} di bisukan selama {} karena mengatakan kata '{}' yang ada di daftar hitam").format(mention_markdown(user.id, user.first_name), value, trigger), parse_mode="markdown")
-					return
-			except BadRequest as excp:
-				if excp.message == "Message to delete not found":
-					pass
-				else:
-					LOGGER.exception("Error while deleting blacklist message.")
-			break
+	trigger = sql.match_blacklist(chat.id, to_match)
+	if trigger:
+		try:
+			if getmode == 0:
+				return
+			stop_pipeline()
+			if getmode == 1:
+				message.delete()
+			elif getmode == 2:
+				message.delete()
+				warn(update.effective_user, chat, tl(update.effective_message, "Mengatakan kata '{}' yang ada di daftar hitam").format(trigger), message, update.effective_user, conn=False)
+				return
+			elif getmode == 3:
+				message.delete()
+				bot.restrict_chat_member(chat.id, update.effective_user.id, can_send_messages=False)
+				bot.sendMessage(chat.id, tl(update.effective_message, "{} di bisukan karena mengatakan kata '{}' yang ada di daftar hitam").format(mention_markdown(user.id, user.first_name), trigger), parse_mode="markdown")
+				return
+			elif getmode == 4:
+				message.delete()
+				res = chat.unban_member(update.effective_user.id)
+				if res:
+					bot.sendMessage(chat.id, tl(update.effective_message, "{} di tendang karena mengatakan kata '{}' yang ada di daftar hitam").format(mention_markdown(user.id, user.first_name), trigger), parse_mode="markdown")
+				return
+			elif getmode == 5:
+				message.delete()
+				chat.kick_member(user.id)
+				bot.sendMessage(chat.id, tl(update.effective_message, "{} di blokir karena mengatakan kata '{}' yang ada di daftar hitam").format(mention_markdown(user.id, user.first_name), trigger), parse_mode="markdown")
+				return
+			elif getmode == 6:
+				message.delete()
+				bantime = extract_time(message, value)
+				chat.kick_member(user.id, until_date=bantime)
+				bot.sendMessage(chat.id, tl(update.effective_message, "{} di blokir selama {} karena mengatakan kata '{}' yang ada di daftar hitam").format(mention_markdown(user.id, user.first_name), value, trigger), parse_mode="markdown")
+				return
+			elif getmode == 7:
+				message.delete()
+				mutetime = extract_time(message, value)
+				bot.restrict_chat_member(chat.id, user.id, until_date=mutetime, can_send_messages=False)
+				bot.sendMessage(chat.id, tl(update.effective_message, "{} di bisukan selama {} karena mengatakan kata '{}' yang ada di daftar hitam").format(mention_markdown(user.id, user.first_name), value, trigger), parse_mode="markdown")
+				return
+		except BadRequest as excp:
+			if excp.message == "Message to delete not found":
+				pass
+			else:
+				LOGGER.exception("Error while deleting blacklist message.")
 
 
 def __import_data__(chat_id, data):
@@ -370,4 +369,4 @@ dispatcher.add_handler(BLACKLIST_HANDLER)
 dispatcher.add_handler(ADD_BLACKLIST_HANDLER)
 dispatcher.add_handler(UNBLACKLIST_HANDLER)
 dispatcher.add_handler(BLACKLISTMODE_HANDLER)
-dispatcher.add_handler(BLACKLIST_DEL_HANDLER, group=BLACKLIST_GROUP)
+add_message_handlers([BLACKLIST_DEL_HANDLER], BLACKLIST_GROUP)
@@ -6,7 +6,8 @@ import re
 import json
 import time
 import csv
-import os
+import codecs
+import tempfile
  
 from telegram.error import BadRequest, TelegramError, Unauthorized
 from telegram import MessageEntity, InlineKeyboardMarkup, InlineKeyboardButton
@@ -25,6 +26,7 @@ import fortizers.modules.sql.feds_sql as sql
 from fortizers.modules.languages import tl
  
 from fortizers.modules.helper_funcs.alternate import send_message
+from fortizers.modules.helper_funcs.fanout import FanoutJob
  
 # Hello bot owner, I spended for feds many hours of my life, Please don't remove this if you still respect MrYacha and peaktogoo and AyraHikari too
 # Federation by MrYacha 2018-2019
@@ -352,8 +354,7 @@ def user_join_fed(update, context):
         getuser = sql.search_user_in_fed(fed_id, user_id)
         fed_id = sql.get_fed_id(chat.id)
         info = sql.get_fed_info(fed_id)
-        get_owner = eval(info['fusers'])['owner']
-        get_owner = context.bot.get_chat(get_owner).id
+        get_owner = context.bot.get_chat(info['owner']).id
         if user_id == get_owner:
             send_message(
                 update.effective_message, tl(
@@ -692,7 +693,6 @@ def fed_ban(update, context):
                     "Gagal melarangan federasi! Jika masalah ini terus terjadi, hubungi pembuat saya."))
             return
  
-        fed_chats = sql.all_fed_chats(fed_id)
         # Will send to current chat
         context.bot.send_message(chat.id,
                                  tl(update.effective_message,
@@ -742,64 +742,10 @@ def fed_ban(update, context):
                                                                           fban_user_id,
                                                                           reason),
                                          parse_mode="HTML")
-        for fedschat in fed_chats:
-            try:
-                # Do not spamming all fed chats
-                """
-                context.bot.send_message(fedschat, "<b>Alasan FedBan Diperbarui</b>" \
-                             "\n<b>Federasi:</b> {}" \
-                             "\n<b>Federasi Admin:</b> {}" \
-                             "\n<b>Pengguna:</b> {}" \
-                             "\n<b>Pengguna ID:</b> <code>{}</code>" \
-                             "\n<b>Alasan:</b> {}".format(fed_name, mention_html(user.id, user.first_name), user_target, fban_user_id, reason), parse_mode="HTML")
-                """
-                context.bot.kick_chat_member(fedschat, fban_user_id)
-            except BadRequest as excp:
-                if excp.message in FBAN_ERRORS:
-                    try:
-                        dispatcher.bot.getChat(fedschat)
-                    except Unauthorized:
-                        sql.chat_leave_fed(fedschat)
-                        LOGGER.info(
-                            "Chat {} has leave fed {} because bot is kicked".format(
-                                fedschat, info['fname']))
-                        continue
-                elif excp.message == "User_id_invalid":
-                    break
-                else:
-                    LOGGER.warning(
-                        "Tidak dapat fban di {} karena: {}".format(
-                            fedschat, excp.message))
-            except TelegramError:
-                pass
- 
-        # Fban for fed subscriber
-        subscriber = list(sql.get_subscriber(fed_id))
-        if len(subscriber) != 0:
-            for fedsid in subscriber:
-                all_fedschat = sql.all_fed_chats(fedsid)
-                for fedschat in all_fedschat:
-                    try:
-                        context.bot.kick_chat_member(fedschat, fban_user_id)
-                    except BadRequest as excp:
-                        if excp.message in FBAN_ERRORS:
-                            try:
-                                dispatcher.bot.getChat(fedschat)
-                            except Unauthorized:
-                                targetfed_id = sql.get_fed_id(fedschat)
-                                sql.unsubs_fed(fed_id, targetfed_id)
-                                LOGGER.info(
-                                    "Chat {} has unsub fed {} because bot is kicked".format(
-                                        fedschat, info['fname']))
-                                continue
-                        elif excp.message == "User_id_invalid":
-                            break
-                        else:
-                            LOGGER.warning(
-                                "Tidak dapat fban di {} karena: {}".format(
-                                    fedschat, excp.message))
-                    except TelegramError:
-                        pass
+        FanoutJob("fban-{}-{}".format(fed_id, fban_user_id), fed_fanout_chats(fed_id),
+                  lambda chat_id: context.bot.kick_chat_member(chat_id, fban_user_id),
+                  on_error=fed_fanout_error(fed_id, info, FBAN_ERRORS),
+                  on_done=fed_fanout_done(update.effective_message, fed_id, "FedBan")).start()
         send_message(
             update.effective_message, tl(
                 update.effective_message, "Alasan fedban telah di perbarui."))
@@ -829,7 +775,6 @@ def fed_ban(update, context):
                                                   "Gagal melarangan federasi! Jika masalah ini terus terjadi, hubungi pembuat saya."))
         return
  
-    fed_chats = sql.all_fed_chats(fed_id)
     # Will send to current chat
     context.bot.send_message(chat.id,
                              tl(update.effective_message,
@@ -879,48 +824,10 @@ def fed_ban(update, context):
                                                                       fban_user_id,
                                                                       reason),
                                      parse_mode="HTML")
-    for fedschat in fed_chats:
-        try:
-            context.bot.kick_chat_member(fedschat, fban_user_id)
-        except BadRequest as excp:
-            if excp.message in FBAN_ERRORS:
-                pass
-            elif excp.message == "User_id_invalid":
-                break
-            else:
-                LOGGER.warning(
-                    "Tidak dapat fban di {} karena: {}".format(
-                        fedschat, excp.message))
-        except TelegramError:
-            pass
- 
-    # Fban for fed subscriber
-    subscriber = list(sql.get_subscriber(fed_id))
-    if len(subscriber) != 0:
-        for fedsid in subscriber:
-            all_fedschat = sql.all_fed_chats(fedsid)
-            for fedschat in all_fedschat:
-                try:
-                    context.bot.kick_chat_member(fedschat, fban_user_id)
-                except BadRequest as excp:
-                    if excp.message in FBAN_ERRORS:
-                        try:
-                            dispatcher.bot.getChat(fedschat)
-                        except Unauthorized:
-                            targetfed_id = sql.get_fed_id(fedschat)
-                            sql.unsubs_fed(fed_id, targetfed_id)
-                            LOGGER.info(
-                                "Chat {} has unsub fed {} because bot is kicked".format(
-                                    fedschat, info['fname']))
-                            continue
-                    elif excp.message == "User_id_invalid":
-                        break
-                    else:
-                        LOGGER.warning(
-                            "Tidak dapat fban di {} karena: {}".format(
-                                fedschat, excp.message))
-                except TelegramError:
-                    pass
+    FanoutJob("fban-{}-{}".format(fed_id, fban_user_id), fed_fanout_chats(fed_id),
+              lambda chat_id: context.bot.kick_chat_member(chat_id, fban_user_id),
+              on_error=fed_fanout_error(fed_id, info, FBAN_ERRORS),
+              on_done=fed_fanout_done(update.effective_message, fed_id, "FedBan")).start()
     send_message(update.effective_message, tl(
         update.effective_message, "Orang ini telah di fbanned."))
  
@@ -1006,7 +913,6 @@ def unfban(update, context):
             "Saya akan memberi {} kesempatan kedua dalam federasi ini.").format(user_target),
         parse_mode="HTML")
  
-    chat_list = sql.all_fed_chats(fed_id)
     # Will send to current chat
     context.bot.send_message(
         chat.id, tl(
@@ -1041,24 +947,6 @@ def unfban(update, context):
                                               "\n<b>Pengguna ID:</b> <code>{}</code>").format(
                     info['fname'], mention_html(
                         user.id, user.first_name), user_target, fban_user_id), parse_mode="HTML")
-    for fedchats in chat_list:
-        try:
-            member = context.bot.get_chat_member(fedchats, user_id)
-            if member.status == 'kicked':
-                context.bot.unban_chat_member(fedchats, user_id)
- 
-        except BadRequest as excp:
-            if excp.message in UNFBAN_ERRORS:
-                pass
-            elif excp.message == "User_id_invalid":
-                break
-            else:
-                LOGGER.warning(
-                    "Tidak dapat fban di {} karena: {}".format(
-                        fedchats, excp.message))
-        except TelegramError:
-            pass
- 
     try:
         x = sql.un_fban_user(fed_id, user_id)
         if not x:
@@ -1069,33 +957,14 @@ def unfban(update, context):
     except BaseException:
         pass
  
-    # UnFban for fed subscriber
-    subscriber = list(sql.get_subscriber(fed_id))
-    if len(subscriber) != 0:
-        for fedsid in subscriber:
-            all_fedschat = sql.all_fed_chats(fedsid)
-            for fedschat in all_fedschat:
-                try:
-                    context.bot.unban_chat_member(fedchats, user_id)
-                except BadRequest as excp:
-                    if excp.message in FBAN_ERRORS:
-                        try:
-                            dispatcher.bot.getChat(fedschat)
-                        except Unauthorized:
-                            targetfed_id = sql.get_fed_id(fedschat)
-                            sql.unsubs_fed(fed_id, targetfed_id)
-                            LOGGER.info(
-                                "Chat {} has unsub fed {} because bot is kicked".format(
-                                    fedschat, info['fname']))
-                            continue
-                    elif excp.message == "User_id_invalid":
-                        break
-                    else:
-                        LOGGER.warning(
-                            "Tidak dapat fban di {} karena: {}".format(
-                                fedschat, excp.message))
-                except TelegramError:
-                    pass
+    def unban_member(chat_id):
+        member = context.bot.get_chat_member(chat_id, fban_user_id)
+        if member.status == 'kicked':
+            context.bot.unban_chat_member(chat_id, fban_user_id)
+ 
+    FanoutJob("unfban-{}-{}".format(fed_id, fban_user_id), fed_fanout_chats(fed_id), unban_member,
+              on_error=fed_fanout_error(fed_id, info, UNFBAN_ERRORS),
+              on_done=fed_fanout_done(update.effective_message, fed_id, "Un-FedBan"), weight=2).start()
  
     send_message(update.effective_message, tl(
         update.effective_message, "Orang ini telah di un-fbanned."))
@@ -1601,8 +1470,6 @@ def fed_import_bans(update, context):
         # if int(int(msg.reply_to_message.document.file_size)/1024) >= 200:
         # 	send_message(update.effective_message, "File ini terlalu besar!")
         # 	return
-        success = 0
-        failed = 0
         try:
             file_info = context.bot.get_file(
                 msg.reply_to_message.document.file_id)
@@ -1611,173 +1478,64 @@ def fed_import_bans(update, context):
                                                       "Coba unduh dan unggah ulang filenya, yang ini sepertinya rusak!"))
             return
         fileformat = msg.reply_to_message.document.file_name.split('.')[-1]
-        if fileformat == 'json':
-            multi_fed_id = []
-            multi_import_userid = []
-            multi_import_firstname = []
-            multi_import_lastname = []
-            multi_import_username = []
-            multi_import_reason = []
-            with BytesIO() as file:
-                file_info.download(out=file)
-                file.seek(0)
-                reading = file.read().decode('UTF-8')
-                splitting = reading.split('\n')
-                for x in splitting:
-                    if x == '':
-                        continue
-                    try:
-                        data = json.loads(x)
-                    except json.decoder.JSONDecodeError as err:
-                        failed += 1
-                        continue
-                    try:
-                        import_userid = int(
-                            data['user_id'])  # Make sure it int
-                        import_firstname = str(data['first_name'])
-                        import_lastname = str(data['last_name'])
-                        import_username = str(data['user_name'])
-                        import_reason = str(data['reason'])
-                    except ValueError:
-                        failed += 1
-                        continue
-                    # Checking user
-                    if int(import_userid) == context.bot.id:
-                        failed += 1
-                        continue
-                    if is_user_fed_owner(fed_id, import_userid):
-                        failed += 1
-                        continue
-                    if is_user_fed_admin(fed_id, import_userid):
-                        failed += 1
-                        continue
-                    if str(import_userid) == str(OWNER_ID):
-                        failed += 1
-                        continue
-                    if int(import_userid) in SUDO_USERS:
-                        failed += 1
-                        continue
-                    if int(import_userid) in WHITELIST_USERS:
-                        failed += 1
-                        continue
-                    multi_fed_id.append(fed_id)
-                    multi_import_userid.append(str(import_userid))
-                    multi_import_firstname.append(import_firstname)
-                    multi_import_lastname.append(import_lastname)
-                    multi_import_username.append(import_username)
-                    multi_import_reason.append(import_reason)
-                    success += 1
-                sql.multi_fban_user(
-                    multi_fed_id,
-                    multi_import_userid,
-                    multi_import_firstname,
-                    multi_import_lastname,
-                    multi_import_username,
-                    multi_import_reason)
-            text = tl(
-                update.effective_message,
-                "Berkas blokir berhasil diimpor. {} orang diblokir.").format(success)
-            if failed >= 1:
-                text += tl(update.effective_message,
-                           " {} gagal di impor.").format(failed)
-            get_fedlog = sql.get_fed_log(fed_id)
-            if get_fedlog:
-                if eval(get_fedlog):
-                    teks = tl(
-                        update.effective_message,
-                        "Federasi *{}* telah berhasil mengimpor data. {} di blokir").format(
-                        getfed['fname'],
-                        success)
-                    if failed >= 1:
-                        teks += tl(update.effective_message,
-                                   " {} gagal di impor.").format(failed)
-                    context.bot.send_message(
-                        get_fedlog, teks, parse_mode="markdown")
-        elif fileformat == 'csv':
-            multi_fed_id = []
-            multi_import_userid = []
-            multi_import_firstname = []
-            multi_import_lastname = []
-            multi_import_username = []
-            multi_import_reason = []
-            file_info.download(
-                "fban_{}.csv".format(
-                    msg.reply_to_message.document.file_id))
-            with open("fban_{}.csv".format(msg.reply_to_message.document.file_id), 'r', encoding="utf8") as csvFile:
-                reader = csv.reader(csvFile)
-                for data in reader:
-                    try:
-                        import_userid = int(data[0])  # Make sure it int
-                        import_firstname = str(data[1])
-                        import_lastname = str(data[2])
-                        import_username = str(data[3])
-                        import_reason = str(data[4])
-                    except ValueError:
-                        failed += 1
-                        continue
-                    # Checking user
-                    if int(import_userid) == context.bot.id:
-                        failed += 1
-                        continue
-                    if is_user_fed_owner(fed_id, import_userid):
-                        failed += 1
-                        continue
-                    if is_user_fed_admin(fed_id, import_userid):
-                        failed += 1
-                        continue
-                    if str(import_userid) == str(OWNER_ID):
-                        failed += 1
-                        continue
-                    if int(import_userid) in SUDO_USERS:
-                        failed += 1
-                        continue
-                    if int(import_userid) in WHITELIST_USERS:
-                        failed += 1
-                        continue
-                    multi_fed_id.append(fed_id)
-                    multi_import_userid.append(str(import_userid))
-                    multi_import_firstname.append(import_firstname)
-                    multi_import_lastname.append(import_lastname)
-                    multi_import_username.append(import_username)
-                    multi_import_reason.append(import_reason)
-                    success += 1
-                    # t = ThreadWithReturnValue(target=sql.fban_user, args=(fed_id, str(import_userid), import_firstname, import_lastname, import_username, import_reason,))
-                    # t.start()
-                sql.multi_fban_user(
-                    multi_fed_id,
-                    multi_import_userid,
-                    multi_import_firstname,
-                    multi_import_lastname,
-                    multi_import_username,
-                    multi_import_reason)
-            csvFile.close()
-            os.remove(
-                "fban_{}.csv".format(
-                    msg.reply_to_message.document.file_id))
-            text = tl(
-                update.effective_message,
-                "Berkas blokir berhasil diimpor. {} orang diblokir.").format(success)
-            if failed >= 1:
-                text += tl(update.effective_message,
-                           " {} gagal di impor.").format(failed)
-            get_fedlog = sql.get_fed_log(fed_id)
-            if get_fedlog:
-                if eval(get_fedlog):
-                    teks = tl(
-                        update.effective_message,
-                        "Federasi *{}* telah berhasil mengimpor data. {} di blokir").format(
-                        getfed['fname'],
-                        success)
-                    if failed >= 1:
-                        teks += tl(update.effective_message,
-                                   " {} gagal di impor.").format(failed)
-                    context.bot.send_message(
-                        get_fedlog, teks, parse_mode="markdown")
-        else:
+        if fileformat not in ('json', 'csv'):
             send_message(
                 update.effective_message, tl(
                     update.effective_message, "File tidak di dukung."))
             return
+        # Checked once per import instead of once per row
+        skip_users = set(sql.all_fed_users(fed_id) or [])
+        skip_users.update(SUDO_USERS, WHITELIST_USERS, (context.bot.id, OWNER_ID))
+        stats = {'success': 0, 'failed': 0}
+        progress_msg = send_message(
+            update.effective_message, tl(
+                update.effective_message, "Mengimpor berkas blokir..."))
+ 
+        def import_progress(count):
+            if not progress_msg:
+                return
+            try:
+                progress_msg.edit_text(
+                    tl(update.effective_message, "Mengimpor berkas blokir... {} baris diproses.").format(count))
+            except TelegramError:
+                pass
+ 
+        # File.download can't hand out the body while it arrives, so it goes to disk instead of memory and
+        # is parsed line by line from there
+        with tempfile.TemporaryFile() as file:
+            file_info.download(out=file)
+            file.seek(0)
+            rows = parse_fban_import(codecs.iterdecode(file, 'utf-8'), fileformat, skip_users, stats)
+            x = sql.bulk_fban_user(fed_id, rows, progress=import_progress)
+        if x is False:
+            send_message(
+                update.effective_message,
+                tl(
+                    update.effective_message,
+                    "Gagal melarangan federasi! Jika masalah ini terus terjadi, hubungi pembuat saya."))
+            return
+        # Only bans that are new, users that were already banned don't count again
+        success = x
+        failed = stats['failed']
+        text = tl(
+            update.effective_message,
+            "Berkas blokir berhasil diimpor. {} orang diblokir.").format(success)
+        if failed >= 1:
+            text += tl(update.effective_message,
+                       " {} gagal di impor.").format(failed)
+        get_fedlog = sql.get_fed_log(fed_id)
+        if get_fedlog:
+            if eval(get_fedlog):
+                teks = tl(
+                    update.effective_message,
+                    "Federasi *{}* telah berhasil mengimpor data. {} di blokir").format(
+                    getfed['fname'],
+                    success)
+                if failed >= 1:
+                    teks += tl(update.effective_message,
+                               " {} gagal di impor.").format(failed)
+                context.bot.send_message(
+                    get_fedlog, teks, parse_mode="markdown")
         send_message(update.effective_message, text)
  
  
@@ -2185,6 +1943,67 @@ def get_myfeds_list(update, context):
     send_message(update.effective_message, text, parse_mode="markdown")
  
  
+def fed_fanout_chats(fed_id):
+    # Chats of the federation followed by the chats of every fed subscribed to it
+    chats = list(sql.all_fed_chats(fed_id))
+    for fedsid in sql.get_subscriber(fed_id):
+        chats += sql.all_fed_chats(fedsid)
+    return chats
+ 
+ 
+def fed_fanout_error(fed_id, info, errors):
+    def on_error(chat_id, excp):
+        if not isinstance(excp, BadRequest):
+            return False
+        if excp.message in errors:
+            try:
+                dispatcher.bot.getChat(chat_id)
+            except Unauthorized:
+                targetfed_id = sql.get_fed_id(chat_id)
+                if targetfed_id == fed_id:
+                    sql.chat_leave_fed(chat_id)
+                    LOGGER.info(
+                        "Chat {} has leave fed {} because bot is kicked".format(
+                            chat_id, info['fname']))
+                else:
+                    sql.unsubs_fed(fed_id, targetfed_id)
+                    LOGGER.info(
+                        "Chat {} has unsub fed {} because bot is kicked".format(
+                            chat_id, info['fname']))
+            except TelegramError:
+                pass
+            return False
+        elif excp.message == "User_id_invalid":
+            # Stop the whole job, the user can't be banned anywhere
+            return True
+        LOGGER.warning(
+            "Tidak dapat fban di {} karena: {}".format(
+                chat_id, excp.message))
+        return False
+ 
+    return on_error
+ 
+ 
+def fed_fanout_done(message, fed_id, action):
+    def on_done(job):
+        get_fedlog = sql.get_fed_log(fed_id)
+        if not get_fedlog:
+            return
+        summary = job.summary()
+        dispatcher.bot.send_message(
+            get_fedlog,
+            tl(message,
+               "<b>{}</b> selesai pada {}/{} obrolan, {} gagal ({:.1f} detik).").format(
+                action,
+                summary['success'],
+                summary['total'],
+                summary['failed'],
+                summary['duration']),
+            parse_mode="HTML")
+ 
+    return on_done
+ 
+ 
 def is_user_fed_admin(fed_id, user_id):
     fed_admins = sql.all_fed_users(fed_id)
     if not fed_admins:
@@ -2199,10 +2018,7 @@ def is_user_fed_owner(fed_id, user_id):
     getsql = sql.get_fed_info(fed_id)
     if not getsql:
         return False
-    getfedowner = eval(getsql['fusers'])
-    if getfedowner is None or getfedowner == False:
-        return False
-    getfedowner = getfedowner['owner']
+    getfedowner = getsql['owner']
     if str(user_id) == getfedowner or int(user_id) == OWNER_ID:
         return True
     else:
@@ -2262,6 +2078,30 @@ def __user_info__(user_id, chat_id):
     return text
  
  
+def parse_fban_import(lines, fileformat, skip_users, stats):
+    # Yields ban rows while the file is being read, so the import never holds the whole list
+    if fileformat == 'csv':
+        lines = csv.reader(lines)
+    for data in lines:
+        try:
+            if fileformat == 'json':
+                if not data.strip():
+                    continue
+                data = json.loads(data)
+                row = (int(data['user_id']), str(data['first_name']), str(data['last_name']),
+                       str(data['user_name']), str(data['reason']))
+            else:
+                row = (int(data[0]), str(data[1]), str(data[2]), str(data[3]), str(data[4]))
+        except (ValueError, KeyError, IndexError, TypeError):
+            stats['failed'] += 1
+            continue
+        if row[0] in skip_users:
+            stats['failed'] += 1
+            continue
+        stats['success'] += 1
+        yield row
+ 
+ 
 # Temporary data
 def put_chat(chat_id, value, chat_data):
     # print(chat_data)
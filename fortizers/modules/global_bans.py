@@ -1,4 +1,5 @@
 import html
+import threading
 import time
 from datetime import datetime
 from io import BytesIO
@@ -9,17 +10,27 @@ from telegram.ext import CommandHandler, MessageHandler, Filters, run_async
 from telegram.utils.helpers import mention_html
  
 import fortizers.modules.sql.global_bans_sql as sql
-from fortizers import dispatcher, OWNER_ID, SUDO_USERS, SUPPORT_USERS, STRICT_GBAN, MESSAGE_DUMP
-from fortizers.modules.helper_funcs.chat_status import user_admin, is_user_admin
+from fortizers import dispatcher, updater, OWNER_ID, SUDO_USERS, SUPPORT_USERS, STRICT_GBAN, MESSAGE_DUMP, LOGGER
+from fortizers.modules.helper_funcs.chat_status import user_admin, is_user_admin, is_sender_admin, bot_can_restrict, \
+    cached_chat_admins, invalidate_admin_cache
 from fortizers.modules.helper_funcs.extraction import extract_user, extract_user_and_text
 from fortizers.modules.helper_funcs.misc import send_to_list
 from fortizers.modules.helper_funcs.filters import CustomFilters
-from fortizers.modules.sql.users_sql import get_all_chats
+from fortizers.modules.sql.users_sql import get_chat_ids_after
 from fortizers.modules.languages import tl
-from fortizers.modules.helper_funcs.alternate import send_message
+from fortizers.modules.helper_funcs.alternate import send_message, send_message_raw
+from fortizers.modules.helper_funcs.fanout import FanoutJob
+from fortizers.modules.helper_funcs.pipeline import add_message_handlers, stop_pipeline
  
 GBAN_ENFORCE_GROUP = 6
  
+GBAN_JOB_BATCH = 200
+ 
+NO_RIGHTS_ERRORS = {
+    "Not enough rights to restrict/unrestrict chat member",
+    "Chat_admin_required",
+}
+ 
 GBAN_ERRORS = {
     "User is an administrator of the chat",
     "Chat not found",
@@ -119,7 +130,7 @@ def gban(update, context):
  
         return
  
-    message.reply_text("*It's gban time!* 😉")
+    status = message.reply_text("*It's gban time!* 😉")
  
     start_time = time.time()
     datetime_fmt = "%H:%M - %d-%m-%Y"
@@ -147,10 +158,10 @@ def gban(update, context):
  
     if MESSAGE_DUMP:
         try:
-            log = context.bot.send_message(
+            context.bot.send_message(
                 MESSAGE_DUMP, log_message, parse_mode=ParseMode.HTML)
         except BadRequest:
-            log = context.bot.send_message(
+            context.bot.send_message(
                 MESSAGE_DUMP,
                 log_message +
                 "\n\nFormatting has been disabled due to an unexpected error.")
@@ -165,67 +176,8 @@ def gban(update, context):
  
     sql.gban_user(user_id, user_chat.username or user_chat.first_name, reason)
  
-    chats = get_all_chats()
-    gbanned_chats = 0
- 
-    for chat in chats:
-        chat_id = chat.chat_id
- 
-        # Check if this group has disabled gbans
-        if not sql.does_chat_gban(chat_id):
-            continue
- 
-        try:
-            context.bot.kick_chat_member(chat_id, user_id)
-            gbanned_chats += 1
- 
-        except BadRequest as excp:
-            if excp.message in GBAN_ERRORS:
-                pass
-            else:
-                message.reply_text(f"Could not gban due to: {excp.message}")
-                if MESSAGE_DUMP:
-                    context.bot.send_message(
-                        MESSAGE_DUMP,
-                        f"Could not gban due to {excp.message}",
-                        parse_mode=ParseMode.HTML)
-                else:
-                    send_to_list(
-                        context.bot,
-                        SUDO_USERS + SUPPORT_USERS,
-                        f"Could not gban due to: {excp.message}")
-                sql.ungban_user(user_id)
-                return
-        except TelegramError:
-            pass
- 
-    if MESSAGE_DUMP:
-        log.edit_text(
-            log_message +
-            f"\n<b>Chats affected:</b> {gbanned_chats}",
-            parse_mode=ParseMode.HTML)
-    else:
-        send_to_list(context.bot, SUDO_USERS + SUPPORT_USERS,
-                     f"Gban complete! (User banned in {gbanned_chats} chats)")
- 
-    end_time = time.time()
-    gban_time = round((end_time - start_time), 2)
- 
-    if gban_time > 60:
-        gban_time = round((gban_time / 60), 2)
-        message.reply_text(
-            f"Done! This gban affected {gbanned_chats} chats, Took {gban_time} min")
-    else:
-        message.reply_text(
-            f"Done! This gban affected {gbanned_chats} chats, Took {gban_time} sec")
- 
-    try:
-        context.bot.send_message(
-            user_id,
-            "You have been globally banned from all groups where I have administrative permissions.",
-            parse_mode=ParseMode.HTML)
-    except BaseException:
-        pass  # bot probably blocked by user
+    token = sql.new_gban_job(user_id, "gban", message.chat.id, status.message_id, start_time)
+    start_gban_job(context.bot, user_id, token)
  
  
 @run_async
@@ -274,10 +226,10 @@ def ungban(update, context):
  
     if MESSAGE_DUMP:
         try:
-            log = context.bot.send_message(
+            context.bot.send_message(
                 MESSAGE_DUMP, log_message, parse_mode=ParseMode.HTML)
         except BadRequest:
-            log = context.bot.send_message(
+            context.bot.send_message(
                 MESSAGE_DUMP,
                 log_message +
                 "\n\nFormatting has been disabled due to an unexpected error.")
@@ -289,63 +241,10 @@ def ungban(update, context):
             log_message,
             html=True)
  
-    chats = get_all_chats()
-    ungbanned_chats = 0
- 
-    for chat in chats:
-        chat_id = chat.chat_id
- 
-        # Check if this group has disabled gbans
-        if not sql.does_chat_gban(chat_id):
-            continue
- 
-        try:
-            member = context.bot.get_chat_member(chat_id, user_id)
-            if member.status == 'kicked':
-                context.bot.unban_chat_member(chat_id, user_id)
-                ungbanned_chats += 1
- 
-        except BadRequest as excp:
-            if excp.message in UNGBAN_ERRORS:
-                pass
-            else:
-                message.reply_text(f"Could not un-gban due to: {excp.message}")
-                if MESSAGE_DUMP:
-                    context.bot.send_message(
-                        MESSAGE_DUMP,
-                        f"Could not un-gban due to: {excp.message}",
-                        parse_mode=ParseMode.HTML)
-                else:
-                    context.bot.send_message(
-                        OWNER_ID, f"Could not un-gban due to: {excp.message}")
-                return
-        except TelegramError:
-            pass
- 
     sql.ungban_user(user_id)
  
-    if MESSAGE_DUMP:
-        log.edit_text(
-            log_message +
-            f"\n<b>Chats affected:</b> {ungbanned_chats}",
-            parse_mode=ParseMode.HTML)
-    else:
-        send_to_list(
-            context.bot,
-            SUDO_USERS +
-            SUPPORT_USERS,
-            "un-gban complete!")
- 
-    end_time = time.time()
-    ungban_time = round((end_time - start_time), 2)
- 
-    if ungban_time > 60:
-        ungban_time = round((ungban_time / 60), 2)
-        message.reply_text(
-            f"Person has been un-gbanned. Took {ungban_time} min")
-    else:
-        message.reply_text(
-            f"Person has been un-gbanned. Took {ungban_time} sec")
+    token = sql.new_gban_job(user_id, "ungban", message.chat.id, None, start_time)
+    start_gban_job(context.bot, user_id, token)
  
  
 @run_async
@@ -371,6 +270,140 @@ def gbanlist(update, context):
             caption="Here is the list of currently gbanned users.")
  
  
+def bot_may_restrict(chat_id, bot_id):
+    # Only asks the admin cache, a chat that isn't cached is tried anyway
+    admins = cached_chat_admins(int(chat_id))
+    if admins is None:
+        return True
+    bot_member = admins.get(bot_id)
+    return bool(bot_member and bot_member.can_restrict_members)
+ 
+ 
+def start_gban_job(bot, user_id, token):
+    threading.Thread(target=run_gban_job, args=(bot, user_id, token),
+                     name="gban-job-{}".format(user_id), daemon=True).start()
+ 
+ 
+def run_gban_job(bot, user_id, token):
+    """Spreads a gban/ungban over every chat, batch by batch, saving the position after each batch."""
+    job = sql.get_gban_job(user_id)
+    if not job or job.token != token:
+        return
+    action = job.action
+ 
+    if action == "gban":
+        errors = GBAN_ERRORS
+        weight = 1
+ 
+        def propagate(chat_id):
+            bot.kick_chat_member(chat_id, user_id)
+            done.append(chat_id)
+    else:
+        errors = UNGBAN_ERRORS
+        weight = 2
+ 
+        def propagate(chat_id):
+            member = bot.get_chat_member(chat_id, user_id)
+            if member.status == 'kicked':
+                bot.unban_chat_member(chat_id, user_id)
+                # Only chats where the user really was banned count as affected
+                done.append(chat_id)
+ 
+    failure = []
+    done = []
+ 
+    def on_error(chat_id, excp):
+        if not isinstance(excp, BadRequest):
+            return False
+        if excp.message in NO_RIGHTS_ERRORS:
+            # The cached admin list said otherwise, it is out of date
+            invalidate_admin_cache(int(chat_id))
+        if excp.message in errors:
+            return False
+        failure.append(excp.message)
+        return True
+ 
+    cursor = job.cursor
+    affected = job.affected
+    while not failure:
+        chats = get_chat_ids_after(cursor, GBAN_JOB_BATCH)
+        if not chats:
+            break
+        # Skip chats that opted out of gbans or where the admin cache says the bot can't ban
+        targets = [x for x in chats if sql.does_chat_gban(x) and bot_may_restrict(x, bot.id)]
+        batch = FanoutJob("{}-{}".format(action, user_id), targets, propagate, on_error=on_error, weight=weight)
+        batch.run()
+        affected += len(done)
+        done.clear()
+        cursor = chats[-1]
+        if not sql.update_gban_job(user_id, token, cursor, affected):
+            # A newer gban/ungban of this user took over
+            return
+        if job.origin_chat and job.status_msg:
+            try:
+                bot.edit_message_text(
+                    f"*It's gban time!* 😉\nProgress: {affected} chats",
+                    chat_id=job.origin_chat, message_id=job.status_msg, parse_mode=ParseMode.MARKDOWN)
+            except TelegramError:
+                pass
+ 
+    if sql.finish_gban_job(user_id, token):
+        report_gban_job(bot, job, affected, failure[0] if failure else None)
+ 
+ 
+def report_gban_job(bot, job, affected, failure):
+    user_id = job.user_id
+    action_time = round(time.time() - job.started, 2)
+    action_time = f"{round(action_time / 60, 2)} min" if action_time > 60 else f"{action_time} sec"
+ 
+    if failure:
+        if job.action == "gban":
+            sql.ungban_user(user_id)
+        text = f"Could not {'gban' if job.action == 'gban' else 'un-gban'} due to: {failure}"
+        if job.origin_chat:
+            send_message_raw(job.origin_chat, text)
+        if MESSAGE_DUMP:
+            bot.send_message(MESSAGE_DUMP, text, parse_mode=ParseMode.HTML)
+        else:
+            send_to_list(bot, SUDO_USERS + SUPPORT_USERS, text)
+        return
+ 
+    if job.action == "gban":
+        if MESSAGE_DUMP:
+            bot.send_message(
+                MESSAGE_DUMP,
+                f"#GBAN <code>{user_id}</code> complete\n<b>Chats affected:</b> {affected}",
+                parse_mode=ParseMode.HTML)
+        else:
+            send_to_list(bot, SUDO_USERS + SUPPORT_USERS,
+                         f"Gban complete! (User banned in {affected} chats)")
+        if job.origin_chat:
+            send_message_raw(job.origin_chat, f"Done! This gban affected {affected} chats, Took {action_time}")
+        try:
+            bot.send_message(
+                user_id,
+                "You have been globally banned from all groups where I have administrative permissions.",
+                parse_mode=ParseMode.HTML)
+        except BaseException:
+            pass  # bot probably blocked by user
+    else:
+        if MESSAGE_DUMP:
+            bot.send_message(
+                MESSAGE_DUMP,
+                f"#UNGBAN <code>{user_id}</code> complete\n<b>Chats affected:</b> {affected}",
+                parse_mode=ParseMode.HTML)
+        else:
+            send_to_list(bot, SUDO_USERS + SUPPORT_USERS, "un-gban complete!")
+        if job.origin_chat:
+            send_message_raw(job.origin_chat, f"Person has been un-gbanned. Took {action_time}")
+ 
+ 
+def resume_gban_jobs(context):
+    for job in sql.get_all_gban_jobs():
+        LOGGER.info("Resuming {} of {} after chat {}".format(job.action, job.user_id, job.cursor))
+        start_gban_job(context.bot, job.user_id, job.token)
+ 
+ 
 def check_and_ban(update, user_id, should_message=True):
     if sql.is_user_gbanned(user_id):
         update.effective_chat.kick_member(user_id)
@@ -378,20 +411,22 @@ def check_and_ban(update, user_id, should_message=True):
             update.effective_message.reply_text(
                 "Alert: This user is globally banned.\n"
                 "*bans them from here.*")
+        return True
+    return False
  
  
 @run_async
 def enforce_gban(update, context):
     # Not using @restrict handler to avoid spamming - just ignore if cant gban.
     if sql.does_chat_gban(
-            update.effective_chat.id) and update.effective_chat.get_member(
-        context.bot.id).can_restrict_members:
+            update.effective_chat.id) and bot_can_restrict(update.effective_chat, context.bot.id):
         user = update.effective_user
         chat = update.effective_chat
         msg = update.effective_message
  
-        if user and not is_user_admin(chat, user.id):
-            check_and_ban(update, user.id)
+        if user and not is_sender_admin(update):
+            if check_and_ban(update, user.id):
+                stop_pipeline()
  
         if msg.new_chat_members:
             new_members = update.effective_message.new_chat_members
@@ -487,5 +522,8 @@ dispatcher.add_handler(GBAN_LIST)
 dispatcher.add_handler(GBAN_STATUS)
  
 if STRICT_GBAN:  # enforce GBANS if this is set
-    dispatcher.add_handler(GBAN_ENFORCER, GBAN_ENFORCE_GROUP)
+    add_message_handlers([GBAN_ENFORCER], GBAN_ENFORCE_GROUP)
+ 
+# Pick up gban/ungban jobs that were still running when the bot stopped
+updater.job_queue.run_once(resume_gban_jobs, 5)
  
\ No newline at end of file
@@ -1,4 +1,6 @@
 import sys
+import threading
+import time
 import traceback
 
 from functools import wraps
@@ -10,16 +12,93 @@ from telegram import error
 from fortizers import DEL_CMDS, SUDO_USERS, WHITELIST_USERS
 
 from fortizers.modules import languages
+from fortizers.modules.helper_funcs import pipeline
+
+
+# How long a chat's admin list is trusted before asking telegram again. Admins changed in the telegram app
+# aren't announced to the bot, so this is also how long a demoted admin can keep using admin commands.
+ADMIN_CACHE_TTL = 60
+# chat_id -> (expires, {user_id: ChatMember})
+ADMIN_CACHE = {}
+# chat_id -> Event of the get_chat_administrators call that is running for that chat
+ADMIN_CACHE_PENDING = {}
+ADMIN_CACHE_LOCK = threading.Lock()
+
+
+def get_chat_admins(chat: Chat) -> dict:
+	"""
+	Admins of a chat as {user_id: ChatMember}, cached for ADMIN_CACHE_TTL seconds.
+	Threads asking for the same chat at the same time share one get_chat_administrators call.
+	"""
+	if chat.type == 'private':
+		return {}
+
+	cached = ADMIN_CACHE.get(chat.id)
+	if cached and cached[0] > time.monotonic():
+		return cached[1]
+
+	with ADMIN_CACHE_LOCK:
+		cached = ADMIN_CACHE.get(chat.id)
+		if cached and cached[0] > time.monotonic():
+			return cached[1]
+		pending = ADMIN_CACHE_PENDING.get(chat.id)
+		if pending is None:
+			pending = ADMIN_CACHE_PENDING[chat.id] = threading.Event()
+			fetching = True
+		else:
+			fetching = False
+
+	if not fetching:
+		pending.wait(10)
+		cached = ADMIN_CACHE.get(chat.id)
+		if cached:
+			return cached[1]
+		# The other lookup failed or was invalidated, do our own
+		return {x.user.id: x for x in chat.get_administrators()}
+
+	try:
+		admins = {x.user.id: x for x in chat.get_administrators()}
+		with ADMIN_CACHE_LOCK:
+			# Don't store a list that was invalidated while we were fetching it
+			if ADMIN_CACHE_PENDING.get(chat.id) is pending:
+				ADMIN_CACHE[chat.id] = (time.monotonic() + ADMIN_CACHE_TTL, admins)
+		return admins
+	finally:
+		with ADMIN_CACHE_LOCK:
+			if ADMIN_CACHE_PENDING.get(chat.id) is pending:
+				del ADMIN_CACHE_PENDING[chat.id]
+		pending.set()
+
+
+def cached_chat_admins(chat_id: int) -> Optional[dict]:
+	"""Admins of a chat from the cache only, None when they aren't cached or have expired."""
+	cached = ADMIN_CACHE.get(chat_id)
+	if cached and cached[0] > time.monotonic():
+		return cached[1]
+	return None
+
+
+def invalidate_admin_cache(chat_id: int):
+	with ADMIN_CACHE_LOCK:
+		ADMIN_CACHE.pop(chat_id, None)
+		ADMIN_CACHE_PENDING.pop(chat_id, None)
+
+
+def get_admin_member(chat: Chat, user_id: int) -> Optional[ChatMember]:
+	return get_chat_admins(chat).get(user_id)
 
 
 def can_delete(chat: Chat, bot_id: int) -> bool:
-	return chat.get_member(bot_id).can_delete_messages
+	bot_member = get_admin_member(chat, bot_id)
+	return bool(bot_member and bot_member.can_delete_messages)
 
 def user_can_delete(chat: Chat, user: User, bot_id: int) -> bool:
-	return chat.get_member(bot_id).can_delete_messages and chat.get_member(user.id).can_delete_messages
+	user_member = get_admin_member(chat, user.id)
+	return can_delete(chat, bot_id) and bool(user_member and user_member.can_delete_messages)
 
 def bot_can_restrict(chat: Chat, bot_id: int) -> bool:
-	return chat.get_member(bot_id).can_restrict_members
+	bot_member = get_admin_member(chat, bot_id)
+	return bool(bot_member and bot_member.can_restrict_members)
 
 
 def is_user_ban_protected(chat: Chat, user_id: int, member: ChatMember = None) -> bool:
@@ -30,7 +109,7 @@ def is_user_ban_protected(chat: Chat, user_id: int, member: ChatMember = None) -
 		return True
 
 	if not member:
-		member = chat.get_member(user_id)
+		return user_id in get_chat_admins(chat)
 	return member.status in ('administrator', 'creator')
 
 
@@ -42,19 +121,29 @@ def is_user_admin(chat: Chat, user_id: int, member: ChatMember = None) -> bool:
 
 	try:
 		if not member:
-			member = chat.get_member(user_id)
+			return user_id in get_chat_admins(chat)
 		return member.status in ('administrator', 'creator')
 	except:
 		return False
 
 
+def is_sender_admin(update: Update) -> bool:
+	"""is_user_admin for the sender of an update, only looked up once per message inside the message pipeline."""
+	message = pipeline.current_message()
+	if message is None or message.update is not update:
+		return is_user_admin(update.effective_chat, update.effective_user.id)
+	if message.sender_is_admin is None:
+		message.sender_is_admin = is_user_admin(update.effective_chat, update.effective_user.id)
+	return message.sender_is_admin
+
+
 def is_bot_admin(chat: Chat, bot_id: int, bot_member: ChatMember = None) -> bool:
 	if chat.type == 'private' \
 			or chat.all_members_are_administrators:
 		return True
 
 	if not bot_member:
-		bot_member = chat.get_member(bot_id)
+		return bot_id in get_chat_admins(chat)
 	return bot_member.status in ('administrator', 'creator')
 
 
@@ -78,7 +167,8 @@ def bot_can_delete(func):
 def can_pin(func):
 	@wraps(func)
 	def pin_rights(update, context, *args, **kwargs):
-		if update.effective_chat.get_member(context.bot.id).can_pin_messages:
+		bot_member = get_admin_member(update.effective_chat, context.bot.id)
+		if bot_member and bot_member.can_pin_messages:
 			return func(update, context, *args, **kwargs)
 		else:
 			update.effective_message.reply_text(languages.tl(update.effective_message, "Saya tidak bisa menyematkan pesan di sini! "
@@ -90,7 +180,8 @@ def can_pin(func):
 def can_promote(func):
 	@wraps(func)
 	def promote_rights(update, context, *args, **kwargs):
-		if update.effective_chat.get_member(context.bot.id).can_promote_members:
+		bot_member = get_admin_member(update.effective_chat, context.bot.id)
+		if bot_member and bot_member.can_promote_members:
 			return func(update, context, *args, **kwargs)
 		else:
 			update.effective_message.reply_text(languages.tl(update.effective_message, "Saya tidak dapat mempromosikan/mendemosikan orang di sini! "
@@ -102,7 +193,8 @@ def can_promote(func):
 def can_restrict(func):
 	@wraps(func)
 	def promote_rights(update, context, *args, **kwargs):
-		if update.effective_chat.get_member(context.bot.id).can_restrict_members:
+		bot_member = get_admin_member(update.effective_chat, context.bot.id)
+		if bot_member and bot_member.can_restrict_members:
 			return func(update, context, *args, **kwargs)
 		else:
 			update.effective_message.reply_text(languages.tl(update.effective_message, "Saya tidak bisa membatasi orang di sini! "
@@ -167,7 +259,7 @@ def user_not_admin(func):
 	@wraps(func)
 	def is_not_admin(update, context, *args, **kwargs):
 		user = update.effective_user  # type: Optional[User]
-		if user and not is_user_admin(update.effective_chat, user.id):
+		if user and not is_sender_admin(update):
 			return func(update, context, *args, **kwargs)
 
 	return is_not_admin
@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from telegram.error import RetryAfter, TelegramError
+
+from fortizers import LOGGER, FANOUT_WORKERS
+
+# Telegram allows about 30 requests per second per bot, and about one per second in a single chat
+GLOBAL_RATE = 25
+PER_CHAT_INTERVAL = 1.0
+MAX_RETRIES = 3
+
+# Summaries of the last finished jobs, newest last
+RECENT_JOBS = deque(maxlen=50)
+
+
+class RateLimiter:
+    """Hands out request slots so that callers stay under a global rate and a per-chat interval."""
+
+    def __init__(self, rate, per_key_interval):
+        self._lock = threading.Lock()
+        self._interval = 1.0 / rate
+        self._per_key_interval = per_key_interval
+        self._next_slot = 0.0
+        self._next_key_slot = {}
+
+    def wait(self, key, weight=1):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot, self._next_key_slot.get(key, 0.0))
+            self._next_slot = slot + self._interval * weight
+            self._next_key_slot[key] = slot + self._per_key_interval * weight
+            if len(self._next_key_slot) > 10000:
+                self._next_key_slot = {k: v for k, v in self._next_key_slot.items() if v > now}
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds):
+        """Hands out no slot for `seconds`, a flood wait from telegram applies to the whole bot."""
+        with self._lock:
+            self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+
+LIMITER = RateLimiter(GLOBAL_RATE, PER_CHAT_INTERVAL)
+
+
+class FanoutJob:
+    """
+    Runs `action(chat_id)` once for every chat, concurrently but inside the Telegram rate limits.
+
+    `on_error(chat_id, excp)` is called for every TelegramError other than RetryAfter, and stops the
+    remaining chats when it returns True. `on_done(job)` is called from the job thread when all chats are handled.
+    """
+
+    def __init__(self, name, chat_ids, action, on_error=None, on_done=None, weight=1):
+        self.name = name
+        # Same chat can show up through several subscriber feds, only hit it once
+        self.chat_ids = list(dict.fromkeys(str(x) for x in chat_ids))
+        self.action = action
+        self.on_error = on_error
+        self.on_done = on_done
+        self.weight = weight
+        self.success = 0
+        self.failed = 0
+        self.retried = 0
+        self.aborted = False
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def _run_one(self, chat_id):
+        for _ in range(MAX_RETRIES + 1):
+            if self.aborted:
+                return
+            LIMITER.wait(chat_id, self.weight)
+            try:
+                self.action(chat_id)
+            except RetryAfter as excp:
+                with self._lock:
+                    self.retried += 1
+                # The other workers would only be flood waited too, the next wait() sleeps it out for all
+                LIMITER.pause(excp.retry_after)
+                continue
+            except TelegramError as excp:
+                with self._lock:
+                    self.failed += 1
+                if self.on_error and self.on_error(chat_id, excp):
+                    self.aborted = True
+                return
+            except Exception:
+                LOGGER.exception("Fan-out job {} failed in {}".format(self.name, chat_id))
+                with self._lock:
+                    self.failed += 1
+                return
+            with self._lock:
+                self.success += 1
+            return
+        with self._lock:
+            self.failed += 1
+
+    def run(self):
+        self.started = time.time()
+        if self.chat_ids:
+            with ThreadPoolExecutor(max_workers=min(FANOUT_WORKERS, len(self.chat_ids))) as pool:
+                list(pool.map(self._run_one, self.chat_ids))
+        self.finished = time.time()
+        RECENT_JOBS.append(self.summary())
+        LOGGER.info("Fan-out job {name}: {success}/{total} chats done, {failed} failed, {retried} retried "
+                    "in {duration:.1f}s".format(**self.summary()))
+        if self.on_done:
+            try:
+                self.on_done(self)
+            except Exception:
+                LOGGER.exception("Fan-out job {} could not report its result".format(self.name))
+
+    def start(self):
+        threading.Thread(target=self.run, name="fanout-{}".format(self.name), daemon=True).start()
+        return self
+
+    def summary(self):
+        return {'name': self.name,
+                'total': len(self.chat_ids),
+                'success': self.success,
+                'failed': self.failed,
+                'retried': self.retried,
+                'aborted': self.aborted,
+                'duration': (self.finished or time.time()) - (self.started or time.time())}
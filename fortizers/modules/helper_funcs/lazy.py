@@ -0,0 +1,158 @@
+import importlib
+import threading
+from functools import partial
+
+from telegram.ext import CommandHandler, CallbackQueryHandler
+
+from fortizers import dispatcher, LOGGER, LAZY_MODULES
+from fortizers.modules.helper_funcs.misc import is_module_loaded
+
+# What has to be known about a module without importing it. Only modules without __migrate__, __stats__,
+# __user_info__, data import/export or settings hooks can be listed, those need the module at startup.
+MANIFEST = {
+    "android": {
+        'mod_name': "Android",
+        'helpable': True,
+        'commands': ["device", "magisk", "twrp", "aex", "bootleggers", "evo", "los", "miui", "pe", "pe10", "peplus",
+                     "specs", "getfw", "checkfw", "odin", "gsis", "phh", "edxposed", "mitools"],
+    },
+    "direct_links": {
+        'mod_name': "Direct Links",
+        'helpable': True,
+        'commands': ["direct"],
+    },
+    "memes": {
+        'mod_name': "Memes and etc.",
+        'helpable': True,
+        'commands': ["cp", "clap", "bify", "mock", "owo", "forbes", "stretch", "vapor", "zalgofy", "shout", "dllm",
+                     "deepfry"],
+        'disableable': ["cp", "clap", "bify", "mock", "owo", "forbes", "stretch", "vapor", "zalgofy", "shout", "dllm",
+                        "deepfry"],
+    },
+    "myanimelist": {
+        'mod_name': "MyAnimeList",
+        'helpable': True,
+        'commands': ["anime", "character", "manga", "upcoming"],
+        'callbacks': ['anime_.*'],
+        'disableable': ["anime", "character", "manga", "upcoming"],
+    },
+    "special": {
+        'mod_name': "🔥Special Menu🔥",
+        'helpable': True,
+        'commands': ["stickerid", "ping", "stiker", "file", "getlink", "leavechat", "leavegroup", "leave", "ramalan",
+                     "fortune", "tr", "tl", "wiki", "kbbi", "ud", "log"],
+        'disableable': ["stickerid", "ping", "ramalan", "fortune", "tr", "tl", "wiki", "kbbi", "ud", "log"],
+    },
+    "stickers": {
+        'mod_name': "Stickers",
+        'helpable': True,
+        'commands': ["stickerid", "getsticker", "kang"],
+        'disableable': ["kang"],
+    },
+    "thonkify": {
+        'mod_name': "fortizers.modules.thonkify",
+        'commands': ["thonkify"],
+    },
+    "tools": {
+        'mod_name': "fortizers.modules.tools",
+        'commands': ["speedtest"],
+    },
+}
+
+# The lazy modules register their handlers in the default group, so do the stubs
+STUB_GROUP = 0
+
+STUBS = {}
+LOADED = {}
+PLACEHOLDERS = {}
+LOAD_LOCK = threading.RLock()
+
+
+class LazyModule:
+    """Stands in for a module in IMPORTED and HELPABLE, anything else asked from it imports the real module."""
+
+    def __init__(self, module_name):
+        self.module_name = module_name
+        self.__mod_name__ = MANIFEST[module_name]['mod_name']
+        self.helpable = MANIFEST[module_name].get('helpable', False)
+
+    def __getattr__(self, name):
+        return getattr(load_module(self.module_name), name)
+
+
+def lazy_module(module_name):
+    """
+    Registers stub handlers for the commands and callbacks of `module_name` instead of importing it.
+    Returns None when the module isn't set to load lazily and has to be imported right away.
+    """
+    if module_name not in LAZY_MODULES:
+        return None
+    if module_name not in MANIFEST:
+        LOGGER.warning("No manifest for {}, it can't be loaded lazily".format(module_name))
+        return None
+    # Modules importing from fortizers.__main__ run its module loop a second time under `python -m fortizers`,
+    # the stubs registered the first time have to stay the only ones
+    if module_name in PLACEHOLDERS:
+        return PLACEHOLDERS[module_name]
+
+    manifest = MANIFEST[module_name]
+    stubs = []
+    if manifest.get('commands'):
+        stubs.append(CommandHandler(manifest['commands'], partial(run_lazy, module_name)))
+    for pattern in manifest.get('callbacks', []):
+        stubs.append(CallbackQueryHandler(partial(run_lazy, module_name), pattern=pattern))
+    for stub in stubs:
+        dispatcher.add_handler(stub, STUB_GROUP)
+    STUBS[module_name] = stubs
+
+    # So they can be disabled before the module is loaded
+    if manifest.get('disableable') and is_module_loaded("disable"):
+        from fortizers.modules import disable
+        from fortizers.modules.sql import disable_sql
+        disable.DISABLE_CMDS.extend(manifest['disableable'])
+        disable_sql.disableable_cache(manifest['disableable'])
+
+    PLACEHOLDERS[module_name] = LazyModule(module_name)
+    return PLACEHOLDERS[module_name]
+
+
+def load_module(module_name):
+    """Imports a lazy module, its handlers take the place of its stubs in the dispatcher."""
+    with LOAD_LOCK:
+        if module_name in LOADED:
+            return LOADED[module_name]
+
+        stubs = STUBS.pop(module_name, [])
+        before = {group: list(handlers) for group, handlers in dispatcher.handlers.items()}
+        module = importlib.import_module("fortizers.modules." + module_name)
+        for group, handlers in dispatcher.handlers.items():
+            added = [x for x in handlers if x not in before.get(group, [])]
+            group_stubs = [x for x in stubs if x in handlers]
+            if not group_stubs:
+                continue
+            # Keep the spot of the stubs, so commands that more modules answer keep going to the same one
+            index = handlers.index(group_stubs[0])
+            handlers[:] = [x for x in handlers if x not in added and x not in group_stubs]
+            handlers[index:index] = added
+
+        LOADED[module_name] = module
+        LOGGER.info("Lazily loaded module: {}".format(module_name))
+        return module
+
+
+def is_stub(handler):
+    return isinstance(handler.callback, partial) and handler.callback.func is run_lazy
+
+
+def run_lazy(module_name, update, context):
+    # Not async, so updates after this one already find the real handlers
+    load_module(module_name)
+    for handler in list(dispatcher.handlers.get(STUB_GROUP, [])):
+        # Another lazy module's stub would import that one, a stub of this one would land back here
+        if is_stub(handler):
+            continue
+        check = handler.check_update(update)
+        if check is None or check is False:
+            continue
+        handler.handle_update(update, dispatcher, check, context)
+        return
@@ -0,0 +1,82 @@
+import threading
+
+from telegram.ext import MessageHandler, Filters, DispatcherHandlerStop, run_async
+
+from fortizers import dispatcher, LOGGER, MESSAGE_PIPELINE
+
+# Takes the place of the first moderation group (locks) when the pipeline is on
+PIPELINE_GROUP = 1
+
+# (group, handlers, always), sorted by group like the dispatcher would run them
+STAGES = []
+
+_CURRENT = threading.local()
+
+
+class MessageContext:
+    """State shared by all stages that handle the same message."""
+
+    def __init__(self, update):
+        self.update = update
+        self.stopped = False
+        # Filled by the first stage that needs it, see chat_status.is_sender_admin
+        self.sender_is_admin = None
+
+
+def current_message():
+    """MessageContext of the message this thread is running the pipeline for, or None."""
+    return getattr(_CURRENT, 'message', None)
+
+
+def stop_pipeline():
+    """Skips the remaining moderation stages for the current message, e.g. after it was deleted."""
+    message = current_message()
+    if message:
+        message.stopped = True
+
+
+def add_message_handlers(handlers, group, always=False):
+    """
+    Registers a group of per-message handlers. Without MESSAGE_PIPELINE they are added to the dispatcher as usual,
+    otherwise they become one stage of the pipeline. Stages with `always` still run after an earlier stage stopped.
+    """
+    if not MESSAGE_PIPELINE:
+        for handler in handlers:
+            dispatcher.add_handler(handler, group)
+        return
+    STAGES.append((group, handlers, always))
+    STAGES.sort(key=lambda stage: stage[0])
+
+
+def run_stage(update, context, handlers):
+    # Same as a dispatcher group: only the first handler that accepts the update runs
+    for handler in handlers:
+        check = handler.check_update(update)
+        if check is None or check is False:
+            continue
+        handler.collect_additional_context(context, update, dispatcher, check)
+        # Stage callbacks are @run_async, call the function underneath so they stay in this thread
+        callback = getattr(handler.callback, '__wrapped__', handler.callback)
+        callback(update, context)
+        return
+
+
+@run_async
+def run_pipeline(update, context):
+    message = _CURRENT.message = MessageContext(update)
+    try:
+        for group, handlers, always in STAGES:
+            if message.stopped and not always:
+                continue
+            try:
+                run_stage(update, context, handlers)
+            except DispatcherHandlerStop:
+                message.stopped = True
+            except Exception:
+                LOGGER.exception("Message pipeline stage {} failed".format(group))
+    finally:
+        _CURRENT.message = None
+
+
+if MESSAGE_PIPELINE:
+    dispatcher.add_handler(MessageHandler(Filters.all, run_pipeline), PIPELINE_GROUP)
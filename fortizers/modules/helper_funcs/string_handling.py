@@ -1,6 +1,6 @@
 import re
 import time
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import emoji
 from telegram import MessageEntity
@@ -194,6 +194,34 @@ SMART_CLOSE = '”'
 START_CHAR = ('\'', '"', SMART_OPEN)
 
 
+def build_keyword_matcher(keywords: List[str]):
+    """
+    Compiles filter keywords for find_longest_keyword. Like the old one-regex-per-keyword loops, keywords match
+    case insensitively and only between spaces, non-word characters or the ends of the text.
+    """
+    keywords = sorted(keywords, key=lambda x: (-len(x), x))
+    # Longest first, so at each position the lookahead picks the longest keyword there.
+    # Matching inside a lookahead lets finditer try every position, including overlapping ones.
+    pattern = re.compile(r"(?=(?: |^|[^\w])(" + "|".join(re.escape(x) for x in keywords) + r")(?: |$|[^\w]))",
+                         flags=re.IGNORECASE)
+    return pattern, {x.lower(): x for x in keywords}, keywords
+
+
+def find_longest_keyword(matcher, text: str) -> Optional[str]:
+    """The longest keyword of a build_keyword_matcher matcher found in text, ties broken alphabetically."""
+    pattern, lowered, keywords = matcher
+    best = None
+    for found in pattern.finditer(text):
+        keyword = lowered.get(found.group(1).lower())
+        if keyword is None:
+            # Case folding that lower() doesn't undo, find the keyword the slow way
+            keyword = next((x for x in keywords if re.fullmatch(re.escape(x), found.group(1), flags=re.IGNORECASE)),
+                           None)
+        if keyword is not None and (best is None or (-len(keyword), keyword) < (-len(best), best)):
+            best = keyword
+    return best
+
+
 def split_quotes(text: str) -> List:
     if any(text.startswith(char) for char in START_CHAR):
         counter = 1  # ignore first char -> is some kind of quote
@@ -1,9 +1,9 @@
-import time
+import threading
  
 from telegram import ParseMode
 from telegram.ext import CommandHandler, Filters, run_async
  
-from fortizers import dispatcher, updater, spamcheck
+from fortizers import dispatcher, spamcheck, LOGGER
 import fortizers.modules.sql.welcome_sql as sql
 from fortizers.modules.languages import tl
 from fortizers.modules.connection import connected
@@ -13,27 +13,34 @@ from fortizers.modules.helper_funcs.chat_status import user_admin
 from fortizers.modules.helper_funcs.string_handling import make_time, extract_time_int
  
  
-def welcome_timeout(context):
-    for cht in sql.get_all_chat_timeout():
-        user_id = cht.user_id
-        chat_id = cht.chat_id
-        if int(time.time()) >= int(cht.timeout_int):
-            getcur, extra_verify, cur_value, timeout, timeout_mode = sql.welcome_security(chat_id)
-            if timeout_mode == 1:
-                try:
-                    context.bot.unbanChatMember(chat_id, user_id)
-                # send_message_raw(chat_id, tl(user_id, "Verifikasi gagal!\n{} telah di tendang!").format(mention_markdown(user_id, context.bot.getChatMember(chat_id, user_id).user.first_name)), parse_mode="markdown")
-                except Exception:
-                    pass
-                # send_message_raw(chat_id, tl(user_id, "Verifikasi gagal!\nTetapi gagal menendang {}: {}").format(mention_markdown(user_id, context.bot.getChatMember(chat_id, user_id).user.first_name), str(err)), parse_mode="markdown")
-            elif timeout_mode == 2:
-                try:
-                    context.bot.kickChatMember(chat_id, user_id)
-                # send_message_raw(chat_id, tl(user_id, "Verifikasi gagal!\n{} telah di banned!").format(mention_markdown(user_id, context.bot.getChatMember(chat_id, user_id).user.first_name)), parse_mode="markdown")
-                except Exception:
-                    pass
-                # send_message_raw(chat_id, tl(user_id, "Verifikasi gagal!\nTetapi gagal membanned {}: {}").format(mention_markdown(user_id, context.bot.getChatMember(chat_id, user_id).user.first_name), str(err)), parse_mode="markdown")
-            sql.rm_from_timeout(chat_id, user_id)
+def welcome_timeout(bot, chat_id, user_id):
+    try:
+        getcur, extra_verify, cur_value, timeout, timeout_mode, cust_text = sql.welcome_security(chat_id)
+        if timeout_mode == 1:
+            try:
+                bot.unbanChatMember(chat_id, user_id)
+            # send_message_raw(chat_id, tl(user_id, "Verifikasi gagal!\n{} telah di tendang!").format(mention_markdown(user_id, context.bot.getChatMember(chat_id, user_id).user.first_name)), parse_mode="markdown")
+            except Exception:
+                pass
+            # send_message_raw(chat_id, tl(user_id, "Verifikasi gagal!\nTetapi gagal menendang {}: {}").format(mention_markdown(user_id, context.bot.getChatMember(chat_id, user_id).user.first_name), str(err)), parse_mode="markdown")
+        elif timeout_mode == 2:
+            try:
+                bot.kickChatMember(chat_id, user_id)
+            # send_message_raw(chat_id, tl(user_id, "Verifikasi gagal!\n{} telah di banned!").format(mention_markdown(user_id, context.bot.getChatMember(chat_id, user_id).user.first_name)), parse_mode="markdown")
+            except Exception:
+                pass
+            # send_message_raw(chat_id, tl(user_id, "Verifikasi gagal!\nTetapi gagal membanned {}: {}").format(mention_markdown(user_id, context.bot.getChatMember(chat_id, user_id).user.first_name), str(err)), parse_mode="markdown")
+    finally:
+        sql.rm_from_timeout(chat_id, user_id)
+
+
+def timeout_scheduler():
+    while True:
+        for chat_id, user_id in sql.wait_due_timeouts():
+            try:
+                welcome_timeout(dispatcher.bot, chat_id, user_id)
+            except Exception:
+                LOGGER.exception("Welcome timeout of {} in {} failed".format(user_id, chat_id))
  
  
 @run_async
@@ -158,10 +165,7 @@ def timeout_mode(update, context):
     return
  
  
-job = updater.job_queue
- 
-job_timeout_set = job.run_repeating(welcome_timeout, interval=10, first=1)
-job_timeout_set.enabled = True
+threading.Thread(target=timeout_scheduler, name="welcome-timeout", daemon=True).start()
  
 WELCVERIFY_HANDLER = CommandHandler("welcomeverify", set_verify_welcome, pass_args=True, filters=Filters.group)
 WELTIMEOUT_HANDLER = CommandHandler("wtimeout", set_welctimeout, pass_args=True, filters=Filters.group)
@@ -159,6 +159,7 @@ When marked as AFK, any mentions will be replied to with a message to say you're
 	"Keluar selama {}!": "Get out for {}!",
 	"Sekarang kamu diam selama {}!": "Now you shutup for {}!",
 	"Saya tidak suka orang yang mengirim pesan beruntun. Tapi kamu hanya membuat saya kecewa. {}": "I like to leave the flooding to natural disasters. But you, you were just a disappointment. {}",
+	"Grup ini menerima terlalu banyak pesan sekaligus, {} pengguna yang mengirimnya ditindak. {}": "This group got too many messages at once, the {} users who sent them were dealt with. {}",
 	"Saya tidak bisa menendang orang di sini, beri saya izin terlebih dahulu! Sampai saat itu, saya akan menonaktifkan antiflood.": "I can't kick people here, give me permissions first! Until then, I'll disable antiflood.",
 	"Tidak memiliki izin kick, jadi secara otomatis menonaktifkan antiflood.": "Don't have kick permissions, so automatically disabled antiflood.",
 	"Antiflood telah dinonaktifkan di *{}*.": "Antiflood has been disabled in *{}*.",
@@ -172,6 +173,14 @@ When marked as AFK, any mentions will be replied to with a message to say you're
 	"Saat ini saya tidak memberlakukan pengendalian pesan beruntun": "I'm not currently enforcing flood control!",
 	"Saat ini saya melarang pengguna jika mereka mengirim lebih dari *{}* pesan berturut-turut pada *{}*.": "I'm currently banning users if they send more than *{}* consecutive messages in *{}*.",
 	"Saat ini saya melarang pengguna jika mereka mengirim lebih dari *{}* pesan berturut-turut.": "I'm currently banning users if they send more than *{}* consecutive messages.",
+	"Saat ini saya bertindak jika pengguna mengirim *{}* pesan dalam *{}* detik.": "I'm currently acting on users who send *{}* messages within *{}* seconds.",
+	"Seluruh grup dibatasi *{}* pesan dalam *{}* detik.": "The whole group is limited to *{}* messages within *{}* seconds.",
+	"Gunakan `/setfloodwindow <pesan> <detik> <pesan grup>` untuk membatasi jumlah pesan dalam rentang waktu, pesan grup boleh dikosongkan.\nAtau gunakan `/setfloodwindow off` untuk menonaktifkannya.": "Use `/setfloodwindow <messages> <seconds> <group messages>` to limit how many messages can be sent within a time window, group messages is optional.\nOr use `/setfloodwindow off` to disable it.",
+	"Antiflood berbasis waktu telah dinonaktifkan di *{}*.": "Time based antiflood has been disabled in *{}*.",
+	"Antiflood berbasis waktu telah dinonaktifkan.": "Time based antiflood has been disabled.",
+	"Jumlah pesan minimal 3, detik antara 1 dan 3600, dan pesan grup harus lebih besar dari jumlah pesan!": "Messages must be at least 3, seconds between 1 and 3600, and group messages bigger than messages!",
+	"Antiflood sekarang bertindak jika pengguna mengirim *{}* pesan dalam *{}* detik pada *{}*.": "Antiflood will now act on users who send *{}* messages within *{}* seconds in *{}*.",
+	"Antiflood sekarang bertindak jika pengguna mengirim *{}* pesan dalam *{}* detik.": "Antiflood will now act on users who send *{}* messages within *{}* seconds.",
 	"blokir": "blocked",
 	"tendang": "kicked",
 	"bisukan": "muted",
@@ -195,6 +204,9 @@ Examples of time values: 4m = 4 minutes, 3h = 3 hours, 6d = 6 days, 5w = 5 week.
 *Admin only:*
  - /setflood <int/'no'/'off'>: enables or disables flood control
  - /setfloodmode <ban/kick/mute/tban/tmute> <value>: select the action perform when warnings have been exceeded. ban/kick/mute/tmute/tban
+ - /setfloodwindow <messages> <seconds> <group messages>/'off': act on users who send too many messages within a time window, \
+even when others talk in between. The optional group limit acts on everyone who posted in the burst that makes the whole group go over it. \
+Uses the same action as /setfloodmode
 
  Note:
  - Value must be filled for tban and tmute, Can be:
@@ -292,6 +304,7 @@ When marked as AFK, any mentions will be replied to with a message to say you're
 # Backups
 	"Coba unduh dan unggah ulang file seperti Anda sendiri sebelum mengimpor - yang ini sepertinya rusak!": "Try downloading and reuploading the file as yourself before importing - this one seems to be iffy!",
 	"File cadangan tidak valid!": "Invalid backup file!",
+	"File cadangan terlalu besar!": "Backup file is too big!",
 	"Telah terjadi kesalahan dalam import backup Fortizers!\nGabung ke [Grup support](https://t.me/gabutersllc) kami untuk melaporkan dan mengatasi masalah ini!\n\nTerima kasih": "An exception occured while restoring your data from Fortizers backup!\nJoin our [Group support](https://t.me/gabutersllc) for reporting and troubleshooting this problem!\n\nThank you",
 	"Telah terjadi kesalahan dalam import backup Rose!\nGabung ke [Grup support](https://t.me/gabutersllc) kami untuk melaporkan dan mengatasi masalah ini!\n\nTerima kasih": "An exception occured while restoring your data from Rose backup!\nJoin our [Group support](https://t.me/gabutersllc) for reporting and troubleshooting this problem!\n\nThank you",
 	"Ada lebih dari satu grup di file ini, dan tidak ada yang memiliki id obrolan yang sama dengan grup ini - bagaimana cara memilih apa yang akan diimpor?": "Theres more than one group here in this file, and none have the same chat id as this group - how do I choose what to import?",
@@ -338,6 +351,7 @@ When marked as AFK, any mentions will be replied to with a message to say you're
  - /import: reply to a group butler/marie/rose/emilia/fortizers backup file to import as much as possible, making the transfer super simple!
 Note that files/photos from other bots can't be imported due to telegram restrictions. Except for FortizersWatcher backup it self.
  - /export: export group data, can be done anytime.
+ - /export gzip: same, as a gzip compressed file.
 """,
 	"*Data yang tidak dapat di import*": "*Data which can't be imported*",
 
@@ -787,7 +801,10 @@ NOTE: all filter keywords are in lowercase. If you want your keyword to be a sen
 	"<b>Obrolan yang bergabung pada federasi {}:</b>\n": "<b>Chat that joined the federation {}:</b>\n",
 	"Berikut adalah daftar obrolan yang bergabung federasi {}.": "The following is a list of chats that joined the federation {}.",
 	"Coba unduh dan unggah ulang filenya, yang ini sepertinya rusak!": "Try downloading and re-uploading the file, this one seems broken!",
+	"Mengimpor berkas blokir...": "Importing ban file...",
+	"Mengimpor berkas blokir... {} baris diproses.": "Importing ban file... {} rows processed.",
 	"Berkas blokir berhasil diimpor. {} orang diblokir.": "Files were imported successfully. {} people banned.",
+	"<b>{}</b> selesai pada {}/{} obrolan, {} gagal ({:.1f} detik).": "<b>{}</b> finished in {}/{} chats, {} failed ({:.1f} seconds).",
 	" {} gagal di impor.": " {} failed to import.",
 	"Federasi *{}* telah berhasil mengimpor data. {} di blokir": "Fed *{}* has successfully imported data. {} banned.",
 	" {} gagal di impor.": " {} failed to import.",
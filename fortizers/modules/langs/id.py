@@ -71,6 +71,9 @@ Ketika ditandai sebagai AFK, sebutan apa pun akan dibalas dengan pesan untuk men
 *Hanya admin:*
  - /setflood <int/'no'/'off'>: mengaktifkan atau menonaktifkan kontrol pesan beruntun
  - /setfloodmode <ban/kick/mute/tban/tmute> <value>: pilih tindakan yang akan diambil pada pengguna yang mengirim pesan beruntun.
+ - /setfloodwindow <pesan> <detik> <pesan grup>/'off': bertindak pada pengguna yang mengirim terlalu banyak pesan dalam rentang waktu, \
+walaupun diselingi pesan orang lain. Batas grup (opsional) bertindak pada semua orang yang mengirim pesan dalam lonjakan yang membuat seluruh grup melewatinya. \
+Menggunakan tindakan yang sama dengan /setfloodmode
 
  Note:
  - Value wajib di isi untuk tban dan tmute, Bisa menjadi:
@@ -84,6 +87,7 @@ Ketika ditandai sebagai AFK, sebutan apa pun akan dibalas dengan pesan untuk men
  - /import: balas ke file cadangan grup butler/marie/rose/emilia/fortizer untuk mengimpor sebanyak mungkin, membuat transfer menjadi sangat mudah! \
  Catatan bahwa file/foto tidak dapat diimpor karena pembatasan telegram. Kecuali backup dari FortizersWatcher.
  - /export: export data grup, bisa di lakukan setiap waktu.
+ - /export gzip: sama, sebagai file terkompresi gzip.
 """,
 	"bans_help": """
  - /kickme: menendang pengguna yang mengeluarkan perintah
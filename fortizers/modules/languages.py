@@ -17,6 +17,10 @@ from fortizers.modules.helper_funcs.alternate import send_message
 LOADED_LANGS_ID = []
 LANGS_TEXT = {}
 FUNC_LANG = {}
+# Every language's strings plus its string lists in one dict, so tl() is a single lookup per call
+LANG_TABLES = {}
+
+LANG_STRING_LISTS = ("RUN_STRINGS", "SLAP_TEMPLATES", "ITEMS", "THROW", "HIT", "RAMALAN_STRINGS", "RAMALAN_FIRST")
 
 for x in os.listdir('fortizers/modules/langs'):
 	if os.path.isdir('fortizers/modules/langs/'+x):
@@ -26,6 +30,10 @@ for x in os.listdir('fortizers/modules/langs'):
 	imported_langs = importlib.import_module("fortizers.modules.langs." + x)
 	FUNC_LANG[x] = imported_langs
 	LANGS_TEXT[x] = imported_langs.__lang__
+	LANG_TABLES[x] = dict(getattr(imported_langs, x))
+	for y in LANG_STRING_LISTS:
+		if hasattr(imported_langs, y):
+			LANG_TABLES[x][y] = getattr(imported_langs, y)
 
 LOGGER.info("{} languages loaded: {}".format(len(LOADED_LANGS_ID), LOADED_LANGS_ID))
 
@@ -34,6 +42,10 @@ def tl(message, text):
 		getlang = sql.get_lang(message)
 		if getlang == 'None' or not getlang:
 			getlang = 'en'
+		table = LANG_TABLES.get(getlang)
+		if table is None:
+			getlang = 'en'
+			table = LANG_TABLES['en']
 	else:
 		getlang = sql.get_lang(message.chat.id)
 		if getlang == 'None' or not getlang:
@@ -47,38 +59,20 @@ def tl(message, text):
 			else:
 				sql.set_lang(message.chat.id, 'en')
 				getlang = 'en'
+		table = LANG_TABLES.get(getlang)
+		if table is None:
+			# Language file was removed, move the chat back to english
+			sql.set_lang(message.chat.id, 'en')
+			getlang = 'en'
+			table = LANG_TABLES['en']
 
-	getlangid = {}
-	for x in LOADED_LANGS_ID:
-		getlangid[x] = x
-
-	if str(getlang) == 'id':
-		get = getattr(FUNC_LANG['id'], 'id')
-		if text in tuple(get):
-			return get.get(text)
-		if text in ("RUN_STRINGS", "SLAP_TEMPLATES", "ITEMS", "THROW", "HIT", "RAMALAN_STRINGS", "RAMALAN_FIRST"):
-			runstr = getattr(FUNC_LANG['id'], text)
-			return runstr
-		return text
-	elif str(getlang) in LOADED_LANGS_ID:
-		func = getattr(FUNC_LANG[getlang], getlang)
-		if text in ("RUN_STRINGS", "SLAP_TEMPLATES", "ITEMS", "THROW", "HIT", "RAMALAN_STRINGS", "RAMALAN_FIRST"):
-			runstr = getattr(FUNC_LANG[getlang], text)
-			return runstr
-		langtxt = func.get(text)
-		if not langtxt:
+	langtxt = table.get(text)
+	if not langtxt:
+		# Strings are written in indonesian, so a missing 'id' entry is not an error
+		if getlang != 'id':
 			LOGGER.warning("Can't get translated string for lang '{}' ('{}')".format(str(getlang), text))
-			langtxt = text
-		return langtxt
-	else:
-		sql.set_lang(message.chat.id, 'en')
-		get = getattr(FUNC_LANG['en'], 'en')
-		if text in tuple(get):
-			return get.get(text)
-		if text in ("RUN_STRINGS", "SLAP_TEMPLATES", "ITEMS", "THROW", "HIT", "RAMALAN_STRINGS", "RAMALAN_FIRST"):
-			runstr = getattr(FUNC_LANG['en'], text)
-			return runstr
 		return text
+	return langtxt
 
 
 @run_async
@@ -13,7 +13,8 @@ import fortizers.modules.sql.locks_sql as sql
 from fortizers import dispatcher, spamcheck, SUDO_USERS, LOGGER
 from fortizers.modules.disable import DisableAbleCommandHandler
 from fortizers.modules.helper_funcs.chat_status import can_delete, \
-    is_user_admin, user_not_admin, user_admin, is_bot_admin
+    is_user_admin, is_sender_admin, user_admin, is_bot_admin
+from fortizers.modules.helper_funcs.pipeline import add_message_handlers, stop_pipeline
 from fortizers.modules.log_channel import loggable
 from fortizers.modules.warns import warn
 from fortizers.modules.connection import connected
@@ -274,11 +275,16 @@ def unlock(update, context) -> str:
  
  
 @run_async
-@user_not_admin
 def del_lockables(update, context):
     chat = update.effective_chat  # type: Optional[Chat]
     message = update.effective_message  # type: Optional[Message]
  
+    # Most chats have nothing locked, skip them before asking who the sender is
+    if not sql.has_locks(chat.id):
+        return
+    if not update.effective_user or is_sender_admin(update):
+        return
+ 
     for lockable, filter in LOCK_TYPES.items():
         if lockable == "rtl":
             if sql.is_locked(chat.id, lockable) and can_delete(chat, context.bot.id):
@@ -292,6 +298,7 @@ def del_lockables(update, context):
                                 pass
                             else:
                                 LOGGER.exception("ERROR in lockables")
+                        stop_pipeline()
                         getconf = sql.get_lockconf(chat.id)
                         if getconf:
                             warn(update.effective_user, chat,
@@ -308,6 +315,7 @@ def del_lockables(update, context):
                                 pass
                             else:
                                 LOGGER.exception("ERROR in lockables")
+                        stop_pipeline()
                         getconf = sql.get_lockconf(chat.id)
                         if getconf:
                             warn(update.effective_user, chat,
@@ -325,6 +333,7 @@ def del_lockables(update, context):
                             pass
                         else:
                             LOGGER.exception("ERROR in lockables")
+                    stop_pipeline()
                     getconf = sql.get_lockconf(chat.id)
                     if getconf:
                         warn(update.effective_user, chat,
@@ -346,6 +355,7 @@ def del_lockables(update, context):
                         chat.kick_member(new_mem.id)
                         send_message(update.effective_message, tl(update.effective_message,
                                                                   "Hanya admin yang diizinkan menambahkan bot ke obrolan ini! Keluar dari sini!"))
+                        stop_pipeline()
                         getconf = sql.get_lockconf(chat.id)
                         if getconf:
                             warn(update.effective_user, chat,
@@ -360,6 +370,7 @@ def del_lockables(update, context):
                         pass
                     else:
                         LOGGER.exception("ERROR in lockables")
+                stop_pipeline()
                 getconf = sql.get_lockconf(chat.id)
                 if getconf:
                     warn(update.effective_user, chat,
@@ -559,5 +570,5 @@ dispatcher.add_handler(LOCKTYPES_HANDLER)
 dispatcher.add_handler(LOCKED_HANDLER)
 dispatcher.add_handler(LOCKWARNS_HANDLER)
  
-dispatcher.add_handler(MessageHandler(Filters.all & Filters.group, del_lockables), PERM_GROUP)
+add_message_handlers([MessageHandler(Filters.all & Filters.group, del_lockables)], PERM_GROUP)
  
\ No newline at end of file
@@ -1,16 +1,154 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, event, inspect, text, Table
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import StaticPool
+
+from fortizers import DB_URI, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_PRE_PING, DB_POOL_RECYCLE, \
+    DB_STATEMENT_TIMEOUT, LOGGER
+
+_SCOPE = threading.local()
+
+# Cache loads queued by the sql modules, run by load_caches() once all modules are imported
+CACHE_LOADERS = []
+CACHES_LOADED = False
+
 
-from fortizers import DB_URI
+# sqlite is only used by the tests and the scripts, the tables are written for postgres. Warns keep their reasons in
+# an array, sqlite can only hold it as text.
+@compiles(postgresql.ARRAY, "sqlite")
+def __compile_sqlite_array(element, compiler, **kw):
+    return "TEXT"
+
+
+# sqlite can't autoincrement a column of a composite primary key, nothing relies on it there
+@event.listens_for(Table, "before_create")
+def __drop_sqlite_composite_autoincrement(table, connection, **kw):
+    if connection.dialect.name == "sqlite" and len(table.primary_key.columns) > 1:
+        for column in table.primary_key.columns:
+            column.autoincrement = False
 
 
 def start() -> scoped_session:
-    engine = create_engine(DB_URI, client_encoding="utf8")
+    if DB_URI.startswith("sqlite"):
+        # Only used by the tests and the scripts, the pool and postgres options don't apply
+        if DB_URI in ("sqlite://", "sqlite:///:memory:"):
+            # Every connection would get an empty database of its own, share one so load_caches() threads see it
+            engine = create_engine(DB_URI, connect_args={'check_same_thread': False}, poolclass=StaticPool)
+        else:
+            engine = create_engine(DB_URI)
+    else:
+        connect_args = {}
+        if DB_STATEMENT_TIMEOUT:
+            # In milliseconds, applied by postgres to every statement of the connection
+            connect_args['options'] = "-c statement_timeout={}".format(DB_STATEMENT_TIMEOUT)
+        engine = create_engine(DB_URI, client_encoding="utf8", pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                               pool_pre_ping=DB_POOL_PRE_PING, pool_recycle=DB_POOL_RECYCLE,
+                               connect_args=connect_args)
     BASE.metadata.bind = engine
     BASE.metadata.create_all(engine)
     return scoped_session(sessionmaker(bind=engine, autoflush=False))
 
 
+@contextmanager
+def session_scope(commit=False):
+    """
+    One unit of work on this thread's session: commits at the end if `commit` is set, rolls back on errors and
+    hands the connection back to the pool. Nested scopes join the outermost one.
+    """
+    depth = getattr(_SCOPE, 'depth', 0)
+    _SCOPE.depth = depth + 1
+    session = SESSION()
+    try:
+        yield session
+        if commit and not depth:
+            session.commit()
+    except BaseException:
+        if not depth:
+            session.rollback()
+        raise
+    finally:
+        _SCOPE.depth = depth
+        if not depth:
+            session.close()
+
+
+def create_missing_indexes(table):
+    """
+    Adds the indexes declared on `table` that the database doesn't have yet. create(checkfirst=True) skips
+    tables that already exist, so this is what brings indexes added later to existing deployments.
+    """
+    engine = SESSION.get_bind()
+    if engine.dialect.name == "postgresql":
+        # The inspector leaves out expression indexes like lower(username) on postgres
+        existing = {x for (x,) in engine.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = :table"),
+                                                 table=table.name)}
+    elif engine.dialect.name == "sqlite":
+        # Same for the sqlite inspector
+        existing = {x for (x,) in engine.execute(text("SELECT name FROM sqlite_master WHERE type = 'index' "
+                                                      "AND tbl_name = :table"), table=table.name)}
+    else:
+        existing = {x['name'] for x in inspect(engine).get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name not in existing:
+            index.create(engine)
+
+
+def cache_loader(*loaders):
+    """
+    Queues the cache loads of a module for load_caches(). Loaders passed together run one after another, so later
+    ones can use what the earlier ones loaded. Each loader returns the number of rows it read.
+    """
+    if CACHES_LOADED:
+        # Module imported after startup, nothing to run it alongside
+        __run_loaders(loaders)
+    else:
+        CACHE_LOADERS.append(loaders)
+
+
+def __run_loaders(loaders):
+    for loader in loaders:
+        start = time.monotonic()
+        rows = loader()
+        LOGGER.info("Loaded {} rows for {}.{} in {:.2f}s".format(rows, loader.__module__.rsplit(".", 1)[-1],
+                                                               loader.__name__, time.monotonic() - start))
+
+
+def load_caches():
+    """Runs the queued cache loads in parallel, every thread gets its own session and so its own connection."""
+    global CACHES_LOADED
+    CACHES_LOADED = True
+    queued = list(CACHE_LOADERS)
+    CACHE_LOADERS.clear()
+    if not queued:
+        return
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=min(DB_POOL_SIZE, len(queued)), thread_name_prefix="cache-load") as pool:
+        # result() raises what a loader raised, startup shouldn't go on with an empty cache
+        for future in [pool.submit(__run_loaders, loaders) for loaders in queued]:
+            future.result()
+    LOGGER.info("Caches loaded in {:.2f}s".format(time.monotonic() - start))
+
+
+def create_missing_columns(table):
+    """
+    Adds the columns declared on `table` that the database doesn't have yet. Like create_missing_indexes, for
+    columns added to tables that existing deployments already created, they have to be nullable.
+    """
+    engine = SESSION.get_bind()
+    existing = {x['name'] for x in inspect(engine).get_columns(table.name)}
+    quote = engine.dialect.identifier_preparer.quote
+    for column in table.columns:
+        if column.name not in existing:
+            engine.execute(text("ALTER TABLE {} ADD COLUMN {} {}".format(
+                quote(table.name), quote(column.name), column.type.compile(engine.dialect))))
+
+
 BASE = declarative_base()
 SESSION = start()
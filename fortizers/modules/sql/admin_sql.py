@@ -3,7 +3,7 @@ from typing import Union
 
 from sqlalchemy import Column, Integer, String, Boolean
 
-from fortizers.modules.sql import SESSION, BASE
+from fortizers.modules.sql import SESSION, BASE, session_scope
 
 
 class PermanentPin(BASE):
@@ -33,10 +33,8 @@ def set_permapin(chat_id, message_id):
         SESSION.commit()
 
 def get_permapin(chat_id):
-    try:
-        permapin = SESSION.query(PermanentPin).get(str(chat_id))
+    with session_scope() as session:
+        permapin = session.query(PermanentPin).get(str(chat_id))
         if permapin:
             return permapin.message_id
         return 0
-    finally:
-        SESSION.close()
@@ -2,7 +2,7 @@ import threading
 
 from sqlalchemy import Column, UnicodeText, Boolean, Integer
 
-from fortizers.modules.sql import BASE, SESSION
+from fortizers.modules.sql import BASE, SESSION, session_scope, cache_loader
 
 
 class AFK(BASE):
@@ -69,11 +69,10 @@ def rm_afk(user_id):
 
 def __load_afk_users():
     global AFK_USERS
-    try:
-        all_afk = SESSION.query(AFK).all()
-        AFK_USERS = {user.user_id: user.reason for user in all_afk if user.is_afk}
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        all_afk = session.query(AFK.user_id, AFK.reason, AFK.is_afk).all()
+        AFK_USERS = {user_id: reason for user_id, reason, is_afk in all_afk if is_afk}
+    return len(all_afk)
 
 
-__load_afk_users()
+cache_loader(__load_afk_users)
@@ -1,12 +1,41 @@
 import threading
+import time
+from collections import deque
+from typing import Set, Tuple
 
 from sqlalchemy import String, Column, Integer, UnicodeText
 
-from fortizers.modules.sql import SESSION, BASE
+from fortizers.modules.sql import SESSION, BASE, session_scope, cache_loader
 
 DEF_COUNT = 0
 DEF_LIMIT = 0
-DEF_OBJ = (None, DEF_COUNT, DEF_LIMIT)
+DEF_SETTING = (1, "0")
+
+
+class FloodState:
+    """Consecutive message counter of one chat, changed in place on every message."""
+    __slots__ = ('user_id', 'count', 'limit')
+
+    def __init__(self, limit):
+        self.user_id = None
+        self.count = DEF_COUNT
+        self.limit = limit
+
+
+class FloodWindowState:
+    """
+    Sliding-window counters of one chat. Every active user has a ring buffer with the times of their last
+    `user_limit` messages, the chat has one with the (time, user_id) of the last `chat_limit` messages of anyone.
+    """
+    __slots__ = ('user_limit', 'seconds', 'chat_limit', 'users', 'chat_times')
+
+    def __init__(self, user_limit, seconds, chat_limit):
+        self.user_limit = user_limit
+        self.seconds = seconds
+        self.chat_limit = chat_limit
+        self.users = {}
+        self.chat_times = deque(maxlen=chat_limit) if chat_limit else None
+
 
 class FloodControl(BASE):
     __tablename__ = "antiflood"
@@ -36,13 +65,39 @@ class FloodSettings(BASE):
         return "<{} will executing {} for flood.>".format(self.chat_id, self.flood_type)
 
 
+class FloodWindow(BASE):
+    __tablename__ = "antiflood_window"
+    chat_id = Column(String(14), primary_key=True)
+    user_limit = Column(Integer, nullable=False)
+    seconds = Column(Integer, nullable=False)
+    chat_limit = Column(Integer, default=0)
+
+    def __init__(self, chat_id, user_limit, seconds, chat_limit=0):
+        self.chat_id = str(chat_id)
+        self.user_limit = user_limit
+        self.seconds = seconds
+        self.chat_limit = chat_limit
+
+    def __repr__(self):
+        return "<flood window of {} messages in {}s for {}>".format(self.user_limit, self.seconds, self.chat_id)
+
+
 FloodControl.__table__.create(checkfirst=True)
 FloodSettings.__table__.create(checkfirst=True)
+FloodWindow.__table__.create(checkfirst=True)
 
 INSERTION_FLOOD_LOCK = threading.RLock()
 INSERTION_FLOOD_SETTINGS_LOCK = threading.RLock()
+INSERTION_FLOOD_WINDOW_LOCK = threading.RLock()
 
+# Both keyed by the int chat id, chats with antiflood off are left out of CHAT_FLOOD
 CHAT_FLOOD = {}
+CHAT_FLOOD_SETTINGS = {}
+CHAT_FLOOD_WINDOWS = {}
+
+# Users who stayed quiet for a whole window are dropped from the ring buffers this often
+FLOOD_WINDOW_SWEEP = 5 * 60
+__last_sweep = time.monotonic()
 
 
 def set_flood(chat_id, amount):
@@ -54,35 +109,117 @@ def set_flood(chat_id, amount):
         flood.user_id = None
         flood.limit = amount
 
-        CHAT_FLOOD[str(chat_id)] = (None, DEF_COUNT, amount)
+        if amount:
+            CHAT_FLOOD[int(chat_id)] = FloodState(amount)
+        else:
+            CHAT_FLOOD.pop(int(chat_id), None)
 
         SESSION.add(flood)
         SESSION.commit()
 
 
-def update_flood(chat_id: str, user_id) -> bool:
-    if str(chat_id) in CHAT_FLOOD:
-        curr_user_id, count, limit = CHAT_FLOOD.get(str(chat_id), DEF_OBJ)
+def is_flood_enabled(chat_id: int) -> bool:
+    return chat_id in CHAT_FLOOD or chat_id in CHAT_FLOOD_WINDOWS
 
-        if limit == 0:  # no antiflood
-            return False
 
-        if user_id != curr_user_id or user_id is None:  # other user
-            CHAT_FLOOD[str(chat_id)] = (user_id, DEF_COUNT, limit)
-            return False
-
-        count += 1
-        if count > limit:  # too many msgs, kick
-            CHAT_FLOOD[str(chat_id)] = (None, DEF_COUNT, limit)
-            return True
+def update_flood(chat_id: int, user_id) -> bool:
+    state = CHAT_FLOOD.get(chat_id)
+    if state is None:  # no antiflood
+        return False
 
-        # default -> update
-        CHAT_FLOOD[str(chat_id)] = (user_id, count, limit)
+    if user_id != state.user_id or user_id is None:  # other user
+        state.user_id = user_id
+        state.count = DEF_COUNT
         return False
 
+    state.count += 1
+    if state.count > state.limit:  # too many msgs, kick
+        state.user_id = None
+        state.count = DEF_COUNT
+        return True
+
+    return False
+
+
+def update_flood_window(chat_id: int, user_id) -> Tuple[bool, Set[int]]:
+    """
+    Records a message for the sliding window. Returns whether the user went over their own limit, and the users
+    with messages in the burst when the whole chat went over its limit (empty otherwise).
+    """
+    window = CHAT_FLOOD_WINDOWS.get(chat_id)
+    if window is None:
+        return False, set()
+
+    now = time.monotonic()
+    if now - __last_sweep > FLOOD_WINDOW_SWEEP:
+        __sweep_flood_windows(now)
+
+    burst = set()
+    if window.chat_times is not None:
+        window.chat_times.append((now, user_id))
+        if len(window.chat_times) == window.chat_limit and now - window.chat_times[0][0] <= window.seconds:
+            burst = {x for _, x in window.chat_times}
+            window.chat_times.clear()
+
+    flooded = False
+
+    times = window.users.get(user_id)
+    if times is None:
+        times = window.users[user_id] = deque(maxlen=window.user_limit)
+    times.append(now)
+    if len(times) == window.user_limit and now - times[0] <= window.seconds:
+        window.users.pop(user_id, None)
+        flooded = True
+
+    return flooded, burst
+
+
+def __sweep_flood_windows(now):
+    global __last_sweep
+    with INSERTION_FLOOD_WINDOW_LOCK:
+        if now - __last_sweep <= FLOOD_WINDOW_SWEEP:
+            return
+        __last_sweep = now
+        for window in list(CHAT_FLOOD_WINDOWS.values()):
+            for user_id, times in list(window.users.items()):
+                if not times or now - times[-1] > window.seconds:
+                    window.users.pop(user_id, None)
+
+
+def set_flood_window(chat_id, user_limit, seconds, chat_limit=0):
+    """Turns on sliding-window antiflood, or turns it off when user_limit is 0."""
+    with INSERTION_FLOOD_WINDOW_LOCK:
+        window = SESSION.query(FloodWindow).get(str(chat_id))
+        if not user_limit:
+            CHAT_FLOOD_WINDOWS.pop(int(chat_id), None)
+            if window:
+                SESSION.delete(window)
+                SESSION.commit()
+            SESSION.close()
+            return
+
+        if not window:
+            window = FloodWindow(chat_id, user_limit, seconds, chat_limit)
+        window.user_limit = user_limit
+        window.seconds = seconds
+        window.chat_limit = chat_limit
+        CHAT_FLOOD_WINDOWS[int(chat_id)] = FloodWindowState(user_limit, seconds, chat_limit)
+
+        SESSION.add(window)
+        SESSION.commit()
+
+
+def get_flood_window(chat_id):
+    """(user_limit, seconds, chat_limit), or None when sliding-window antiflood is off."""
+    window = CHAT_FLOOD_WINDOWS.get(int(chat_id))
+    if window is None:
+        return None
+    return window.user_limit, window.seconds, window.chat_limit
+
 
 def get_flood_limit(chat_id):
-    return CHAT_FLOOD.get(str(chat_id), DEF_OBJ)[2]
+    state = CHAT_FLOOD.get(int(chat_id))
+    return state.limit if state else DEF_LIMIT
 
 
 def set_flood_strength(chat_id, flood_type, value):
@@ -99,41 +236,60 @@ def set_flood_strength(chat_id, flood_type, value):
 
         curr_setting.flood_type = int(flood_type)
         curr_setting.value = str(value)
+        CHAT_FLOOD_SETTINGS[int(chat_id)] = (int(flood_type), str(value))
 
         SESSION.add(curr_setting)
         SESSION.commit()
 
 
 def get_flood_setting(chat_id):
-    try:
-        setting = SESSION.query(FloodSettings).get(str(chat_id))
-        if setting:
-            return setting.flood_type, setting.value
-        else:
-            return 1, "0"
-
-    finally:
-        SESSION.close()
+    return CHAT_FLOOD_SETTINGS.get(int(chat_id), DEF_SETTING)
 
 
 def migrate_chat(old_chat_id, new_chat_id):
     with INSERTION_FLOOD_LOCK:
         flood = SESSION.query(FloodControl).get(str(old_chat_id))
         if flood:
-            CHAT_FLOOD[str(new_chat_id)] = CHAT_FLOOD.get(str(old_chat_id), DEF_OBJ)
+            if int(old_chat_id) in CHAT_FLOOD:
+                CHAT_FLOOD[int(new_chat_id)] = CHAT_FLOOD.pop(int(old_chat_id))
             flood.chat_id = str(new_chat_id)
             SESSION.commit()
 
         SESSION.close()
 
+    with INSERTION_FLOOD_SETTINGS_LOCK:
+        setting = SESSION.query(FloodSettings).get(str(old_chat_id))
+        if setting:
+            if int(old_chat_id) in CHAT_FLOOD_SETTINGS:
+                CHAT_FLOOD_SETTINGS[int(new_chat_id)] = CHAT_FLOOD_SETTINGS.pop(int(old_chat_id))
+            setting.chat_id = str(new_chat_id)
+            SESSION.commit()
+
+        SESSION.close()
+
+    with INSERTION_FLOOD_WINDOW_LOCK:
+        window = SESSION.query(FloodWindow).get(str(old_chat_id))
+        if window:
+            if int(old_chat_id) in CHAT_FLOOD_WINDOWS:
+                CHAT_FLOOD_WINDOWS[int(new_chat_id)] = CHAT_FLOOD_WINDOWS.pop(int(old_chat_id))
+            window.chat_id = str(new_chat_id)
+            SESSION.commit()
 
-def __load_flood_settings():
-    global CHAT_FLOOD
-    try:
-        all_chats = SESSION.query(FloodControl).all()
-        CHAT_FLOOD = {chat.chat_id: (None, DEF_COUNT, chat.limit) for chat in all_chats}
-    finally:
         SESSION.close()
 
 
-__load_flood_settings()
+def __load_flood_settings():
+    global CHAT_FLOOD, CHAT_FLOOD_SETTINGS, CHAT_FLOOD_WINDOWS
+    with session_scope() as session:
+        all_chats = session.query(FloodControl.chat_id, FloodControl.limit).all()
+        CHAT_FLOOD = {int(chat_id): FloodState(limit) for chat_id, limit in all_chats if limit}
+        all_settings = session.query(FloodSettings.chat_id, FloodSettings.flood_type, FloodSettings.value).all()
+        CHAT_FLOOD_SETTINGS = {int(chat_id): (flood_type, value) for chat_id, flood_type, value in all_settings}
+        all_windows = session.query(FloodWindow.chat_id, FloodWindow.user_limit, FloodWindow.seconds,
+                                    FloodWindow.chat_limit).all()
+        CHAT_FLOOD_WINDOWS = {int(chat_id): FloodWindowState(user_limit, seconds, chat_limit or 0)
+                              for chat_id, user_limit, seconds, chat_limit in all_windows}
+    return len(all_chats) + len(all_settings) + len(all_windows)
+
+
+cache_loader(__load_flood_settings)
@@ -2,7 +2,7 @@ import threading
  
 from sqlalchemy import Column, Integer, UnicodeText
  
-from fortizers.modules.sql import SESSION, BASE
+from fortizers.modules.sql import SESSION, BASE, session_scope
  
  
 class UserInfo(BASE):
@@ -38,8 +38,8 @@ INSERTION_LOCK = threading.RLock()
  
  
 def get_user_me_info(user_id):
-    userinfo = SESSION.query(UserInfo).get(user_id)
-    SESSION.close()
+    with session_scope() as session:
+        userinfo = session.query(UserInfo).get(user_id)
     if userinfo:
         return userinfo.info
     return None
@@ -57,8 +57,8 @@ def set_user_me_info(user_id, info):
  
  
 def get_user_bio(user_id):
-    userbio = SESSION.query(UserBio).get(user_id)
-    SESSION.close()
+    with session_scope() as session:
+        userbio = session.query(UserBio).get(user_id)
     if userbio:
         return userbio.bio
     return None
@@ -1,8 +1,9 @@
+import re
 import threading
 
 from sqlalchemy import func, distinct, Column, String, UnicodeText, Integer
 
-from fortizers.modules.sql import SESSION, BASE
+from fortizers.modules.sql import SESSION, BASE, session_scope, cache_loader
 
 
 class BlackListFilters(BASE):
@@ -45,6 +46,8 @@ BLACKLIST_SETTINGS_INSERTION_LOCK = threading.RLock()
 
 CHAT_BLACKLISTS = {}
 CHAT_SETTINGS_BLACKLISTS = {}
+# chat_id -> (pattern, {lowered trigger: trigger}), built on the first lookup after the chat's blacklist changed
+CHAT_BLACKLIST_MATCHERS = {}
 
 
 def add_to_blacklist(chat_id, trigger):
@@ -58,6 +61,19 @@ def add_to_blacklist(chat_id, trigger):
             CHAT_BLACKLISTS[str(chat_id)] = {trigger}
         else:
             CHAT_BLACKLISTS.get(str(chat_id), set()).add(trigger)
+        CHAT_BLACKLIST_MATCHERS.pop(str(chat_id), None)
+
+
+def bulk_add_to_blacklist(chat_id, triggers):
+    """Adds many triggers in one transaction, used by backup imports."""
+    triggers = set(triggers)
+    with BLACKLIST_FILTER_INSERTION_LOCK:
+        with session_scope(commit=True) as session:
+            existing = {x for (x,) in session.query(BlackListFilters.trigger).filter(
+                BlackListFilters.chat_id == str(chat_id), BlackListFilters.trigger.in_(triggers))}
+            session.bulk_save_objects([BlackListFilters(str(chat_id), x) for x in triggers - existing])
+        CHAT_BLACKLISTS[str(chat_id)] = CHAT_BLACKLISTS.get(str(chat_id), set()) | triggers
+        CHAT_BLACKLIST_MATCHERS.pop(str(chat_id), None)
 
 
 def rm_from_blacklist(chat_id, trigger):
@@ -66,6 +82,7 @@ def rm_from_blacklist(chat_id, trigger):
         if blacklist_filt:
             if trigger in CHAT_BLACKLISTS.get(str(chat_id), set()):  # sanity check
                 CHAT_BLACKLISTS.get(str(chat_id), set()).remove(trigger)
+            CHAT_BLACKLIST_MATCHERS.pop(str(chat_id), None)
 
             SESSION.delete(blacklist_filt)
             SESSION.commit()
@@ -79,25 +96,51 @@ def get_chat_blacklist(chat_id):
     return CHAT_BLACKLISTS.get(str(chat_id), set())
 
 
+def __build_blacklist_matcher(triggers):
+    # One alternation for all triggers, longest first so the widest trigger wins at the same position
+    ordered = sorted(triggers, key=len, reverse=True)
+    pattern = re.compile(r"(?: |^|[^\w])(" + "|".join(re.escape(x) for x in ordered) + r")(?: |$|[^\w])",
+                         flags=re.IGNORECASE)
+    return pattern, {x.lower(): x for x in ordered}
+
+
+def match_blacklist(chat_id, text):
+    """Returns the first blacklisted trigger found in text, or None."""
+    triggers = CHAT_BLACKLISTS.get(str(chat_id))
+    if not triggers:
+        return None
+
+    matcher = CHAT_BLACKLIST_MATCHERS.get(str(chat_id))
+    if matcher is None:
+        with BLACKLIST_FILTER_INSERTION_LOCK:
+            matcher = CHAT_BLACKLIST_MATCHERS[str(chat_id)] = __build_blacklist_matcher(triggers)
+
+    pattern, lowered = matcher
+    found = pattern.search(text)
+    if not found:
+        return None
+    trigger = lowered.get(found.group(1).lower())
+    if trigger is None:
+        # Case folding that lower() doesn't undo, find the trigger the slow way
+        for x in triggers:
+            if re.fullmatch(re.escape(x), found.group(1), flags=re.IGNORECASE):
+                return x
+    return trigger
+
+
 def num_blacklist_filters():
-    try:
-        return SESSION.query(BlackListFilters).count()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(BlackListFilters).count()
 
 
 def num_blacklist_chat_filters(chat_id):
-    try:
-        return SESSION.query(BlackListFilters.chat_id).filter(BlackListFilters.chat_id == str(chat_id)).count()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(BlackListFilters.chat_id).filter(BlackListFilters.chat_id == str(chat_id)).count()
 
 
 def num_blacklist_filter_chats():
-    try:
-        return SESSION.query(func.count(distinct(BlackListFilters.chat_id))).scalar()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(func.count(distinct(BlackListFilters.chat_id))).scalar()
 
 
 def set_blacklist_strength(chat_id, blacklist_type, value):
@@ -124,41 +167,28 @@ def set_blacklist_strength(chat_id, blacklist_type, value):
         SESSION.commit()
 
 def get_blacklist_setting(chat_id):
-    try:
-        setting = CHAT_SETTINGS_BLACKLISTS.get(str(chat_id))
-        if setting:
-            return setting['blacklist_type'], setting['value']
-        else:
-            return 1, "0"
-
-    finally:
-        SESSION.close()
+    setting = CHAT_SETTINGS_BLACKLISTS.get(str(chat_id))
+    if setting:
+        return setting['blacklist_type'], setting['value']
+    else:
+        return 1, "0"
 
 def __load_chat_blacklists():
     global CHAT_BLACKLISTS
-    try:
-        chats = SESSION.query(BlackListFilters.chat_id).distinct().all()
-        for (chat_id,) in chats:  # remove tuple by ( ,)
-            CHAT_BLACKLISTS[chat_id] = []
-
-        all_filters = SESSION.query(BlackListFilters).all()
-        for x in all_filters:
-            CHAT_BLACKLISTS[x.chat_id] += [x.trigger]
-
-        CHAT_BLACKLISTS = {x: set(y) for x, y in CHAT_BLACKLISTS.items()}
-
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        all_filters = session.query(BlackListFilters.chat_id, BlackListFilters.trigger).all()
+        for chat_id, trigger in all_filters:
+            CHAT_BLACKLISTS.setdefault(chat_id, set()).add(trigger)
+    return len(all_filters)
 
 def __load_chat_settings_blacklists():
     global CHAT_SETTINGS_BLACKLISTS
-    try:
-        chats_settings = SESSION.query(BlacklistSettings).all()
-        for x in chats_settings:  # remove tuple by ( ,)
-            CHAT_SETTINGS_BLACKLISTS[x.chat_id] = {'blacklist_type': x.blacklist_type, 'value': x.value}
-
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        chats_settings = session.query(BlacklistSettings.chat_id, BlacklistSettings.blacklist_type,
+                                       BlacklistSettings.value).all()
+        for chat_id, blacklist_type, value in chats_settings:
+            CHAT_SETTINGS_BLACKLISTS[chat_id] = {'blacklist_type': blacklist_type, 'value': value}
+    return len(chats_settings)
 
 
 def migrate_chat(old_chat_id, new_chat_id):
@@ -167,7 +197,11 @@ def migrate_chat(old_chat_id, new_chat_id):
         for filt in chat_filters:
             filt.chat_id = str(new_chat_id)
         SESSION.commit()
+        if str(old_chat_id) in CHAT_BLACKLISTS:
+            CHAT_BLACKLISTS[str(new_chat_id)] = CHAT_BLACKLISTS.pop(str(old_chat_id))
+        CHAT_BLACKLIST_MATCHERS.pop(str(old_chat_id), None)
+        CHAT_BLACKLIST_MATCHERS.pop(str(new_chat_id), None)
 
 
-__load_chat_blacklists()
-__load_chat_settings_blacklists()
+cache_loader(__load_chat_blacklists)
+cache_loader(__load_chat_settings_blacklists)
@@ -2,7 +2,7 @@ import threading
 
 from sqlalchemy import func, distinct, Column, String, UnicodeText, Integer
 
-from fortizers.modules.sql import SESSION, BASE
+from fortizers.modules.sql import SESSION, BASE, session_scope, cache_loader
 
 
 class StickersFilters(BASE):
@@ -60,6 +60,17 @@ def add_to_stickers(chat_id, trigger):
             CHAT_STICKERS.get(str(chat_id), set()).add(trigger)
 
 
+def bulk_add_to_stickers(chat_id, triggers):
+    """Adds many stickers in one transaction, used by backup imports."""
+    triggers = set(triggers)
+    with STICKERS_FILTER_INSERTION_LOCK:
+        with session_scope(commit=True) as session:
+            existing = {x for (x,) in session.query(StickersFilters.trigger).filter(
+                StickersFilters.chat_id == str(chat_id), StickersFilters.trigger.in_(triggers))}
+            session.bulk_save_objects([StickersFilters(str(chat_id), x) for x in triggers - existing])
+        CHAT_STICKERS[str(chat_id)] = CHAT_STICKERS.get(str(chat_id), set()) | triggers
+
+
 def rm_from_stickers(chat_id, trigger):
     with STICKERS_FILTER_INSERTION_LOCK:
         stickers_filt = SESSION.query(StickersFilters).get((str(chat_id), trigger))
@@ -80,24 +91,18 @@ def get_chat_stickers(chat_id):
 
 
 def num_stickers_filters():
-    try:
-        return SESSION.query(StickersFilters).count()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(StickersFilters).count()
 
 
 def num_stickers_chat_filters(chat_id):
-    try:
-        return SESSION.query(StickersFilters.chat_id).filter(StickersFilters.chat_id == str(chat_id)).count()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(StickersFilters.chat_id).filter(StickersFilters.chat_id == str(chat_id)).count()
 
 
 def num_stickers_filter_chats():
-    try:
-        return SESSION.query(func.count(distinct(StickersFilters.chat_id))).scalar()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(func.count(distinct(StickersFilters.chat_id))).scalar()
 
 
 def set_blacklist_strength(chat_id, blacklist_type, value):
@@ -124,43 +129,30 @@ def set_blacklist_strength(chat_id, blacklist_type, value):
         SESSION.commit()
 
 def get_blacklist_setting(chat_id):
-    try:
-        setting = CHAT_BLSTICK_BLACKLISTS.get(str(chat_id))
-        if setting:
-            return setting['blacklist_type'], setting['value']
-        else:
-            return 1, "0"
-
-    finally:
-        SESSION.close()
+    setting = CHAT_BLSTICK_BLACKLISTS.get(str(chat_id))
+    if setting:
+        return setting['blacklist_type'], setting['value']
+    else:
+        return 1, "0"
 
 
 def __load_CHAT_STICKERS():
     global CHAT_STICKERS
-    try:
-        chats = SESSION.query(StickersFilters.chat_id).distinct().all()
-        for (chat_id,) in chats:  # remove tuple by ( ,)
-            CHAT_STICKERS[chat_id] = []
-
-        all_filters = SESSION.query(StickersFilters).all()
-        for x in all_filters:
-            CHAT_STICKERS[x.chat_id] += [x.trigger]
-
-        CHAT_STICKERS = {x: set(y) for x, y in CHAT_STICKERS.items()}
-
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        all_filters = session.query(StickersFilters.chat_id, StickersFilters.trigger).all()
+        for chat_id, trigger in all_filters:
+            CHAT_STICKERS.setdefault(chat_id, set()).add(trigger)
+    return len(all_filters)
 
 
 def __load_chat_stickerset_blacklists():
     global CHAT_BLSTICK_BLACKLISTS
-    try:
-        chats_settings = SESSION.query(StickerSettings).all()
-        for x in chats_settings:  # remove tuple by ( ,)
-            CHAT_BLSTICK_BLACKLISTS[x.chat_id] = {'blacklist_type': x.blacklist_type, 'value': x.value}
-
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        chats_settings = session.query(StickerSettings.chat_id, StickerSettings.blacklist_type,
+                                       StickerSettings.value).all()
+        for chat_id, blacklist_type, value in chats_settings:
+            CHAT_BLSTICK_BLACKLISTS[chat_id] = {'blacklist_type': blacklist_type, 'value': value}
+    return len(chats_settings)
 
 def migrate_chat(old_chat_id, new_chat_id):
     with STICKERS_FILTER_INSERTION_LOCK:
@@ -170,5 +162,5 @@ def migrate_chat(old_chat_id, new_chat_id):
         SESSION.commit()
 
 
-__load_CHAT_STICKERS()
-__load_chat_stickerset_blacklists()
+cache_loader(__load_CHAT_STICKERS)
+cache_loader(__load_chat_stickerset_blacklists)
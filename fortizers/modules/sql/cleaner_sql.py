@@ -2,7 +2,7 @@ import threading
 
 from sqlalchemy import Column, UnicodeText, Boolean, Integer
 
-from fortizers.modules.sql import BASE, SESSION
+from fortizers.modules.sql import BASE, SESSION, session_scope, cache_loader
 
 
 class CleanerBlueText(BASE):
@@ -50,13 +50,12 @@ def set_cleanbt(chat_id, is_enable):
 
 def __load_cleaner_chats():
     global CLEANER_BT_CHATS
-    try:
-        all_chats = SESSION.query(CleanerBlueText).all()
-        for x in all_chats:
-            if x.is_enable:
-                CLEANER_BT_CHATS.append(str(x.chat_id))
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        all_chats = session.query(CleanerBlueText.chat_id, CleanerBlueText.is_enable).all()
+        for chat_id, is_enable in all_chats:
+            if is_enable:
+                CLEANER_BT_CHATS.append(str(chat_id))
+    return len(all_chats)
 
 
-__load_cleaner_chats()
+cache_loader(__load_cleaner_chats)
@@ -5,7 +5,7 @@ from typing import Union
 from sqlalchemy import Column, String, Boolean, UnicodeText, Integer, func, distinct
 
 from fortizers.modules.helper_funcs.msg_types import Types
-from fortizers.modules.sql import SESSION, BASE
+from fortizers.modules.sql import SESSION, BASE, session_scope, cache_loader
 
 
 class ChatAccessConnectionSettings(BASE):
@@ -57,13 +57,11 @@ HISTORY_CONNECT = {}
 
 
 def allow_connect_to_chat(chat_id: Union[str, int]) -> bool:
-    try:
-        chat_setting = SESSION.query(ChatAccessConnectionSettings).get(str(chat_id))
+    with session_scope() as session:
+        chat_setting = session.query(ChatAccessConnectionSettings).get(str(chat_id))
         if chat_setting:
             return chat_setting.allow_connect_to_chat
         return False
-    finally:
-        SESSION.close()
         
 
 def set_allow_connect_to_chat(chat_id: Union[int, str], setting: bool):
@@ -89,17 +87,13 @@ def connect(user_id, chat_id):
 
 
 def get_connected_chat(user_id):
-    try:
-        return SESSION.query(Connection).get((int(user_id)))
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(Connection).get((int(user_id)))
 
 
 def curr_connection(chat_id):
-    try:
-        return SESSION.query(Connection).get((str(chat_id)))
-    finally :
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(Connection).get((str(chat_id)))
 
 
 
@@ -170,15 +164,12 @@ def clear_history_conn(user_id):
 
 def __load_user_history():
     global HISTORY_CONNECT
-    try:
-        qall = SESSION.query(ConnectionHistory).all()
+    with session_scope() as session:
+        qall = session.query(ConnectionHistory.user_id, ConnectionHistory.conn_time, ConnectionHistory.chat_name,
+                             ConnectionHistory.chat_id).all()
         HISTORY_CONNECT = {}
-        for x in qall:
-            check = HISTORY_CONNECT.get(x.user_id)
-            if check == None:
-                HISTORY_CONNECT[x.user_id] = {}
-            HISTORY_CONNECT[x.user_id][x.conn_time] = {'chat_name': x.chat_name, 'chat_id': x.chat_id}
-    finally:
-        SESSION.close()
-
-__load_user_history()
+        for user_id, conn_time, chat_name, chat_id in qall:
+            HISTORY_CONNECT.setdefault(user_id, {})[conn_time] = {'chat_name': chat_name, 'chat_id': chat_id}
+    return len(qall)
+
+cache_loader(__load_user_history)
@@ -1,9 +1,11 @@
 import threading
+from collections import OrderedDict
 
-from sqlalchemy import Column, String, UnicodeText, Boolean, Integer, distinct, func
+from sqlalchemy import Column, String, UnicodeText, Boolean, Integer, Index, distinct, func
 
 from fortizers.modules.helper_funcs.msg_types import Types
-from fortizers.modules.sql import BASE, SESSION
+from fortizers.modules.helper_funcs.string_handling import build_keyword_matcher, find_longest_keyword
+from fortizers.modules.sql import BASE, SESSION, session_scope, create_missing_indexes, cache_loader
 
 
 class CustomFilters(BASE):
@@ -89,6 +91,8 @@ class Buttons(BASE):
 	name = Column(UnicodeText, nullable=False)
 	url = Column(UnicodeText, nullable=False)
 	same_line = Column(Boolean, default=False)
+	# The primary key starts with id, so it doesn't help lookups by chat and keyword
+	__table_args__ = (Index('ix_cust_filter_urls_chat_id_keyword', 'chat_id', 'keyword'),)
 
 	def __init__(self, chat_id, keyword, name, url, same_line=False):
 		self.chat_id = str(chat_id)
@@ -101,16 +105,41 @@ class Buttons(BASE):
 CustomFilters.__table__.create(checkfirst=True)
 Buttons.__table__.create(checkfirst=True)
 
+create_missing_indexes(Buttons.__table__)
+
 CUST_FILT_LOCK = threading.RLock()
 BUTTON_LOCK = threading.RLock()
 CHAT_FILTERS = {}
+# chat_id -> build_keyword_matcher result, built on the first lookup after the chat's filters changed
+CHAT_FILTER_MATCHERS = {}
+# (chat_id, keyword) -> FilterReply, least recently used first
+FILTER_REPLY_CACHE = OrderedDict()
+FILTER_REPLY_CACHE_SIZE = 1000
+FILTER_REPLY_LOCK = threading.Lock()
+
+
+class FilterReply:
+	"""A filter with its buttons, as kept in FILTER_REPLY_CACHE. `keyboard` is left for the caller to fill once."""
+	__slots__ = ('filt', 'buttons', 'keyboard')
+
+	def __init__(self, filt, buttons):
+		self.filt = filt
+		self.buttons = buttons
+		self.keyboard = None
+
+
+def __uncache_filter_reply(chat_id, keyword=None):
+	with FILTER_REPLY_LOCK:
+		if keyword is not None:
+			FILTER_REPLY_CACHE.pop((str(chat_id), keyword), None)
+			return
+		for key in [x for x in FILTER_REPLY_CACHE if x[0] == str(chat_id)]:
+			del FILTER_REPLY_CACHE[key]
 
 
 def get_all_filters():
-	try:
-		return SESSION.query(CustomFilters).all()
-	finally:
-		SESSION.close()
+	with session_scope() as session:
+		return session.query(CustomFilters).all()
 
 
 def add_filter(chat_id, keyword, reply, is_sticker=False, is_document=False, is_image=False, is_audio=False,
@@ -136,14 +165,42 @@ def add_filter(chat_id, keyword, reply, is_sticker=False, is_document=False, is_
 		if keyword not in CHAT_FILTERS.get(str(chat_id), []):
 			CHAT_FILTERS[str(chat_id)] = sorted(CHAT_FILTERS.get(str(chat_id), []) + [keyword],
 												key=lambda x: (-len(x), x))
+			CHAT_FILTER_MATCHERS.pop(str(chat_id), None)
 
 		SESSION.add(filt)
 		SESSION.commit()
+		__uncache_filter_reply(chat_id, keyword)
 
 	for b_name, url, same_line in buttons:
 		add_note_button_to_db(chat_id, keyword, b_name, url, same_line)
 
 
+def bulk_add_filters(chat_id, filters):
+	"""
+	Adds or replaces many filters in one transaction, used by backup imports. `filters` holds
+	(keyword, reply, is_sticker, is_document, is_image, is_audio, is_voice, is_video, buttons) tuples.
+	"""
+	filters = {x[0]: x for x in filters}
+	if not filters:
+		return
+	with CUST_FILT_LOCK, BUTTON_LOCK:
+		with session_scope(commit=True) as session:
+			session.query(Buttons).filter(Buttons.chat_id == str(chat_id), Buttons.keyword.in_(filters)).delete(
+				synchronize_session=False)
+			session.query(CustomFilters).filter(CustomFilters.chat_id == str(chat_id),
+												CustomFilters.keyword.in_(filters)).delete(synchronize_session=False)
+			session.bulk_save_objects([CustomFilters(str(chat_id), keyword, reply, is_sticker, is_document, is_image,
+													 is_audio, is_voice, is_video, bool(buttons))
+									   for keyword, reply, is_sticker, is_document, is_image, is_audio, is_voice,
+										   is_video, buttons in filters.values()])
+			session.bulk_save_objects([Buttons(chat_id, x[0], b_name, url, same_line)
+									   for x in filters.values() for b_name, url, same_line in x[-1]])
+		CHAT_FILTERS[str(chat_id)] = sorted(set(CHAT_FILTERS.get(str(chat_id), [])) | set(filters),
+											key=lambda x: (-len(x), x))
+		CHAT_FILTER_MATCHERS.pop(str(chat_id), None)
+		__uncache_filter_reply(chat_id)
+
+
 def new_add_filter(chat_id, keyword, reply_text, file_type, file_id, buttons):
 	global CHAT_FILTERS
 
@@ -165,9 +222,11 @@ def new_add_filter(chat_id, keyword, reply_text, file_type, file_id, buttons):
 		if keyword not in CHAT_FILTERS.get(str(chat_id), []):
 			CHAT_FILTERS[str(chat_id)] = sorted(CHAT_FILTERS.get(str(chat_id), []) + [keyword],
 												key=lambda x: (-len(x), x))
+			CHAT_FILTER_MATCHERS.pop(str(chat_id), None)
 
 		SESSION.add(filt)
 		SESSION.commit()
+		__uncache_filter_reply(chat_id, keyword)
 
 	for b_name, url, same_line in buttons:
 		add_note_button_to_db(chat_id, keyword, b_name, url, same_line)
@@ -180,6 +239,7 @@ def remove_filter(chat_id, keyword):
 		if filt:
 			if keyword in CHAT_FILTERS.get(str(chat_id), []):  # Sanity check
 				CHAT_FILTERS.get(str(chat_id), []).remove(keyword)
+				CHAT_FILTER_MATCHERS.pop(str(chat_id), None)
 
 			with BUTTON_LOCK:
 				prev_buttons = SESSION.query(Buttons).filter(Buttons.chat_id == str(chat_id),
@@ -189,6 +249,7 @@ def remove_filter(chat_id, keyword):
 
 			SESSION.delete(filt)
 			SESSION.commit()
+			__uncache_filter_reply(chat_id, keyword)
 			return True
 
 		SESSION.close()
@@ -199,19 +260,51 @@ def get_chat_triggers(chat_id):
 	return CHAT_FILTERS.get(str(chat_id), set())
 
 
+def match_filter(chat_id, text):
+	"""Returns the keyword that should answer text, the longest one when several match, or None."""
+	keywords = CHAT_FILTERS.get(str(chat_id))
+	if not keywords:
+		return None
+
+	matcher = CHAT_FILTER_MATCHERS.get(str(chat_id))
+	if matcher is None:
+		with CUST_FILT_LOCK:
+			matcher = CHAT_FILTER_MATCHERS[str(chat_id)] = build_keyword_matcher(keywords)
+	return find_longest_keyword(matcher, text)
+
+
 def get_chat_filters(chat_id):
-	try:
-		return SESSION.query(CustomFilters).filter(CustomFilters.chat_id == str(chat_id)).order_by(
+	with session_scope() as session:
+		return session.query(CustomFilters).filter(CustomFilters.chat_id == str(chat_id)).order_by(
 			func.length(CustomFilters.keyword).desc()).order_by(CustomFilters.keyword.asc()).all()
-	finally:
-		SESSION.close()
 
 
 def get_filter(chat_id, keyword):
-	try:
-		return SESSION.query(CustomFilters).get((str(chat_id), keyword))
-	finally:
-		SESSION.close()
+	with session_scope() as session:
+		return session.query(CustomFilters).get((str(chat_id), keyword))
+
+
+def get_filter_reply(chat_id, keyword):
+	"""FilterReply for a keyword, from the cache when possible. None if the filter doesn't exist."""
+	key = (str(chat_id), keyword)
+	with FILTER_REPLY_LOCK:
+		reply = FILTER_REPLY_CACHE.get(key)
+		if reply is not None:
+			FILTER_REPLY_CACHE.move_to_end(key)
+			return reply
+
+	# Under the write lock, so a filter being replaced can't be cached half way
+	with CUST_FILT_LOCK:
+		filt = get_filter(chat_id, keyword)
+		if not filt:
+			return None
+		reply = FilterReply(filt, get_buttons(chat_id, keyword))
+
+		with FILTER_REPLY_LOCK:
+			FILTER_REPLY_CACHE[key] = reply
+			if len(FILTER_REPLY_CACHE) > FILTER_REPLY_CACHE_SIZE:
+				FILTER_REPLY_CACHE.popitem(last=False)
+	return reply
 
 
 def add_note_button_to_db(chat_id, keyword, b_name, url, same_line):
@@ -219,51 +312,40 @@ def add_note_button_to_db(chat_id, keyword, b_name, url, same_line):
 		button = Buttons(chat_id, keyword, b_name, url, same_line)
 		SESSION.add(button)
 		SESSION.commit()
+		__uncache_filter_reply(chat_id, keyword)
 
 
 def get_buttons(chat_id, keyword):
-	try:
-		return SESSION.query(Buttons).filter(Buttons.chat_id == str(chat_id), Buttons.keyword == keyword).order_by(
+	with session_scope() as session:
+		return session.query(Buttons).filter(Buttons.chat_id == str(chat_id), Buttons.keyword == keyword).order_by(
 			Buttons.id).all()
-	finally:
-		SESSION.close()
 
 
 def num_filters():
-	try:
-		return SESSION.query(CustomFilters).count()
-	finally:
-		SESSION.close()
+	with session_scope() as session:
+		return session.query(CustomFilters).count()
 
 
 def num_chats():
-	try:
-		return SESSION.query(func.count(distinct(CustomFilters.chat_id))).scalar()
-	finally:
-		SESSION.close()
+	with session_scope() as session:
+		return session.query(func.count(distinct(CustomFilters.chat_id))).scalar()
 
 
 def __load_chat_filters():
 	global CHAT_FILTERS
-	try:
-		chats = SESSION.query(CustomFilters.chat_id).distinct().all()
-		for (chat_id,) in chats:  # remove tuple by ( ,)
-			CHAT_FILTERS[chat_id] = []
-
-		all_filters = SESSION.query(CustomFilters).all()
-		for x in all_filters:
-			CHAT_FILTERS[x.chat_id] += [x.keyword]
+	with session_scope() as session:
+		all_filters = session.query(CustomFilters.chat_id, CustomFilters.keyword).all()
+		for chat_id, keyword in all_filters:
+			CHAT_FILTERS.setdefault(chat_id, []).append(keyword)
 
 		CHAT_FILTERS = {x: sorted(set(y), key=lambda i: (-len(i), i)) for x, y in CHAT_FILTERS.items()}
-
-	finally:
-		SESSION.close()
+	return len(all_filters)
 
 
 # ONLY USE FOR MIGRATE OLD FILTERS TO NEW FILTERS
 def __migrate_filters():
-	try:
-		all_filters = SESSION.query(CustomFilters).distinct().all()
+	with session_scope() as session:
+		all_filters = session.query(CustomFilters).distinct().all()
 		for x in all_filters:
 			if x.is_document:
 				file_type = Types.DOCUMENT
@@ -289,11 +371,8 @@ def __migrate_filters():
 			else:
 				filt = CustomFilters(str(x.chat_id), x.keyword, None, file_type.value, x.reply)
 
-			SESSION.add(filt)
-			SESSION.commit()
-
-	finally:
-		SESSION.close()
+			session.add(filt)
+			session.commit()
 
 
 def migrate_chat(old_chat_id, new_chat_id):
@@ -304,12 +383,15 @@ def migrate_chat(old_chat_id, new_chat_id):
 		SESSION.commit()
 		CHAT_FILTERS[str(new_chat_id)] = CHAT_FILTERS[str(old_chat_id)]
 		del CHAT_FILTERS[str(old_chat_id)]
+		CHAT_FILTER_MATCHERS.pop(str(old_chat_id), None)
+		CHAT_FILTER_MATCHERS.pop(str(new_chat_id), None)
 
 		with BUTTON_LOCK:
 			chat_buttons = SESSION.query(Buttons).filter(Buttons.chat_id == str(old_chat_id)).all()
 			for btn in chat_buttons:
 				btn.chat_id = str(new_chat_id)
 			SESSION.commit()
+		__uncache_filter_reply(old_chat_id)
 
 
-__load_chat_filters()
+cache_loader(__load_chat_filters)
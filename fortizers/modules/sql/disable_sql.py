@@ -2,7 +2,7 @@ import threading
 
 from sqlalchemy import Column, String, UnicodeText, Boolean, func, distinct
 
-from fortizers.modules.sql import SESSION, BASE
+from fortizers.modules.sql import SESSION, BASE, session_scope, cache_loader
 
 
 class Disable(BASE):
@@ -57,6 +57,17 @@ def disable_command(chat_id, disable):
         return False
 
 
+def bulk_disable_commands(chat_id, commands):
+    """Disables many commands in one transaction, used by backup imports."""
+    commands = set(commands)
+    with DISABLE_INSERTION_LOCK:
+        with session_scope(commit=True) as session:
+            existing = {x for (x,) in session.query(Disable.command).filter(
+                Disable.chat_id == str(chat_id), Disable.command.in_(commands))}
+            session.bulk_save_objects([Disable(str(chat_id), x) for x in commands - existing])
+        DISABLED.setdefault(str(chat_id), set()).update(commands)
+
+
 def enable_command(chat_id, enable):
     with DISABLE_INSERTION_LOCK:
         disabled = SESSION.query(Disable).get((str(chat_id), enable))
@@ -102,17 +113,13 @@ def get_all_disabled(chat_id):
 
 
 def num_chats():
-    try:
-        return SESSION.query(func.count(distinct(Disable.chat_id))).scalar()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(func.count(distinct(Disable.chat_id))).scalar()
 
 
 def num_disabled():
-    try:
-        return SESSION.query(Disable).count()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(Disable).count()
 
 
 def migrate_chat(old_chat_id, new_chat_id):
@@ -140,25 +147,21 @@ def get_disableable():
 
 def __load_disabled_commands():
     global DISABLED
-    try:
-        all_chats = SESSION.query(Disable).all()
-        for chat in all_chats:
-            DISABLED.setdefault(chat.chat_id, set()).add(chat.command)
-
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        all_chats = session.query(Disable.chat_id, Disable.command).all()
+        for chat_id, command in all_chats:
+            DISABLED.setdefault(chat_id, set()).add(command)
+    return len(all_chats)
 
 def __load_disabledel():
     global DISABLEDEL
-    try:
-        all_disabledel = SESSION.query(DisableDelete).all()
-        for x in all_disabledel:
-            if x.is_enable:
-                DISABLEDEL.append(str(x.chat_id))
-
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        all_disabledel = session.query(DisableDelete.chat_id, DisableDelete.is_enable).all()
+        for chat_id, is_enable in all_disabledel:
+            if is_enable:
+                DISABLEDEL.append(str(chat_id))
+    return len(all_disabledel)
 
 
-__load_disabled_commands()
-__load_disabledel()
+cache_loader(__load_disabled_commands)
+cache_loader(__load_disabledel)
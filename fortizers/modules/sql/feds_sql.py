@@ -1,10 +1,14 @@
+import ast
+import itertools
 import threading
 
 from sqlalchemy import Column, String, UnicodeText, func, distinct, Integer, Boolean
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import SQLAlchemyError
 from telegram.error import BadRequest, TelegramError, Unauthorized
 
 from fortizers import dispatcher
-from fortizers.modules.sql import SESSION, BASE
+from fortizers.modules.sql import SESSION, BASE, session_scope, cache_loader
 
 
 class Federations(BASE):
@@ -54,6 +58,18 @@ class BansF(BASE):
 		self.reason = reason
 		self.time = time
 
+class FedAdmins(BASE):
+	__tablename__ = "feds_admins"
+	fed_id = Column(UnicodeText, primary_key=True)
+	user_id = Column(String(14), primary_key=True)
+
+	def __init__(self, fed_id, user_id):
+		self.fed_id = fed_id
+		self.user_id = user_id
+
+	def __repr__(self):
+		return "<Fed {} admin {}>".format(self.fed_id, self.user_id)
+
 class FedsUserSettings(BASE):
 	__tablename__ = "feds_settings"
 	user_id = Column(Integer, primary_key=True)
@@ -86,6 +102,7 @@ class FedSubs(BASE):
 Federations.__table__.create(checkfirst=True)
 ChatF.__table__.create(checkfirst=True)
 BansF.__table__.create(checkfirst=True)
+FedAdmins.__table__.create(checkfirst=True)
 FedsUserSettings.__table__.create(checkfirst=True)
 FedSubs.__table__.create(checkfirst=True)
 
@@ -99,11 +116,17 @@ FEDERATION_BYNAME = {}
 FEDERATION_BYOWNER = {}
 FEDERATION_BYFEDID = {}
 
+FEDERATION_ADMINS = {}
+FEDERATION_ADMINS_BYUSER = {}
+FEDERATION_OWNED_BYUSER = {}
+
 FEDERATION_CHATS = {}
 FEDERATION_CHATS_BYID = {}
 
 FEDERATION_BANNED_FULL = {}
 FEDERATION_BANNED_USERID = {}
+# fed_id -> how often its cached bans were patched, tells __load_fed_banned its read may be older than the cache
+FEDERATION_BANNED_PATCHES = {}
 
 FEDERATION_NOTIFICATION = {}
 FEDS_SUBSCRIBER = {}
@@ -140,32 +163,16 @@ def get_user_fban(fed_id, user_id):
 	return user_info['first_name'], user_info['reason'], user_info['time']
 
 def get_user_admin_fed_name(user_id):
-	user_feds = []
-	for f in FEDERATION_BYFEDID:
-		if int(user_id) in eval(eval(FEDERATION_BYFEDID[f]['fusers'])['members']):
-			user_feds.append(FEDERATION_BYFEDID[f]['fname'])
-	return user_feds
+	return [FEDERATION_BYFEDID[f]['fname'] for f in FEDERATION_ADMINS_BYUSER.get(int(user_id), set())]
 
 def get_user_owner_fed_name(user_id):
-	user_feds = []
-	for f in FEDERATION_BYFEDID:
-		if int(user_id) == int(eval(FEDERATION_BYFEDID[f]['fusers'])['owner']):
-			user_feds.append(FEDERATION_BYFEDID[f]['fname'])
-	return user_feds
+	return [FEDERATION_BYFEDID[f]['fname'] for f in FEDERATION_OWNED_BYUSER.get(int(user_id), set())]
 
 def get_user_admin_fed_full(user_id):
-	user_feds = []
-	for f in FEDERATION_BYFEDID:
-		if int(user_id) in eval(eval(FEDERATION_BYFEDID[f]['fusers'])['members']):
-			user_feds.append({"fed_id": f, "fed": FEDERATION_BYFEDID[f]})
-	return user_feds
+	return [{"fed_id": f, "fed": FEDERATION_BYFEDID[f]} for f in FEDERATION_ADMINS_BYUSER.get(int(user_id), set())]
 
 def get_user_owner_fed_full(user_id):
-	user_feds = []
-	for f in FEDERATION_BYFEDID:
-		if int(user_id) == int(eval(FEDERATION_BYFEDID[f]['fusers'])['owner']):
-			user_feds.append({"fed_id": f, "fed": FEDERATION_BYFEDID[f]})
-	return user_feds
+	return [{"fed_id": f, "fed": FEDERATION_BYFEDID[f]} for f in FEDERATION_OWNED_BYUSER.get(int(user_id), set())]
 
 def get_user_fbanlist(user_id):
 	banlist = FEDERATION_BANNED_FULL
@@ -182,12 +189,14 @@ def get_user_fbanlist(user_id):
 def new_fed(owner_id, fed_name, fed_id):
 	with FEDS_LOCK:
 		global FEDERATION_BYOWNER, FEDERATION_BYFEDID, FEDERATION_BYNAME
-		fed = Federations(str(owner_id), fed_name, str(fed_id), 'Rules is not set in this federation.', None, str({'owner': str(owner_id), 'members': '[]'}))
+		fed = Federations(str(owner_id), fed_name, str(fed_id), 'Rules is not set in this federation.', None, None)
 		SESSION.add(fed)
 		SESSION.commit()
-		FEDERATION_BYOWNER[str(owner_id)] = ({'fid': str(fed_id), 'fname': fed_name, 'frules': 'Rules is not set in this federation.', 'flog': None, 'fusers': str({'owner': str(owner_id), 'members': '[]'})})
-		FEDERATION_BYFEDID[str(fed_id)] = ({'owner': str(owner_id), 'fname': fed_name, 'frules': 'Rules is not set in this federation.', 'flog': None, 'fusers': str({'owner': str(owner_id), 'members': '[]'})})
-		FEDERATION_BYNAME[fed_name] = ({'fid': str(fed_id), 'owner': str(owner_id), 'frules': 'Rules is not set in this federation.', 'flog': None, 'fusers': str({'owner': str(owner_id), 'members': '[]'})})
+		FEDERATION_BYOWNER[str(owner_id)] = ({'fid': str(fed_id), 'fname': fed_name, 'frules': 'Rules is not set in this federation.', 'flog': None})
+		FEDERATION_BYFEDID[str(fed_id)] = ({'owner': str(owner_id), 'fname': fed_name, 'frules': 'Rules is not set in this federation.', 'flog': None})
+		FEDERATION_BYNAME[fed_name] = ({'fid': str(fed_id), 'owner': str(owner_id), 'frules': 'Rules is not set in this federation.', 'flog': None})
+		FEDERATION_ADMINS[str(fed_id)] = set()
+		FEDERATION_OWNED_BYUSER.setdefault(int(owner_id), set()).add(str(fed_id))
 		return fed
 
 def del_fed(fed_id):
@@ -204,6 +213,12 @@ def del_fed(fed_id):
 		FEDERATION_BYOWNER.pop(owner_id)
 		FEDERATION_BYFEDID.pop(fed_id)
 		FEDERATION_BYNAME.pop(fed_name)
+		FEDERATION_OWNED_BYUSER.get(int(owner_id), set()).discard(fed_id)
+		# Delete fed admins
+		for x in FEDERATION_ADMINS.pop(fed_id, set()):
+			FEDERATION_ADMINS_BYUSER.get(x, set()).discard(fed_id)
+		SESSION.query(FedAdmins).filter(FedAdmins.fed_id == fed_id).delete()
+		SESSION.commit()
 		if FEDERATION_CHATS_BYID.get(fed_id):
 			for x in FEDERATION_CHATS_BYID[fed_id]:
 				delchats = SESSION.query(ChatF).get(str(x))
@@ -263,11 +278,10 @@ def search_fed_by_name(fed_name):
 	return allfed
 
 def search_user_in_fed(fed_id, user_id):
-	getfed = FEDERATION_BYFEDID.get(fed_id)
+	getfed = FEDERATION_ADMINS.get(fed_id)
 	if getfed == None:
 		return False
-	getfed = eval(getfed['fusers'])['members']
-	if user_id in eval(getfed):
+	if user_id in getfed:
 		return True
 	else:
 		return False
@@ -275,63 +289,26 @@ def search_user_in_fed(fed_id, user_id):
 
 def user_demote_fed(fed_id, user_id):
 	with FEDS_LOCK:
-		global FEDERATION_BYOWNER, FEDERATION_BYFEDID, FEDERATION_BYNAME
-		# Variables
-		getfed = FEDERATION_BYFEDID.get(str(fed_id))
-		owner_id = getfed['owner']
-		fed_name = getfed['fname']
-		fed_rules = getfed['frules']
-		fed_log = getfed['flog']
-		# Temp set
-		try:
-			members = eval(eval(getfed['fusers'])['members'])
-		except ValueError:
+		global FEDERATION_ADMINS, FEDERATION_ADMINS_BYUSER
+		curr = SESSION.query(FedAdmins).get((str(fed_id), str(user_id)))
+		if not curr:
+			SESSION.close()
 			return False
-		members.remove(user_id)
-		# Set user
-		FEDERATION_BYOWNER[str(owner_id)]['fusers'] = str({'owner': str(owner_id), 'members': str(members)})
-		FEDERATION_BYFEDID[str(fed_id)]['fusers'] = str({'owner': str(owner_id), 'members': str(members)})
-		FEDERATION_BYNAME[fed_name]['fusers'] = str({'owner': str(owner_id), 'members': str(members)})
-		# Set on database
-		fed = Federations(str(owner_id), fed_name, str(fed_id), fed_rules, fed_log, str({'owner': str(owner_id), 'members': str(members)}))
-		SESSION.merge(fed)
+		SESSION.delete(curr)
 		SESSION.commit()
+		FEDERATION_ADMINS.get(str(fed_id), set()).discard(int(user_id))
+		FEDERATION_ADMINS_BYUSER.get(int(user_id), set()).discard(str(fed_id))
 		return True
 
-		curr = SESSION.query(UserF).all()
-		result = False
-		for r in curr:
-			if int(r.user_id) == int(user_id):
-				if r.fed_id == fed_id:
-					SESSION.delete(r)
-					SESSION.commit()
-					result = True
-
-		SESSION.close()
-		return result
-
 
 def user_join_fed(fed_id, user_id):
 	with FEDS_LOCK:
-		global FEDERATION_BYOWNER, FEDERATION_BYFEDID, FEDERATION_BYNAME
-		# Variables
-		getfed = FEDERATION_BYFEDID.get(str(fed_id))
-		owner_id = getfed['owner']
-		fed_name = getfed['fname']
-		fed_rules = getfed['frules']
-		fed_log = getfed['flog']
-		# Temp set
-		members = eval(eval(getfed['fusers'])['members'])
-		members.append(user_id)
-		# Set user
-		FEDERATION_BYOWNER[str(owner_id)]['fusers'] = str({'owner': str(owner_id), 'members': str(members)})
-		FEDERATION_BYFEDID[str(fed_id)]['fusers'] = str({'owner': str(owner_id), 'members': str(members)})
-		FEDERATION_BYNAME[fed_name]['fusers'] = str({'owner': str(owner_id), 'members': str(members)})
-		# Set on database
-		fed = Federations(str(owner_id), fed_name, str(fed_id), fed_rules, fed_log, str({'owner': str(owner_id), 'members': str(members)}))
-		SESSION.merge(fed)
+		global FEDERATION_ADMINS, FEDERATION_ADMINS_BYUSER
+		fed_admin = FedAdmins(str(fed_id), str(user_id))
+		SESSION.merge(fed_admin)  # merge to avoid duplicate key issues
 		SESSION.commit()
-		__load_all_feds_chats()
+		FEDERATION_ADMINS.setdefault(str(fed_id), set()).add(int(user_id))
+		FEDERATION_ADMINS_BYUSER.setdefault(int(user_id), set()).add(str(fed_id))
 		return True
 
 
@@ -355,28 +332,22 @@ def chat_leave_fed(chat_id):
 		return True
 
 def all_fed_chats(fed_id):
-	with FEDS_LOCK:
-		getfed = FEDERATION_CHATS_BYID.get(fed_id)
-		if getfed == None:
-			return []
-		else:
-			return getfed
+	getfed = FEDERATION_CHATS_BYID.get(fed_id)
+	if getfed == None:
+		return []
+	else:
+		return getfed
 
 def all_fed_users(fed_id):
-	with FEDS_LOCK:
-		getfed = FEDERATION_BYFEDID.get(str(fed_id))
-		if getfed == None:
-			return False
-		fed_owner = eval(eval(getfed['fusers'])['owner'])
-		fed_admins = eval(eval(getfed['fusers'])['members'])
-		fed_admins.append(fed_owner)
-		return fed_admins
+	getfed = FEDERATION_BYFEDID.get(str(fed_id))
+	if getfed == None:
+		return False
+	fed_admins = list(FEDERATION_ADMINS.get(str(fed_id), set()))
+	fed_admins.append(int(getfed['owner']))
+	return fed_admins
 
 def all_fed_members(fed_id):
-	with FEDS_LOCK:
-		getfed = FEDERATION_BYFEDID.get(str(fed_id))
-		fed_admins = eval(eval(getfed['fusers'])['members'])
-		return fed_admins
+	return list(FEDERATION_ADMINS.get(str(fed_id), set()))
 
 
 def set_frules(fed_id, rules):
@@ -386,7 +357,6 @@ def set_frules(fed_id, rules):
 		getfed = FEDERATION_BYFEDID.get(str(fed_id))
 		owner_id = getfed['owner']
 		fed_name = getfed['fname']
-		fed_members = getfed['fusers']
 		fed_rules = str(rules)
 		fed_log = getfed['flog']
 		# Set user
@@ -394,122 +364,116 @@ def set_frules(fed_id, rules):
 		FEDERATION_BYFEDID[str(fed_id)]['frules'] = fed_rules
 		FEDERATION_BYNAME[fed_name]['frules'] = fed_rules
 		# Set on database
-		fed = Federations(str(owner_id), fed_name, str(fed_id), fed_rules, fed_log, str(fed_members))
+		fed = Federations(str(owner_id), fed_name, str(fed_id), fed_rules, fed_log, None)
 		SESSION.merge(fed)
 		SESSION.commit()
 		return True
 
 
 def get_frules(fed_id):
-	with FEDS_LOCK:
-		rules = FEDERATION_BYFEDID[str(fed_id)]['frules']
-		return rules
+	rules = FEDERATION_BYFEDID[str(fed_id)]['frules']
+	return rules
 
 
 def fban_user(fed_id, user_id, first_name, last_name, user_name, reason, time):
 	with FEDS_LOCK:
-		r = SESSION.query(BansF).all()
-		for I in r:
-			if I.fed_id == fed_id:
-				if int(I.user_id) == int(user_id):
-					SESSION.delete(I)
-
 		r = BansF(str(fed_id), str(user_id), first_name, last_name, user_name, reason, time)
 
-		SESSION.add(r)
+		SESSION.merge(r)  # merge to replace the previous ban for this user
 		try:
 			SESSION.commit()
 		except:
 			SESSION.rollback()
 			return False
-		finally:
-			SESSION.commit()
-		__load_all_feds_banned()
+		__cache_fban(r)
 		return r
 
 
-def multi_fban_user(multi_fed_id, multi_user_id, multi_first_name, multi_last_name, multi_user_name, multi_reason):
-	if True: #with FEDS_LOCK:
-		counter = 0
-		time = 0
-		for x in range(len(multi_fed_id)):
-			fed_id = multi_fed_id[x]
-			user_id = multi_user_id[x]
-			first_name = multi_first_name[x]
-			last_name = multi_last_name[x]
-			user_name = multi_user_name[x]
-			reason = multi_reason[x]
-			r = SESSION.query(BansF).all()
-			for I in r:
-				if I.fed_id == fed_id:
-					if int(I.user_id) == int(user_id):
-						SESSION.delete(I)
-
-			r = BansF(str(fed_id), str(user_id), first_name, last_name, user_name, reason, time)
-
-			SESSION.add(r)
-			counter += 1
-			if str(str(counter)[-2:]) == "00":
-				print(user_id)
-				print(first_name)
-				print(reason)
-				print(counter)
+def bulk_fban_user(fed_id, bans, chunk_size=1000, progress=None):
+	"""
+	bans is an iterable of (user_id, first_name, last_name, user_name, reason), consumed lazily. Returns how many
+	users were newly banned, users that already were only get their details updated. False if the import failed.
+	"""
+	processed = 0
+	added = 0
+	bans = iter(bans)
+	# Not under FEDS_LOCK, bans in every other federation would wait for the whole import. The database orders
+	# the rows against concurrent fban_user/un_fban_user, the cache of the federation is reloaded once committed.
+	try:
+		while True:
+			chunk = {}
+			for user_id, first_name, last_name, user_name, reason in itertools.islice(bans, chunk_size):
+				chunk[str(user_id)] = {'fed_id': str(fed_id), 'user_id': str(user_id), 'first_name': first_name, 'last_name': last_name, 'user_name': user_name, 'reason': reason, 'time': 0}
+			if not chunk:
+				break
+			try:
+				added += __upsert_fbans(str(fed_id), list(chunk.values()))
+			except SQLAlchemyError:
+				SESSION.rollback()
+				return False
+			processed += len(chunk)
+			# Outside the try, a failing progress report is not a failed import
+			if progress:
+				progress(processed)
 		try:
 			SESSION.commit()
-		except:
+		except SQLAlchemyError:
 			SESSION.rollback()
 			return False
-		finally:
-			SESSION.commit()
-		__load_all_feds_banned()
-		print("Done")
-		return counter
+	finally:
+		SESSION.close()
+	__load_fed_banned(str(fed_id))
+	return added
+
+
+def __upsert_fbans(fed_id, rows):
+	# Returns how many of the rows weren't banned yet
+	user_ids = [x['user_id'] for x in rows]
+	if SESSION.get_bind().dialect.name == "postgresql":
+		existing = SESSION.query(func.count(BansF.user_id)).filter(BansF.fed_id == fed_id, BansF.user_id.in_(user_ids)).scalar()
+		stmt = pg_insert(BansF.__table__)
+		updated = {x: stmt.excluded[x] for x in ('first_name', 'last_name', 'user_name', 'reason', 'time')}
+		stmt = stmt.on_conflict_do_update(index_elements=[BansF.fed_id, BansF.user_id], set_=updated)
+		SESSION.execute(stmt, rows)
+	else:
+		existing = SESSION.query(BansF).filter(BansF.fed_id == fed_id, BansF.user_id.in_(user_ids)).delete(synchronize_session=False)
+		SESSION.execute(BansF.__table__.insert(), rows)
+	return len(rows) - existing
 
 
 def un_fban_user(fed_id, user_id):
 	with FEDS_LOCK:
-		r = SESSION.query(BansF).all()
-		for I in r:
-			if I.fed_id == fed_id:
-				if int(I.user_id) == int(user_id):
-					SESSION.delete(I)
+		r = SESSION.query(BansF).get((str(fed_id), str(user_id)))
+		if not r:
+			SESSION.close()
+			return False
+		SESSION.delete(r)
 		try:
 			SESSION.commit()
 		except:
 			SESSION.rollback()
 			return False
-		finally:
-			SESSION.commit()
-		__load_all_feds_banned()
-		return I
+		__uncache_fban(fed_id, user_id)
+		return r
 
 def get_fban_user(fed_id, user_id):
-	list_fbanned = FEDERATION_BANNED_USERID.get(fed_id)
-	if list_fbanned == None:
-		FEDERATION_BANNED_USERID[fed_id] = []
-	if user_id in FEDERATION_BANNED_USERID[fed_id]:
-		r = SESSION.query(BansF).all()
-		reason = None
-		for I in r:
-			if I.fed_id == fed_id:
-				if int(I.user_id) == int(user_id):
-					reason = I.reason
-					time = I.time
-		return True, reason, time
-	else:
+	# Served from the ban cache only, this runs on every group message
+	user_info = FEDERATION_BANNED_FULL.get(fed_id, {}).get(str(user_id))
+	if user_info is None:
 		return False, None, None
+	return True, user_info['reason'], user_info['time']
 
 
 def get_all_fban_users(fed_id):
 	list_fbanned = FEDERATION_BANNED_USERID.get(fed_id)
 	if list_fbanned == None:
-		FEDERATION_BANNED_USERID[fed_id] = []
+		FEDERATION_BANNED_USERID[fed_id] = set()
 	return FEDERATION_BANNED_USERID[fed_id]
 
 def get_all_fban_users_target(fed_id, user_id):
 	list_fbanned = FEDERATION_BANNED_FULL.get(fed_id)
 	if list_fbanned == None:
-		FEDERATION_BANNED_FULL[fed_id] = []
+		FEDERATION_BANNED_FULL[fed_id] = {}
 		return False
 	getuser = list_fbanned[str(user_id)]
 	return getuser
@@ -591,7 +555,6 @@ def set_fed_log(fed_id, chat_id):
 		getfed = FEDERATION_BYFEDID.get(str(fed_id))
 		owner_id = getfed['owner']
 		fed_name = getfed['fname']
-		fed_members = getfed['fusers']
 		fed_rules = getfed['frules']
 		fed_log = str(chat_id)
 		# Set user
@@ -599,7 +562,7 @@ def set_fed_log(fed_id, chat_id):
 		FEDERATION_BYFEDID[str(fed_id)]['flog'] = fed_log
 		FEDERATION_BYNAME[fed_name]['flog'] = fed_log
 		# Set on database
-		fed = Federations(str(owner_id), fed_name, str(fed_id), fed_rules, fed_log, str(fed_members))
+		fed = Federations(str(owner_id), fed_name, str(fed_id), fed_rules, fed_log, None)
 		SESSION.merge(fed)
 		SESSION.commit()
 		print(fed_log)
@@ -655,104 +618,144 @@ def get_subscriber(fed_id):
 
 def __load_all_feds():
 	global FEDERATION_BYOWNER, FEDERATION_BYFEDID, FEDERATION_BYNAME
-	try:
-		feds = SESSION.query(Federations).all()
+	with session_scope() as session:
+		feds = session.query(Federations.fed_id, Federations.owner_id, Federations.fed_name, Federations.fed_rules,
+							 Federations.fed_log).all()
 		for x in feds:  # remove tuple by ( ,)
 			# Fed by Owner
 			check = FEDERATION_BYOWNER.get(x.owner_id)
 			if check == None:
 				FEDERATION_BYOWNER[x.owner_id] = []
-			FEDERATION_BYOWNER[str(x.owner_id)] = {'fid': str(x.fed_id), 'fname': x.fed_name, 'frules': x.fed_rules, 'flog': x.fed_log, 'fusers': str(x.fed_users)}
+			FEDERATION_BYOWNER[str(x.owner_id)] = {'fid': str(x.fed_id), 'fname': x.fed_name, 'frules': x.fed_rules, 'flog': x.fed_log}
 			# Fed By FedId
 			check = FEDERATION_BYFEDID.get(x.fed_id)
 			if check == None:
 				FEDERATION_BYFEDID[x.fed_id] = []
-			FEDERATION_BYFEDID[str(x.fed_id)] = {'owner': str(x.owner_id), 'fname': x.fed_name, 'frules': x.fed_rules, 'flog': x.fed_log, 'fusers': str(x.fed_users)}
+			FEDERATION_BYFEDID[str(x.fed_id)] = {'owner': str(x.owner_id), 'fname': x.fed_name, 'frules': x.fed_rules, 'flog': x.fed_log}
 			# Fed By Name
 			check = FEDERATION_BYNAME.get(x.fed_name)
 			if check == None:
 				FEDERATION_BYNAME[x.fed_name] = []
-			FEDERATION_BYNAME[x.fed_name] = {'fid': str(x.fed_id), 'owner': str(x.owner_id), 'frules': x.fed_rules, 'flog': x.fed_log, 'fusers': str(x.fed_users)}
-	finally:
-		SESSION.close()
+			FEDERATION_BYNAME[x.fed_name] = {'fid': str(x.fed_id), 'owner': str(x.owner_id), 'frules': x.fed_rules, 'flog': x.fed_log}
+			# Fed owned by user
+			FEDERATION_OWNED_BYUSER.setdefault(int(x.owner_id), set()).add(str(x.fed_id))
+	return len(feds)
+
+def __migrate_fed_users():
+	# Move admins out of the old stringified Federations.fed_users into FedAdmins, once
+	with session_scope() as session:
+		feds = session.query(Federations).filter(Federations.fed_users != None).all()
+		for x in feds:
+			try:
+				members = ast.literal_eval(ast.literal_eval(x.fed_users)['members'])
+			except (ValueError, SyntaxError, KeyError, TypeError):
+				members = []
+			for user_id in members:
+				session.merge(FedAdmins(str(x.fed_id), str(user_id)))
+			x.fed_users = None
+		session.commit()
+
+def __load_all_feds_admins():
+	global FEDERATION_ADMINS, FEDERATION_ADMINS_BYUSER
+	with session_scope() as session:
+		FEDERATION_ADMINS = {x: set() for x in FEDERATION_BYFEDID}
+		FEDERATION_ADMINS_BYUSER = {}
+		qall = session.query(FedAdmins.fed_id, FedAdmins.user_id).all()
+		for fed_id, user_id in qall:
+			FEDERATION_ADMINS.setdefault(fed_id, set()).add(int(user_id))
+			FEDERATION_ADMINS_BYUSER.setdefault(int(user_id), set()).add(fed_id)
+	return len(qall)
 
 def __load_all_feds_chats():
 	global FEDERATION_CHATS, FEDERATION_CHATS_BYID
-	try:
-		qall = SESSION.query(ChatF).all()
+	with session_scope() as session:
+		qall = session.query(ChatF.chat_id, ChatF.chat_name, ChatF.fed_id).all()
 		FEDERATION_CHATS = {}
 		FEDERATION_CHATS_BYID = {}
-		for x in qall:
+		for chat_id, chat_name, fed_id in qall:
 			# Federation Chats
-			check = FEDERATION_CHATS.get(x.chat_id)
-			if check == None:
-				FEDERATION_CHATS[x.chat_id] = {}
-			FEDERATION_CHATS[x.chat_id] = {'chat_name': x.chat_name, 'fid': x.fed_id}
+			FEDERATION_CHATS[chat_id] = {'chat_name': chat_name, 'fid': fed_id}
 			# Federation Chats By ID
-			check = FEDERATION_CHATS_BYID.get(x.fed_id)
-			if check == None:
-				FEDERATION_CHATS_BYID[x.fed_id] = []
-			FEDERATION_CHATS_BYID[x.fed_id].append(x.chat_id)
-	finally:
-		SESSION.close()
+			FEDERATION_CHATS_BYID.setdefault(fed_id, []).append(chat_id)
+	return len(qall)
+
+def __fban_info(ban):
+	return {'first_name': ban.first_name, 'last_name': ban.last_name, 'user_name': ban.user_name, 'reason': ban.reason, 'time': ban.time}
+
+def __cache_fban(ban):
+	# Patch only the affected (fed_id, user_id) entry instead of reloading every ban
+	FEDERATION_BANNED_PATCHES[ban.fed_id] = FEDERATION_BANNED_PATCHES.get(ban.fed_id, 0) + 1
+	FEDERATION_BANNED_USERID.setdefault(ban.fed_id, set()).add(int(ban.user_id))
+	FEDERATION_BANNED_FULL.setdefault(ban.fed_id, {})[ban.user_id] = __fban_info(ban)
+
+def __uncache_fban(fed_id, user_id):
+	FEDERATION_BANNED_PATCHES[str(fed_id)] = FEDERATION_BANNED_PATCHES.get(str(fed_id), 0) + 1
+	FEDERATION_BANNED_USERID.get(str(fed_id), set()).discard(int(user_id))
+	FEDERATION_BANNED_FULL.get(str(fed_id), {}).pop(str(user_id), None)
 
 def __load_all_feds_banned():
 	global FEDERATION_BANNED_USERID, FEDERATION_BANNED_FULL
-	try:
+	with session_scope() as session:
 		FEDERATION_BANNED_USERID = {}
 		FEDERATION_BANNED_FULL = {}
-		qall = SESSION.query(BansF).all()
+		# Plain rows, they have the same attribute names as BansF
+		qall = session.query(*BansF.__table__.columns).all()
 		for x in qall:
-			check = FEDERATION_BANNED_USERID.get(x.fed_id)
-			if check == None:
-				FEDERATION_BANNED_USERID[x.fed_id] = []
-			if int(x.user_id) not in FEDERATION_BANNED_USERID[x.fed_id]:
-				FEDERATION_BANNED_USERID[x.fed_id].append(int(x.user_id))
-			check = FEDERATION_BANNED_FULL.get(x.fed_id)
-			if check == None:
-				FEDERATION_BANNED_FULL[x.fed_id] = {}
-			FEDERATION_BANNED_FULL[x.fed_id][x.user_id] = {'first_name': x.first_name, 'last_name': x.last_name, 'user_name': x.user_name, 'reason': x.reason, 'time': x.time}
-	finally:
-		SESSION.close()
+			__cache_fban(x)
+	return len(qall)
+
+def __query_fed_banned(fed_id):
+	with session_scope() as session:
+		return session.query(*BansF.__table__.columns).filter(BansF.fed_id == fed_id).all()
+
+def __load_fed_banned(fed_id):
+	# Read without FEDS_LOCK, only the swap holds it. When a ban was patched in meanwhile the read may be older
+	# than the cache, then it is done again under the lock so that ban isn't overwritten.
+	patches = FEDERATION_BANNED_PATCHES.get(fed_id, 0)
+	qall = __query_fed_banned(fed_id)
+	with FEDS_LOCK:
+		if FEDERATION_BANNED_PATCHES.get(fed_id, 0) != patches:
+			qall = __query_fed_banned(fed_id)
+		FEDERATION_BANNED_USERID[fed_id] = {int(x.user_id) for x in qall}
+		FEDERATION_BANNED_FULL[fed_id] = {x.user_id: __fban_info(x) for x in qall}
 
 def __load_all_feds_settings():
 	global FEDERATION_NOTIFICATION
-	try:
-		getuser = SESSION.query(FedsUserSettings).all()
-		for x in getuser:
-			FEDERATION_NOTIFICATION[str(x.user_id)] = x.should_report
-	finally:
-		SESSION.close()
+	with session_scope() as session:
+		getuser = session.query(FedsUserSettings.user_id, FedsUserSettings.should_report).all()
+		for user_id, should_report in getuser:
+			FEDERATION_NOTIFICATION[str(user_id)] = should_report
+	return len(getuser)
 
 def __load_feds_subscriber():
 	global FEDS_SUBSCRIBER
 	global MYFEDS_SUBSCRIBER
-	try:
-		feds = SESSION.query(FedSubs.fed_id).distinct().all()
+	with session_scope() as session:
+		feds = session.query(FedSubs.fed_id).distinct().all()
 		for (fed_id,) in feds:  # remove tuple by ( ,)
 			FEDS_SUBSCRIBER[fed_id] = []
 			MYFEDS_SUBSCRIBER[fed_id] = []
 
-		all_fedsubs = SESSION.query(FedSubs).all()
+		all_fedsubs = session.query(FedSubs.fed_id, FedSubs.fed_subs).all()
 		for x in all_fedsubs:
 			FEDS_SUBSCRIBER[x.fed_id] += [x.fed_subs]
 			try:
 				MYFEDS_SUBSCRIBER[x.fed_subs] += [x.fed_id]
 			except KeyError:
-				getsubs = SESSION.query(FedSubs).get((x.fed_id, x.fed_subs))
+				getsubs = session.query(FedSubs).get((x.fed_id, x.fed_subs))
 				if getsubs:
-					SESSION.delete(getsubs)
-					SESSION.commit()
+					session.delete(getsubs)
+					session.commit()
 
 		FEDS_SUBSCRIBER = {x: set(y) for x, y in FEDS_SUBSCRIBER.items()}
 		MYFEDS_SUBSCRIBER = {x: set(y) for x, y in MYFEDS_SUBSCRIBER.items()}
-
-	finally:
-		SESSION.close()
+	return len(all_fedsubs)
 
 
-__load_all_feds()
-__load_all_feds_chats()
-__load_all_feds_banned()
-__load_all_feds_settings()
-__load_feds_subscriber()
+__migrate_fed_users()
+# Admins are keyed by the feds loaded just before
+cache_loader(__load_all_feds, __load_all_feds_admins)
+cache_loader(__load_all_feds_chats)
+cache_loader(__load_all_feds_banned)
+cache_loader(__load_all_feds_settings)
+cache_loader(__load_feds_subscriber)
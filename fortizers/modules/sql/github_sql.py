@@ -2,7 +2,7 @@ import threading
 
 from sqlalchemy import Column, String, UnicodeText, Integer
 
-from fortizers.modules.sql import SESSION, BASE
+from fortizers.modules.sql import SESSION, BASE, session_scope
 
 class GitHub(BASE):
     __tablename__ = "github"
@@ -34,10 +34,8 @@ def add_repo_to_db(chat_id, name, value, backoffset):
         SESSION.commit()
         
 def get_repo(chat_id, name):
-    try:
-        return SESSION.query(GitHub).get((str(chat_id), name))
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(GitHub).get((str(chat_id), name))
         
 def rm_repo(chat_id, name):
     with GIT_LOCK:
@@ -51,8 +49,6 @@ def rm_repo(chat_id, name):
             return False
 
 def get_all_repos(chat_id):
-    try:
-        return SESSION.query(GitHub).filter(GitHub.chat_id == str(chat_id)).order_by(GitHub.name.asc()).all()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(GitHub).filter(GitHub.chat_id == str(chat_id)).order_by(GitHub.name.asc()).all()
         
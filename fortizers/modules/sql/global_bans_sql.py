@@ -1,8 +1,9 @@
 import threading
+import uuid
 
 from sqlalchemy import Column, UnicodeText, Integer, String, Boolean
 
-from fortizers.modules.sql import BASE, SESSION
+from fortizers.modules.sql import BASE, SESSION, session_scope, cache_loader, create_missing_columns
 
 
 class GloballyBannedUsers(BASE):
@@ -38,11 +39,40 @@ class GbanSettings(BASE):
         return "<Gban setting {} ({})>".format(self.chat_id, self.setting)
 
 
+class GbanJobs(BASE):
+    __tablename__ = "gban_jobs"
+    user_id = Column(Integer, primary_key=True)
+    action = Column(String(8), nullable=False)
+    cursor = Column(String(14), default="", nullable=False)
+    affected = Column(Integer, default=0, nullable=False)
+    origin_chat = Column(String(14))
+    status_msg = Column(Integer)
+    started = Column(Integer, default=0, nullable=False)
+    # New for every gban/ungban, so a thread whose job was replaced notices it even for the same action
+    token = Column(String(32))
+
+    def __init__(self, user_id, action, origin_chat=None, status_msg=None, started=0):
+        self.user_id = user_id
+        self.action = action
+        self.token = uuid.uuid4().hex
+        self.cursor = ""
+        self.affected = 0
+        self.origin_chat = origin_chat
+        self.status_msg = status_msg
+        self.started = started
+
+    def __repr__(self):
+        return "<{} job for {} at chat {}>".format(self.action, self.user_id, self.cursor)
+
+
 GloballyBannedUsers.__table__.create(checkfirst=True)
 GbanSettings.__table__.create(checkfirst=True)
+GbanJobs.__table__.create(checkfirst=True)
+create_missing_columns(GbanJobs.__table__)
 
 GBANNED_USERS_LOCK = threading.RLock()
 GBAN_SETTING_LOCK = threading.RLock()
+GBAN_JOBS_LOCK = threading.RLock()
 GBANNED_LIST = set()
 GBANSTAT_LIST = set()
 
@@ -90,17 +120,13 @@ def is_user_gbanned(user_id):
 
 
 def get_gbanned_user(user_id):
-    try:
-        return SESSION.query(GloballyBannedUsers).get(user_id)
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(GloballyBannedUsers).get(user_id)
 
 
 def get_gban_list():
-    try:
-        return [x.to_dict() for x in SESSION.query(GloballyBannedUsers).all()]
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return [x.to_dict() for x in session.query(GloballyBannedUsers).all()]
 
 
 def enable_gbans(chat_id):
@@ -136,20 +162,64 @@ def num_gbanned_users():
     return len(GBANNED_LIST)
 
 
+def new_gban_job(user_id, action, origin_chat=None, status_msg=None, started=0):
+    # One job per user, a newer gban/ungban replaces whatever was still running. Returns the new job's token.
+    with GBAN_JOBS_LOCK:
+        job = GbanJobs(user_id, action, str(origin_chat) if origin_chat else None, status_msg, int(started))
+        token = job.token
+        SESSION.merge(job)
+        SESSION.commit()
+        return token
+
+
+def get_gban_job(user_id):
+    with session_scope() as session:
+        return session.query(GbanJobs).get(user_id)
+
+
+def get_all_gban_jobs():
+    with session_scope() as session:
+        return session.query(GbanJobs).all()
+
+
+def update_gban_job(user_id, token, cursor, affected):
+    with GBAN_JOBS_LOCK:
+        job = SESSION.query(GbanJobs).get(user_id)
+        if not job or job.token != token:
+            SESSION.close()
+            return False
+        job.cursor = str(cursor)
+        job.affected = affected
+        SESSION.commit()
+        return True
+
+
+def finish_gban_job(user_id, token):
+    """Removes the job if it is still the one with `token`, returns False when a newer job replaced it."""
+    with GBAN_JOBS_LOCK:
+        job = SESSION.query(GbanJobs).get(user_id)
+        if job and job.token == token:
+            SESSION.delete(job)
+            SESSION.commit()
+            return True
+        SESSION.close()
+        return False
+
+
 def __load_gbanned_userid_list():
     global GBANNED_LIST
-    try:
-        GBANNED_LIST = {x.user_id for x in SESSION.query(GloballyBannedUsers).all()}
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        all_gbanned = session.query(GloballyBannedUsers.user_id).all()
+        GBANNED_LIST = {user_id for (user_id,) in all_gbanned}
+    return len(all_gbanned)
 
         
 def __load_gban_stat_list():
     global GBANSTAT_LIST
-    try:
-        GBANSTAT_LIST = {x.chat_id for x in SESSION.query(GbanSettings).all() if not x.setting}
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        all_settings = session.query(GbanSettings.chat_id, GbanSettings.setting).all()
+        GBANSTAT_LIST = {chat_id for chat_id, setting in all_settings if not setting}
+    return len(all_settings)
         
 
 def migrate_chat(old_chat_id, new_chat_id):
@@ -163,5 +233,5 @@ def migrate_chat(old_chat_id, new_chat_id):
 
 
 # Create in memory userid to avoid disk access
-__load_gbanned_userid_list()
-__load_gban_stat_list()
+cache_loader(__load_gbanned_userid_list)
+cache_loader(__load_gban_stat_list)
@@ -3,7 +3,7 @@ from typing import Union
 
 from sqlalchemy import Column, Integer, String, UnicodeText
 
-from fortizers.modules.sql import SESSION, BASE
+from fortizers.modules.sql import SESSION, BASE, session_scope, cache_loader
 
 
 class UserLanguage(BASE):
@@ -24,6 +24,8 @@ UserLanguage.__table__.create(checkfirst=True)
 INSERTION_LOCK = threading.RLock()
 
 GLOBAL_USERLANG = {}
+# Same languages keyed by int chat id, tl() gets message.chat.id as int on every call
+USERLANG_BY_ID = {}
 
 def set_lang(chat_id, user_lang):
     global GLOBAL_USERLANG
@@ -36,18 +38,21 @@ def set_lang(chat_id, user_lang):
         SESSION.add(set_lang)
         SESSION.commit()
         GLOBAL_USERLANG[str(chat_id)] = str(user_lang)
+        USERLANG_BY_ID[int(chat_id)] = str(user_lang)
 
 def get_lang(chat_id):
+    if type(chat_id) == int:
+        return USERLANG_BY_ID.get(chat_id)
     return GLOBAL_USERLANG.get(str(chat_id))
 
 
 def __load_userlang():
     global GLOBAL_USERLANG
-    try:
-        qall = SESSION.query(UserLanguage).all()
-        for x in qall:
-            GLOBAL_USERLANG[str(x.chat_id)] = x.lang
-    finally:
-        SESSION.close()
-
-__load_userlang()
+    with session_scope() as session:
+        qall = session.query(UserLanguage.chat_id, UserLanguage.lang).all()
+        for chat_id, lang in qall:
+            GLOBAL_USERLANG[str(chat_id)] = lang
+            USERLANG_BY_ID[int(chat_id)] = lang
+    return len(qall)
+
+cache_loader(__load_userlang)
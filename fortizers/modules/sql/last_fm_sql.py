@@ -2,7 +2,7 @@ import threading
  
 from sqlalchemy import Column, String
  
-from fortizers.modules.sql import BASE, SESSION
+from fortizers.modules.sql import BASE, SESSION, session_scope
  
 class LastFMUsers(BASE):
     __tablename__ = "last_fm"
@@ -31,10 +31,9 @@ def set_user(user_id, username):
         
         
 def get_user(user_id):
-    user = SESSION.query(LastFMUsers).get(str(user_id))
-    rep = ""
-    if user:
-        rep = str(user.username)
-        
-    SESSION.close()
+    with session_scope() as session:
+        user = session.query(LastFMUsers).get(str(user_id))
+        rep = ""
+        if user:
+            rep = str(user.username)
     return rep
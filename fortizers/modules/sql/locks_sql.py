@@ -3,7 +3,7 @@ import threading
 
 from sqlalchemy import Column, String, Boolean
 
-from fortizers.modules.sql import SESSION, BASE
+from fortizers.modules.sql import SESSION, BASE, session_scope, cache_loader
 
 
 class Permissions(BASE):
@@ -90,6 +90,32 @@ PERM_LOCK = threading.RLock()
 RESTR_LOCK = threading.RLock()
 CONF_LOCK = threading.RLock()
 
+# Every lock and restriction type gets one bit, so a chat's state is a single int
+LOCK_BITS = {x: 1 << i for i, x in enumerate(("audio", "voice", "contact", "video", "document", "photo", "sticker",
+                                               "gif", "url", "bots", "forward", "game", "location", "rtl", "button"))}
+RESTR_BITS = {"messages": 1, "media": 2, "other": 4, "previews": 8}
+RESTR_ALL = 1 | 2 | 4 | 8
+
+# chat_id -> bitmask of LOCK_BITS / RESTR_BITS, chats without anything locked are left out
+CHAT_LOCKS = {}
+CHAT_RESTRICTIONS = {}
+
+
+def __lock_mask(perm):
+    return sum(bit for lock_type, bit in LOCK_BITS.items() if getattr(perm, lock_type))
+
+
+def __restr_mask(restr):
+    return ((RESTR_BITS["messages"] if restr.messages else 0) | (RESTR_BITS["media"] if restr.media else 0) |
+            (RESTR_BITS["other"] if restr.other else 0) | (RESTR_BITS["previews"] if restr.preview else 0))
+
+
+def __set_mask(cache, chat_id, mask):
+    if mask:
+        cache[str(chat_id)] = mask
+    else:
+        cache.pop(str(chat_id), None)
+
 
 def init_permissions(chat_id, reset=False):
     curr_perm = SESSION.query(Permissions).get(str(chat_id))
@@ -149,6 +175,7 @@ def update_lock(chat_id, lock_type, locked):
             curr_perm.rtl = locked
         elif lock_type == 'button':
             curr_perm.button = locked
+        __set_mask(CHAT_LOCKS, chat_id, __lock_mask(curr_perm))
 
         SESSION.add(curr_perm)
         SESSION.commit()
@@ -173,80 +200,34 @@ def update_restriction(chat_id, restr_type, locked):
             curr_restr.media = locked
             curr_restr.other = locked
             curr_restr.preview = locked
+        __set_mask(CHAT_RESTRICTIONS, chat_id, __restr_mask(curr_restr))
         SESSION.add(curr_restr)
         SESSION.commit()
 
 
-def is_locked(chat_id, lock_type):
-    curr_perm = SESSION.query(Permissions).get(str(chat_id))
-    SESSION.close()
+def has_locks(chat_id):
+    return str(chat_id) in CHAT_LOCKS
 
-    if not curr_perm:
-        return False
 
-    elif lock_type == "sticker":
-        return curr_perm.sticker
-    elif lock_type == "photo":
-        return curr_perm.photo
-    elif lock_type == "audio":
-        return curr_perm.audio
-    elif lock_type == "voice":
-        return curr_perm.voice
-    elif lock_type == "contact":
-        return curr_perm.contact
-    elif lock_type == "video":
-        return curr_perm.video
-    elif lock_type == "document":
-        return curr_perm.document
-    elif lock_type == "gif":
-        return curr_perm.gif
-    elif lock_type == "url":
-        return curr_perm.url
-    elif lock_type == "bots":
-        return curr_perm.bots
-    elif lock_type == "forward":
-        return curr_perm.forward
-    elif lock_type == "game":
-        return curr_perm.game
-    elif lock_type == "location":
-        return curr_perm.location
-    elif lock_type == "rtl":
-        return curr_perm.rtl
-    elif lock_type == "button":
-        return curr_perm.button
+def is_locked(chat_id, lock_type):
+    return bool(CHAT_LOCKS.get(str(chat_id), 0) & LOCK_BITS.get(lock_type, 0))
 
 
 def is_restr_locked(chat_id, lock_type):
-    curr_restr = SESSION.query(Restrictions).get(str(chat_id))
-    SESSION.close()
-
-    if not curr_restr:
-        return False
-
-    if lock_type == "messages":
-        return curr_restr.messages
-    elif lock_type == "media":
-        return curr_restr.media
-    elif lock_type == "other":
-        return curr_restr.other
-    elif lock_type == "previews":
-        return curr_restr.preview
-    elif lock_type == "all":
-        return curr_restr.messages and curr_restr.media and curr_restr.other and curr_restr.preview
+    mask = CHAT_RESTRICTIONS.get(str(chat_id), 0)
+    if lock_type == "all":
+        return mask == RESTR_ALL
+    return bool(mask & RESTR_BITS.get(lock_type, 0))
 
 
 def get_locks(chat_id):
-    try:
-        return SESSION.query(Permissions).get(str(chat_id))
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(Permissions).get(str(chat_id))
 
 
 def get_restr(chat_id):
-    try:
-        return SESSION.query(Restrictions).get(str(chat_id))
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(Restrictions).get(str(chat_id))
 
 
 def migrate_chat(old_chat_id, new_chat_id):
@@ -255,12 +236,14 @@ def migrate_chat(old_chat_id, new_chat_id):
         if perms:
             perms.chat_id = str(new_chat_id)
         SESSION.commit()
+        __set_mask(CHAT_LOCKS, new_chat_id, CHAT_LOCKS.pop(str(old_chat_id), 0))
 
     with RESTR_LOCK:
         rest = SESSION.query(Restrictions).get(str(old_chat_id))
         if rest:
             rest.chat_id = str(new_chat_id)
         SESSION.commit()
+        __set_mask(CHAT_RESTRICTIONS, new_chat_id, CHAT_RESTRICTIONS.pop(str(old_chat_id), 0))
 
 
 def set_lockconf(chat_id, should_warn):
@@ -274,10 +257,23 @@ def set_lockconf(chat_id, should_warn):
         SESSION.commit()
 
 def get_lockconf(chat_id) -> bool:
-    try:
-        lock_setting = SESSION.query(LockConfig).get(str(chat_id))
+    with session_scope() as session:
+        lock_setting = session.query(LockConfig).get(str(chat_id))
         if lock_setting:
             return lock_setting.warn
         return False
-    finally:
-        SESSION.close()
+
+
+def __load_locks():
+    with session_scope() as session:
+        # Plain rows, they have the same attribute names as the mapped classes
+        all_perms = session.query(*Permissions.__table__.columns).all()
+        for x in all_perms:
+            __set_mask(CHAT_LOCKS, x.chat_id, __lock_mask(x))
+        all_restr = session.query(*Restrictions.__table__.columns).all()
+        for x in all_restr:
+            __set_mask(CHAT_RESTRICTIONS, x.chat_id, __restr_mask(x))
+    return len(all_perms) + len(all_restr)
+
+
+cache_loader(__load_locks)
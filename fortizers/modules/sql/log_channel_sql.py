@@ -2,7 +2,7 @@ import threading
 
 from sqlalchemy import Column, String, func, distinct
 
-from fortizers.modules.sql import BASE, SESSION
+from fortizers.modules.sql import BASE, SESSION, session_scope, cache_loader
 
 
 class GroupLogs(BASE):
@@ -52,10 +52,8 @@ def stop_chat_logging(chat_id):
             return log_channel
 
 def num_logchannels():
-    try:
-        return SESSION.query(func.count(distinct(GroupLogs.chat_id))).scalar()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(func.count(distinct(GroupLogs.chat_id))).scalar()
 
 
 
@@ -73,11 +71,10 @@ def migrate_chat(old_chat_id, new_chat_id):
 
 def __load_log_channels():
     global CHANNELS
-    try:
-        all_chats = SESSION.query(GroupLogs).all()
-        CHANNELS = {chat.chat_id: chat.log_channel for chat in all_chats}
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        all_chats = session.query(GroupLogs.chat_id, GroupLogs.log_channel).all()
+        CHANNELS = {chat_id: log_channel for chat_id, log_channel in all_chats}
+    return len(all_chats)
 
         
-__load_log_channels()
+cache_loader(__load_log_channels)
@@ -1,10 +1,10 @@
 # Note: chat_id's are stored as strings because the int is too large to be stored in a PSQL database.
 import threading
 
-from sqlalchemy import Column, String, Boolean, UnicodeText, Integer, func, distinct
+from sqlalchemy import Column, String, Boolean, UnicodeText, Integer, Index, func, distinct
 
 from fortizers.modules.helper_funcs.msg_types import Types
-from fortizers.modules.sql import SESSION, BASE
+from fortizers.modules.sql import SESSION, BASE, session_scope, create_missing_indexes
 
 
 class Notes(BASE):
@@ -36,6 +36,8 @@ class Buttons(BASE):
     name = Column(UnicodeText, nullable=False)
     url = Column(UnicodeText, nullable=False)
     same_line = Column(Boolean, default=False)
+    # The primary key starts with id, so it doesn't help lookups by chat and note
+    __table_args__ = (Index('ix_note_urls_chat_id_note_name', 'chat_id', 'note_name'),)
 
     def __init__(self, chat_id, note_name, name, url, same_line=False):
         self.chat_id = str(chat_id)
@@ -63,6 +65,8 @@ Notes.__table__.create(checkfirst=True)
 Buttons.__table__.create(checkfirst=True)
 PrivateNote.__table__.create(checkfirst=True)
 
+create_missing_indexes(Buttons.__table__)
+
 NOTES_INSERTION_LOCK = threading.RLock()
 BUTTONS_INSERTION_LOCK = threading.RLock()
 PMNOTE_INSERTION_LOCK = threading.RLock()
@@ -89,11 +93,28 @@ def add_note_to_db(chat_id, note_name, note_data, msgtype, buttons=None, file=No
         add_note_button_to_db(chat_id, note_name, b_name, url, same_line)
 
 
+def bulk_add_notes(chat_id, notes):
+    """
+    Adds or replaces many notes in one transaction, used by backup imports. `notes` holds
+    (note_name, note_data, msgtype, buttons, file) tuples.
+    """
+    notes = {x[0]: x for x in notes}
+    if not notes:
+        return
+    with NOTES_INSERTION_LOCK, BUTTONS_INSERTION_LOCK, session_scope(commit=True) as session:
+        session.query(Buttons).filter(Buttons.chat_id == str(chat_id), Buttons.note_name.in_(notes)).delete(
+            synchronize_session=False)
+        session.query(Notes).filter(Notes.chat_id == str(chat_id), Notes.name.in_(notes)).delete(
+            synchronize_session=False)
+        session.bulk_save_objects([Notes(str(chat_id), note_name, note_data or "", msgtype=msgtype.value, file=file)
+                                   for note_name, note_data, msgtype, buttons, file in notes.values()])
+        session.bulk_save_objects([Buttons(chat_id, x[0], b_name, url, same_line)
+                                   for x in notes.values() for b_name, url, same_line in x[3] or []])
+
+
 def get_note(chat_id, note_name):
-    try:
-        return SESSION.query(Notes).get((str(chat_id), note_name))
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(Notes).get((str(chat_id), note_name))
 
 
 def rm_note(chat_id, note_name):
@@ -116,10 +137,8 @@ def rm_note(chat_id, note_name):
 
 
 def get_all_chat_notes(chat_id):
-    try:
-        return SESSION.query(Notes).filter(Notes.chat_id == str(chat_id)).order_by(Notes.name.asc()).all()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(Notes).filter(Notes.chat_id == str(chat_id)).order_by(Notes.name.asc()).all()
 
 
 def add_note_button_to_db(chat_id, note_name, b_name, url, same_line):
@@ -130,11 +149,9 @@ def add_note_button_to_db(chat_id, note_name, b_name, url, same_line):
 
 
 def get_buttons(chat_id, note_name):
-    try:
-        return SESSION.query(Buttons).filter(Buttons.chat_id == str(chat_id), Buttons.note_name == note_name).order_by(
+    with session_scope() as session:
+        return session.query(Buttons).filter(Buttons.chat_id == str(chat_id), Buttons.note_name == note_name).order_by(
             Buttons.id).all()
-    finally:
-        SESSION.close()
 
 def private_note(chat_id, is_private, is_delete):
     with PMNOTE_INSERTION_LOCK:
@@ -155,17 +172,13 @@ def get_private_note(chat_id):
         return False, False
 
 def num_notes():
-    try:
-        return SESSION.query(Notes).count()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(Notes).count()
 
 
 def num_chats():
-    try:
-        return SESSION.query(func.count(distinct(Notes.chat_id))).scalar()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(func.count(distinct(Notes.chat_id))).scalar()
 
 
 def migrate_chat(old_chat_id, new_chat_id):
@@ -3,7 +3,7 @@ from typing import Union
 
 from sqlalchemy import Column, Integer, String, Boolean
 
-from fortizers.modules.sql import SESSION, BASE
+from fortizers.modules.sql import SESSION, BASE, session_scope
 
 
 class ReportingUserSettings(BASE):
@@ -38,23 +38,19 @@ USER_LOCK = threading.RLock()
 
 
 def chat_should_report(chat_id: Union[str, int]) -> bool:
-    try:
-        chat_setting = SESSION.query(ReportingChatSettings).get(str(chat_id))
+    with session_scope() as session:
+        chat_setting = session.query(ReportingChatSettings).get(str(chat_id))
         if chat_setting:
             return chat_setting.should_report
         return False
-    finally:
-        SESSION.close()
 
 
 def user_should_report(user_id: int) -> bool:
-    try:
-        user_setting = SESSION.query(ReportingUserSettings).get(user_id)
+    with session_scope() as session:
+        user_setting = session.query(ReportingUserSettings).get(user_id)
         if user_setting:
             return user_setting.should_report
         return True
-    finally:
-        SESSION.close()
 
 
 def set_chat_setting(chat_id: Union[int, str], setting: bool):
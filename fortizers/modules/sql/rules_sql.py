@@ -2,7 +2,7 @@ import threading
 
 from sqlalchemy import Column, String, UnicodeText, Boolean, func, distinct
 
-from fortizers.modules.sql import SESSION, BASE
+from fortizers.modules.sql import SESSION, BASE, session_scope
 
 
 class Rules(BASE):
@@ -49,12 +49,11 @@ def set_rules(chat_id, rules_text):
 
 
 def get_rules(chat_id):
-    rules = SESSION.query(Rules).get(str(chat_id))
-    ret = ""
-    if rules:
-        ret = rules.rules
-
-    SESSION.close()
+    with session_scope() as session:
+        rules = session.query(Rules).get(str(chat_id))
+        ret = ""
+        if rules:
+            ret = rules.rules
     return ret
 
 
@@ -70,18 +69,17 @@ def private_rules(chat_id, is_private):
         SESSION.commit()
 
 def get_private_rules(chat_id):
-    curr = SESSION.query(PrivateRules).get(str(chat_id))
-    if curr:
-        return curr.is_private
-    else:
-        return True
+    with session_scope() as session:
+        curr = session.query(PrivateRules).get(str(chat_id))
+        if curr:
+            return curr.is_private
+        else:
+            return True
 
 
 def num_chats():
-    try:
-        return SESSION.query(func.count(distinct(Rules.chat_id))).scalar()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(func.count(distinct(Rules.chat_id))).scalar()
 
 
 def migrate_chat(old_chat_id, new_chat_id):
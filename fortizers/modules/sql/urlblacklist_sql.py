@@ -2,7 +2,7 @@ import threading
 
 from sqlalchemy import Column, String, UnicodeText
 
-from fortizers.modules.sql import BASE, SESSION
+from fortizers.modules.sql import BASE, SESSION, session_scope
 
 
 class URLBlackListFilters(BASE):
@@ -52,19 +52,17 @@ def get_blacklisted_urls(chat_id):
 
 def _load_chat_blacklist():
     global CHAT_URL_BLACKLISTS
-    try:
-        chats = SESSION.query(URLBlackListFilters.chat_id).distinct().all()
+    with session_scope() as session:
+        chats = session.query(URLBlackListFilters.chat_id).distinct().all()
         for (chat_id,) in chats:
             CHAT_URL_BLACKLISTS[chat_id] = []
 
-        all_urls = SESSION.query(URLBlackListFilters).all()
+        all_urls = session.query(URLBlackListFilters).all()
         for url in all_urls:
             CHAT_URL_BLACKLISTS[url.chat_id] += [url.domain]
         CHAT_URL_BLACKLISTS = {
             k: set(v) for k,
             v in CHAT_URL_BLACKLISTS.items()}
-    finally:
-        SESSION.close()
 
 
 _load_chat_blacklist()
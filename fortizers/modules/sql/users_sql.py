@@ -1,9 +1,12 @@
+import atexit
 import threading
+from collections import OrderedDict
 
-from sqlalchemy import Column, Integer, UnicodeText, String, ForeignKey, UniqueConstraint, func
+from sqlalchemy import Column, Integer, UnicodeText, String, ForeignKey, UniqueConstraint, Index, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
-from fortizers import dispatcher
-from fortizers.modules.sql import BASE, SESSION
+from fortizers import dispatcher, LOGGER
+from fortizers.modules.sql import BASE, SESSION, session_scope, create_missing_indexes
 
 
 class Users(BASE):
@@ -45,7 +48,8 @@ class ChatMembers(BASE):
                   ForeignKey("users.user_id",
                              onupdate="CASCADE",
                              ondelete="CASCADE"),
-                  nullable=False)
+                  nullable=False,
+                  index=True)
     __table_args__ = (UniqueConstraint('chat', 'user', name='_chat_members_uc'),)
 
     def __init__(self, chat, user):
@@ -57,12 +61,34 @@ class ChatMembers(BASE):
                                                             self.chat.chat_name, self.chat.chat_id)
 
 
+# get_userid_by_name matches usernames case-insensitively
+Index('ix_users_username_lower', func.lower(Users.username))
+
 Users.__table__.create(checkfirst=True)
 Chats.__table__.create(checkfirst=True)
 ChatMembers.__table__.create(checkfirst=True)
 
+create_missing_indexes(Users.__table__)
+create_missing_indexes(ChatMembers.__table__)
+
 INSERTION_LOCK = threading.RLock()
 
+# update_user runs for nearly every group message, so its rows are buffered and written in bulk
+FLUSH_INTERVAL = 2  # seconds
+FLUSH_SIZE = 500  # pending rows that trigger an early flush
+SEEN_SIZE = 50000  # written rows remembered per kind, to skip updates that change nothing
+
+PENDING_LOCK = threading.Lock()
+FLUSH_NEEDED = threading.Event()
+PENDING_USERS = {}  # user_id: username
+PENDING_CHATS = {}  # chat_id: chat_name
+PENDING_MEMBERS = set()  # (chat_id, user_id)
+SEEN_USERS = OrderedDict()
+SEEN_CHATS = OrderedDict()
+SEEN_MEMBERS = OrderedDict()
+
+_MISSING = object()
+
 
 def ensure_bot_in_db():
     with INSERTION_LOCK:
@@ -71,88 +97,163 @@ def ensure_bot_in_db():
         SESSION.commit()
 
 
+def __is_seen(seen, key, value=None):
+    if seen.get(key, _MISSING) != value:
+        return False
+    seen.move_to_end(key)
+    return True
+
+
+def __mark_seen(seen, items):
+    for key, value in items:
+        seen[key] = value
+        seen.move_to_end(key)
+    while len(seen) > SEEN_SIZE:
+        seen.popitem(last=False)
+
+
 def update_user(user_id, username, chat_id=None, chat_name=None):
-    with INSERTION_LOCK:
-        user = SESSION.query(Users).get(user_id)
-        if not user:
-            user = Users(user_id, username)
-            SESSION.add(user)
-            SESSION.flush()
-        else:
-            user.username = username
+    with PENDING_LOCK:
+        if not __is_seen(SEEN_USERS, user_id, username):
+            PENDING_USERS[user_id] = username
+
+        if chat_id and chat_name:
+            chat_id = str(chat_id)
+            if not __is_seen(SEEN_CHATS, chat_id, chat_name):
+                PENDING_CHATS[chat_id] = chat_name
+            if not __is_seen(SEEN_MEMBERS, (chat_id, user_id)):
+                PENDING_MEMBERS.add((chat_id, user_id))
+
+        pending = len(PENDING_USERS) + len(PENDING_CHATS) + len(PENDING_MEMBERS)
+
+    if pending >= FLUSH_SIZE:
+        FLUSH_NEEDED.set()
+
+
+def __write_users(users, chats, members):
+    if SESSION.get_bind().dialect.name == "postgresql":
+        if users:
+            stmt = pg_insert(Users.__table__)
+            stmt = stmt.on_conflict_do_update(index_elements=[Users.user_id], set_={'username': stmt.excluded.username})
+            SESSION.execute(stmt, [{'user_id': k, 'username': v} for k, v in users.items()])
+        if chats:
+            stmt = pg_insert(Chats.__table__)
+            stmt = stmt.on_conflict_do_update(index_elements=[Chats.chat_id], set_={'chat_name': stmt.excluded.chat_name})
+            SESSION.execute(stmt, [{'chat_id': k, 'chat_name': v} for k, v in chats.items()])
+        if members:
+            stmt = pg_insert(ChatMembers.__table__).on_conflict_do_nothing(constraint='_chat_members_uc')
+            SESSION.execute(stmt, [{'chat': chat_id, 'user': user_id} for chat_id, user_id in members])
+    else:
+        for user_id, username in users.items():
+            SESSION.merge(Users(user_id, username))
+        for chat_id, chat_name in chats.items():
+            SESSION.merge(Chats(chat_id, chat_name))
+        SESSION.flush()
+        for chat_id, user_id in members:
+            if not SESSION.query(ChatMembers).filter(ChatMembers.chat == chat_id, ChatMembers.user == user_id).first():
+                SESSION.add(ChatMembers(chat_id, user_id))
+
 
-        if not chat_id or not chat_name:
+def flush_users():
+    """Writes the users, chats and memberships buffered by update_user."""
+    with PENDING_LOCK:
+        users, chats, members = dict(PENDING_USERS), dict(PENDING_CHATS), set(PENDING_MEMBERS)
+        PENDING_USERS.clear()
+        PENDING_CHATS.clear()
+        PENDING_MEMBERS.clear()
+    if not users and not chats and not members:
+        return
+
+    with INSERTION_LOCK:
+        try:
+            __write_users(users, chats, members)
             SESSION.commit()
+        except Exception:
+            SESSION.rollback()
+            LOGGER.exception("Could not write {} users, {} chats and {} chat members".format(
+                len(users), len(chats), len(members)))
+            # Retried with the next flush, unless newer data came in meanwhile
+            with PENDING_LOCK:
+                for user_id, username in users.items():
+                    PENDING_USERS.setdefault(user_id, username)
+                for chat_id, chat_name in chats.items():
+                    PENDING_CHATS.setdefault(chat_id, chat_name)
+                PENDING_MEMBERS.update(members)
             return
+        finally:
+            SESSION.close()
 
-        chat = SESSION.query(Chats).get(str(chat_id))
-        if not chat:
-            chat = Chats(str(chat_id), chat_name)
-            SESSION.add(chat)
-            SESSION.flush()
+    with PENDING_LOCK:
+        __mark_seen(SEEN_USERS, users.items())
+        __mark_seen(SEEN_CHATS, chats.items())
+        __mark_seen(SEEN_MEMBERS, ((x, None) for x in members))
 
-        else:
-            chat.chat_name = chat_name
 
-        member = SESSION.query(ChatMembers).filter(ChatMembers.chat == chat.chat_id,
-                                                   ChatMembers.user == user.user_id).first()
-        if not member:
-            chat_member = ChatMembers(chat.chat_id, user.user_id)
-            SESSION.add(chat_member)
+def __forget_seen(chat_id=None, user_id=None):
+    with PENDING_LOCK:
+        if user_id is not None:
+            SEEN_USERS.pop(user_id, None)
+        if chat_id is not None:
+            SEEN_CHATS.pop(str(chat_id), None)
+        for key in [x for x in SEEN_MEMBERS if (chat_id is not None and x[0] == str(chat_id)) or x[1] == user_id]:
+            del SEEN_MEMBERS[key]
 
-        SESSION.commit()
+
+def __flush_loop():
+    while True:
+        FLUSH_NEEDED.wait(FLUSH_INTERVAL)
+        FLUSH_NEEDED.clear()
+        try:
+            flush_users()
+        except Exception:
+            LOGGER.exception("User flush failed")
 
 
 def get_userid_by_name(username):
-    try:
-        return SESSION.query(Users).filter(func.lower(Users.username) == username.lower()).all()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(Users).filter(func.lower(Users.username) == username.lower()).all()
 
 
 def get_name_by_userid(user_id):
-    try:
-        return SESSION.query(Users).get(Users.user_id == int(user_id)).first()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(Users).get(Users.user_id == int(user_id)).first()
 
 
 def get_chat_members(chat_id):
-    try:
-        return SESSION.query(ChatMembers).filter(ChatMembers.chat == str(chat_id)).all()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(ChatMembers).filter(ChatMembers.chat == str(chat_id)).all()
 
 
 def get_all_chats():
-    try:
-        return SESSION.query(Chats).all()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(Chats).all()
+
+
+def get_chat_ids_after(chat_id, limit):
+    # Keyset pagination over chats, so long running jobs can resume from the last chat they handled
+    with session_scope() as session:
+        return [x for (x,) in session.query(Chats.chat_id).filter(Chats.chat_id > str(chat_id))
+                .order_by(Chats.chat_id).limit(limit).all()]
 
 
 def get_user_num_chats(user_id):
-    try:
-        return SESSION.query(ChatMembers).filter(ChatMembers.user == int(user_id)).count()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(ChatMembers).filter(ChatMembers.user == int(user_id)).count()
 
 
 def num_chats():
-    try:
-        return SESSION.query(Chats).count()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(Chats).count()
 
 
 def num_users():
-    try:
-        return SESSION.query(Users).count()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(Users).count()
 
 
 def migrate_chat(old_chat_id, new_chat_id):
+    flush_users()
+    __forget_seen(chat_id=old_chat_id)
     with INSERTION_LOCK:
         chat = SESSION.query(Chats).get(str(old_chat_id))
         if chat:
@@ -170,9 +271,13 @@ def migrate_chat(old_chat_id, new_chat_id):
 
 
 ensure_bot_in_db()
+threading.Thread(target=__flush_loop, name="users-flush", daemon=True).start()
+atexit.register(flush_users)
 
 
 def del_user(user_id):
+    flush_users()
+    __forget_seen(user_id=user_id)
     with INSERTION_LOCK:
         curr = SESSION.query(Users).get(user_id)
         if curr:
@@ -187,6 +292,8 @@ def del_user(user_id):
 
 
 def rem_chat(chat_id):
+    flush_users()
+    __forget_seen(chat_id=chat_id)
     with INSERTION_LOCK:
         chat = SESSION.query(Chats).get(str(chat_id))
         if chat:
@@ -3,14 +3,16 @@ import threading
 from sqlalchemy import Integer, Column, String, UnicodeText, func, distinct, Boolean
 from sqlalchemy.dialects import postgresql
 
-from fortizers.modules.sql import SESSION, BASE
+from fortizers.modules.helper_funcs.string_handling import build_keyword_matcher, find_longest_keyword
+from fortizers.modules.sql import SESSION, BASE, session_scope, create_missing_indexes, cache_loader
 
 
 class Warns(BASE):
     __tablename__ = "warns"
 
     user_id = Column(Integer, primary_key=True)
-    chat_id = Column(String(14), primary_key=True)
+    # The primary key starts with user_id, per-chat lookups need their own index
+    chat_id = Column(String(14), primary_key=True, index=True)
     num_warns = Column(Integer, default=0)
     reasons = Column(postgresql.ARRAY(UnicodeText))
 
@@ -65,11 +67,19 @@ Warns.__table__.create(checkfirst=True)
 WarnFilters.__table__.create(checkfirst=True)
 WarnSettings.__table__.create(checkfirst=True)
 
+create_missing_indexes(Warns.__table__)
+
 WARN_INSERTION_LOCK = threading.RLock()
 WARN_FILTER_INSERTION_LOCK = threading.RLock()
 WARN_SETTINGS_LOCK = threading.RLock()
 
 WARN_FILTERS = {}
+# chat_id -> {keyword: reply}
+WARN_FILTER_REPLIES = {}
+# chat_id -> build_keyword_matcher result, built on the first lookup after the chat's warn filters changed
+WARN_FILTER_MATCHERS = {}
+# chat_id -> (warn_limit, soft_warn, warn_mode)
+WARN_SETTINGS = {}
 
 
 def warn_user(user_id, chat_id, reason=None):
@@ -121,15 +131,13 @@ def reset_warns(user_id, chat_id):
 
 
 def get_warns(user_id, chat_id):
-    try:
-        user = SESSION.query(Warns).get((user_id, str(chat_id)))
+    with session_scope() as session:
+        user = session.query(Warns).get((user_id, str(chat_id)))
         if not user:
             return None
         reasons = user.reasons
         num = user.num_warns
         return num, reasons
-    finally:
-        SESSION.close()
 
 
 def add_warn_filter(chat_id, keyword, reply):
@@ -142,6 +150,24 @@ def add_warn_filter(chat_id, keyword, reply):
 
         SESSION.merge(warn_filt)  # merge to avoid duplicate key issues
         SESSION.commit()
+        WARN_FILTER_REPLIES.setdefault(str(chat_id), {})[keyword] = reply
+        WARN_FILTER_MATCHERS.pop(str(chat_id), None)
+
+
+def bulk_add_warn_filters(chat_id, filters):
+    """Adds or replaces many (keyword, reply) warn filters in one transaction, used by backup imports."""
+    filters = dict(filters)
+    if not filters:
+        return
+    with WARN_FILTER_INSERTION_LOCK:
+        with session_scope(commit=True) as session:
+            session.query(WarnFilters).filter(WarnFilters.chat_id == str(chat_id),
+                                              WarnFilters.keyword.in_(filters)).delete(synchronize_session=False)
+            session.bulk_save_objects([WarnFilters(str(chat_id), keyword, reply) for keyword, reply in filters.items()])
+        WARN_FILTERS[str(chat_id)] = sorted(set(WARN_FILTERS.get(str(chat_id), [])) | set(filters),
+                                            key=lambda x: (-len(x), x))
+        WARN_FILTER_REPLIES.setdefault(str(chat_id), {}).update(filters)
+        WARN_FILTER_MATCHERS.pop(str(chat_id), None)
 
 
 def remove_warn_filter(chat_id, keyword):
@@ -150,6 +176,8 @@ def remove_warn_filter(chat_id, keyword):
         if warn_filt:
             if keyword in WARN_FILTERS.get(str(chat_id), []):  # sanity check
                 WARN_FILTERS.get(str(chat_id), []).remove(keyword)
+            WARN_FILTER_REPLIES.get(str(chat_id), {}).pop(keyword, None)
+            WARN_FILTER_MATCHERS.pop(str(chat_id), None)
 
             SESSION.delete(warn_filt)
             SESSION.commit()
@@ -162,130 +190,117 @@ def get_chat_warn_triggers(chat_id):
     return WARN_FILTERS.get(str(chat_id), set())
 
 
+def match_warn_filter(chat_id, text):
+    """Returns (keyword, reply) of the longest warn filter found in text, or None."""
+    keywords = WARN_FILTERS.get(str(chat_id))
+    if not keywords:
+        return None
+
+    matcher = WARN_FILTER_MATCHERS.get(str(chat_id))
+    if matcher is None:
+        with WARN_FILTER_INSERTION_LOCK:
+            matcher = WARN_FILTER_MATCHERS[str(chat_id)] = build_keyword_matcher(keywords)
+    keyword = find_longest_keyword(matcher, text)
+    if keyword is None:
+        return None
+    reply = WARN_FILTER_REPLIES.get(str(chat_id), {}).get(keyword)
+    if reply is None:
+        return None
+    return keyword, reply
+
+
 def get_chat_warn_filters(chat_id):
-    try:
-        return SESSION.query(WarnFilters).filter(WarnFilters.chat_id == str(chat_id)).all()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(WarnFilters).filter(WarnFilters.chat_id == str(chat_id)).all()
 
 
 def get_warn_filter(chat_id, keyword):
-    try:
-        return SESSION.query(WarnFilters).get((str(chat_id), keyword))
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(WarnFilters).get((str(chat_id), keyword))
 
 
-def set_warn_limit(chat_id, warn_limit):
+def __update_warn_setting(chat_id, **values):
     with WARN_SETTINGS_LOCK:
-        curr_setting = SESSION.query(WarnSettings).get(str(chat_id))
-        if not curr_setting:
-            curr_setting = WarnSettings(chat_id, warn_limit=warn_limit)
+        with session_scope(commit=True) as session:
+            curr_setting = session.query(WarnSettings).get(str(chat_id))
+            if not curr_setting:
+                curr_setting = WarnSettings(chat_id)
+                session.add(curr_setting)
+            for name, value in values.items():
+                setattr(curr_setting, name, value)
+            setting = (curr_setting.warn_limit, curr_setting.soft_warn, curr_setting.warn_mode)
+        # Only after the commit, a failed one is rolled back and leaves the cached setting as it was
+        WARN_SETTINGS[str(chat_id)] = setting
 
-        curr_setting.warn_limit = warn_limit
 
-        SESSION.add(curr_setting)
-        SESSION.commit()
+def set_warn_limit(chat_id, warn_limit):
+    __update_warn_setting(chat_id, warn_limit=warn_limit)
 
 
 def set_warn_strength(chat_id, soft_warn):
-    with WARN_SETTINGS_LOCK:
-        curr_setting = SESSION.query(WarnSettings).get(str(chat_id))
-        if not curr_setting:
-            curr_setting = WarnSettings(chat_id, soft_warn=soft_warn)
-
-        curr_setting.soft_warn = soft_warn
-
-        SESSION.add(curr_setting)
-        SESSION.commit()
+    __update_warn_setting(chat_id, soft_warn=soft_warn)
 
 
 def get_warn_setting(chat_id):
-    try:
-        setting = SESSION.query(WarnSettings).get(str(chat_id))
-        if setting:
-            return setting.warn_limit, setting.soft_warn, setting.warn_mode
-        else:
-            return 3, False, 1
-
-    finally:
-        SESSION.close()
+    return WARN_SETTINGS.get(str(chat_id), (3, False, 1))
 
 
 def set_warn_mode(chat_id, warn_mode):
-    with WARN_SETTINGS_LOCK:
-        curr_setting = SESSION.query(WarnSettings).get(str(chat_id))
-        if not curr_setting:
-            curr_setting = WarnSettings(chat_id, warn_mode=warn_mode)
-
-        curr_setting.warn_mode = warn_mode
-
-        SESSION.add(curr_setting)
-        SESSION.commit()
+    __update_warn_setting(chat_id, warn_mode=warn_mode)
 
 
 def get_warn_mode(chat_id):
-    try:
-        setting = SESSION.query(WarnSettings).get(str(chat_id))
-        if setting:
-            return setting.warn_mode, setting.warn_mode
-        else:
-            return 3, False
-
-    finally:
-        SESSION.close()
+    setting = WARN_SETTINGS.get(str(chat_id))
+    if setting:
+        return setting[2], setting[2]
+    else:
+        return 3, False
 
 
 def num_warns():
-    try:
-        return SESSION.query(func.sum(Warns.num_warns)).scalar() or 0
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(func.sum(Warns.num_warns)).scalar() or 0
 
 
 def num_warn_chats():
-    try:
-        return SESSION.query(func.count(distinct(Warns.chat_id))).scalar()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(func.count(distinct(Warns.chat_id))).scalar()
 
 
 def num_warn_filters():
-    try:
-        return SESSION.query(WarnFilters).count()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(WarnFilters).count()
 
 
 def num_warn_chat_filters(chat_id):
-    try:
-        return SESSION.query(WarnFilters.chat_id).filter(WarnFilters.chat_id == str(chat_id)).count()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(WarnFilters.chat_id).filter(WarnFilters.chat_id == str(chat_id)).count()
 
 
 def num_warn_filter_chats():
-    try:
-        return SESSION.query(func.count(distinct(WarnFilters.chat_id))).scalar()
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        return session.query(func.count(distinct(WarnFilters.chat_id))).scalar()
 
 
 def __load_chat_warn_filters():
     global WARN_FILTERS
-    try:
-        chats = SESSION.query(WarnFilters.chat_id).distinct().all()
-        for (chat_id,) in chats:  # remove tuple by ( ,)
-            WARN_FILTERS[chat_id] = []
-
-        all_filters = SESSION.query(WarnFilters).all()
-        for x in all_filters:
-            WARN_FILTERS[x.chat_id] += [x.keyword]
+    with session_scope() as session:
+        all_filters = session.query(WarnFilters.chat_id, WarnFilters.keyword, WarnFilters.reply).all()
+        for chat_id, keyword, reply in all_filters:
+            WARN_FILTERS.setdefault(chat_id, []).append(keyword)
+            WARN_FILTER_REPLIES.setdefault(chat_id, {})[keyword] = reply
 
         WARN_FILTERS = {x: sorted(set(y), key=lambda i: (-len(i), i)) for x, y in WARN_FILTERS.items()}
+    return len(all_filters)
 
-    finally:
-        SESSION.close()
+
+def __load_warn_settings():
+    with session_scope() as session:
+        all_settings = session.query(WarnSettings.chat_id, WarnSettings.warn_limit, WarnSettings.soft_warn,
+                                     WarnSettings.warn_mode).all()
+        for chat_id, warn_limit, soft_warn, warn_mode in all_settings:
+            WARN_SETTINGS[chat_id] = (warn_limit, soft_warn, warn_mode)
+    return len(all_settings)
 
 
 def migrate_chat(old_chat_id, new_chat_id):
@@ -302,21 +317,43 @@ def migrate_chat(old_chat_id, new_chat_id):
         SESSION.commit()
         WARN_FILTERS[str(new_chat_id)] = WARN_FILTERS[str(old_chat_id)]
         del WARN_FILTERS[str(old_chat_id)]
+        WARN_FILTER_REPLIES[str(new_chat_id)] = WARN_FILTER_REPLIES.pop(str(old_chat_id), {})
+        WARN_FILTER_MATCHERS.pop(str(old_chat_id), None)
+        WARN_FILTER_MATCHERS.pop(str(new_chat_id), None)
 
     with WARN_SETTINGS_LOCK:
         chat_settings = SESSION.query(WarnSettings).filter(WarnSettings.chat_id == str(old_chat_id)).all()
         for setting in chat_settings:
             setting.chat_id = str(new_chat_id)
         SESSION.commit()
+        if str(old_chat_id) in WARN_SETTINGS:
+            WARN_SETTINGS[str(new_chat_id)] = WARN_SETTINGS.pop(str(old_chat_id))
 
 
-def get_allwarns(chat_id):
-    get = SESSION.query(Warns).all()
-    allwarns = []
-    for x in get:
-        if x.chat_id == str(chat_id) and x.num_warns > 0:
-            allwarns.append({"user_id": x.user_id, 'warns': x.num_warns, 'reasons': x.reasons})
-    return allwarns
+def get_allwarns(chat_id, chunk_size=500):
+    """Yields the warned users of one chat, fetched from the database `chunk_size` rows at a time."""
+    with session_scope() as session:
+        rows = session.query(Warns.user_id, Warns.num_warns, Warns.reasons).filter(
+            Warns.chat_id == str(chat_id), Warns.num_warns > 0).yield_per(chunk_size)
+        for user_id, num_warns, reasons in rows:
+            yield {"user_id": user_id, 'warns': num_warns, 'reasons': reasons}
+
+
+def bulk_import_warns(chat_id, warns):
+    """Replaces the warns of many (user_id, num_warns, reasons) users in one transaction, used by backup imports."""
+    warns = {x[0]: x for x in warns}
+    if not warns:
+        return
+    rows = []
+    for user_id, num_warns, reasons in warns.values():
+        warned_user = Warns(user_id, str(chat_id))
+        warned_user.num_warns = num_warns
+        warned_user.reasons = reasons
+        rows.append(warned_user)
+    with WARN_INSERTION_LOCK, session_scope(commit=True) as session:
+        session.query(Warns).filter(Warns.chat_id == str(chat_id), Warns.user_id.in_(warns)).delete(
+            synchronize_session=False)
+        session.bulk_save_objects(rows)
 
 
 def import_warns(user_id, chat_id, warns, reasons):
@@ -334,4 +371,5 @@ def import_warns(user_id, chat_id, warns, reasons):
         return
 
 
-__load_chat_warn_filters()
+cache_loader(__load_chat_warn_filters)
+cache_loader(__load_warn_settings)
@@ -1,3 +1,4 @@
+import heapq
 import threading
 import time
 from typing import Union
@@ -5,7 +6,7 @@ from typing import Union
 from sqlalchemy import Column, String, Boolean, UnicodeText, Integer, BigInteger
 
 from fortizers.modules.helper_funcs.msg_types import Types
-from fortizers.modules.sql import SESSION, BASE
+from fortizers.modules.sql import SESSION, BASE, session_scope, create_missing_indexes, cache_loader
 
 DEFAULT_WELCOME = "Hey {first}, Apa kabar?"
 DEFAULT_GOODBYE = "Sampai jumpa lagi!"
@@ -39,7 +40,7 @@ class Welcome(BASE):
 class WelcomeButtons(BASE):
 	__tablename__ = "welcome_urls"
 	id = Column(Integer, primary_key=True, autoincrement=True)
-	chat_id = Column(String(14), primary_key=True)
+	chat_id = Column(String(14), primary_key=True, index=True)
 	name = Column(UnicodeText, nullable=False)
 	url = Column(UnicodeText, nullable=False)
 	same_line = Column(Boolean, default=False)
@@ -54,7 +55,7 @@ class WelcomeButtons(BASE):
 class GoodbyeButtons(BASE):
 	__tablename__ = "leave_urls"
 	id = Column(Integer, primary_key=True, autoincrement=True)
-	chat_id = Column(String(14), primary_key=True)
+	chat_id = Column(String(14), primary_key=True, index=True)
 	name = Column(UnicodeText, nullable=False)
 	url = Column(UnicodeText, nullable=False)
 	same_line = Column(Boolean, default=False)
@@ -127,7 +128,7 @@ class WelcomeTimeout(BASE):
 	__tablename__ = "welcome_timeout"
 	chat_id = Column(String(14), primary_key=True)
 	user_id = Column(Integer, primary_key=True, nullable=False)
-	timeout_int = Column(Integer, default=600)
+	timeout_int = Column(Integer, default=600, index=True)
 
 	def __init__(self, chat_id, user_id, timeout_int=600):
 		self.chat_id = str(chat_id)  # ensure string
@@ -148,6 +149,10 @@ UserRestrict.__table__.create(checkfirst=True)
 WelcomeTimeout.__table__.create(checkfirst=True)
 AllowedChat.__table__.create(checkfirst=True)
 
+create_missing_indexes(WelcomeButtons.__table__)
+create_missing_indexes(GoodbyeButtons.__table__)
+create_missing_indexes(WelcomeTimeout.__table__)
+
 INSERTION_LOCK = threading.RLock()
 WELC_BTN_LOCK = threading.RLock()
 LEAVE_BTN_LOCK = threading.RLock()
@@ -155,10 +160,14 @@ CS_LOCK = threading.RLock()
 WS_LOCK = threading.RLock()
 UR_LOCK = threading.RLock()
 TO_LOCK = threading.RLock()
+# Notified whenever a new timeout is queued, so the scheduler can wake up before its current deadline
+TO_ADDED = threading.Condition(TO_LOCK)
 ALLOWCHATLOCK = threading.RLock()
 
 CHAT_USERRESTRICT = {}
 CHAT_TIMEOUT = {}
+# Heap of (due, chat_id, user_id); entries that no longer match CHAT_TIMEOUT are skipped when popped
+TIMEOUT_QUEUE = []
 
 WHITELIST = set()
 
@@ -199,15 +208,20 @@ def get_chat_userlist(chat_id):
 
 def add_to_timeout(chat_id, user_id, timeout_int):
 	with TO_LOCK:
-		user_filt = WelcomeTimeout(str(chat_id), user_id, int(time.time()) + int(timeout_int))
+		due = int(time.time()) + int(timeout_int)
+		user_filt = WelcomeTimeout(str(chat_id), user_id, due)
 
 		SESSION.merge(user_filt)  # merge to avoid duplicate key issues
 		SESSION.commit()
+		CHAT_TIMEOUT.setdefault(str(chat_id), {})[user_id] = due
+		heapq.heappush(TIMEOUT_QUEUE, (due, str(chat_id), user_id))
+		TO_ADDED.notify_all()
 
 
 def rm_from_timeout(chat_id, user_id):
 	with TO_LOCK:
 		user_filt = SESSION.query(WelcomeTimeout).get((str(chat_id), user_id))
+		CHAT_TIMEOUT.get(str(chat_id), {}).pop(user_id, None)
 		if user_filt:
 			SESSION.delete(user_filt)
 			SESSION.commit()
@@ -223,15 +237,30 @@ def get_chat_timeout(chat_id):
 	return SESSION.query(WelcomeTimeout).filter(WelcomeTimeout.chat_id == str(chat_id)).all()
 
 
+def wait_due_timeouts():
+	"""Blocks until at least one timeout is due and returns the due (chat_id, user_id) pairs."""
+	with TO_LOCK:
+		while True:
+			now = time.time()
+			due = []
+			while TIMEOUT_QUEUE and TIMEOUT_QUEUE[0][0] <= now:
+				due_at, chat_id, user_id = heapq.heappop(TIMEOUT_QUEUE)
+				# Verified, removed or re-added with a new deadline since it was queued
+				if CHAT_TIMEOUT.get(chat_id, {}).get(user_id) == due_at:
+					due.append((chat_id, user_id))
+			if due:
+				return due
+			# Sleep until the next deadline, or until add_to_timeout queues an earlier one
+			TO_ADDED.wait(TIMEOUT_QUEUE[0][0] - now if TIMEOUT_QUEUE else None)
+
+
 def welcome_security(chat_id):
-	try:
-		security = SESSION.query(WelcomeSecurity).get(str(chat_id))
+	with session_scope() as session:
+		security = session.query(WelcomeSecurity).get(str(chat_id))
 		if security:
 			return security.security, security.extra_verify, security.mute_time, security.timeout, security.timeout_mode, security.custom_text
 		else:
 			return False, False, "0", "0", 1, "Klik disini untuk mensuarakan"
-	finally:
-		SESSION.close()
 
 
 def set_welcome_security(chat_id, security, extra_verify, mute_time, timeout, timeout_mode, custom_text):
@@ -252,13 +281,11 @@ def set_welcome_security(chat_id, security, extra_verify, mute_time, timeout, ti
 
 
 def clean_service(chat_id: Union[str, int]) -> bool:
-	try:
-		chat_setting = SESSION.query(CleanServiceSetting).get(str(chat_id))
+	with session_scope() as session:
+		chat_setting = session.query(CleanServiceSetting).get(str(chat_id))
 		if chat_setting:
 			return chat_setting.clean_service
 		return False
-	finally:
-		SESSION.close()
 		
 
 def set_clean_service(chat_id: Union[int, str], setting: bool):
@@ -273,8 +300,8 @@ def set_clean_service(chat_id: Union[int, str], setting: bool):
 
 
 def get_welc_pref(chat_id):
-	welc = SESSION.query(Welcome).get(str(chat_id))
-	SESSION.close()
+	with session_scope() as session:
+		welc = session.query(Welcome).get(str(chat_id))
 	if welc:
 		return welc.should_welcome, welc.custom_welcome, welc.custom_content, welc.welcome_type
 	else:
@@ -283,8 +310,8 @@ def get_welc_pref(chat_id):
 
 
 def get_gdbye_pref(chat_id):
-	welc = SESSION.query(Welcome).get(str(chat_id))
-	SESSION.close()
+	with session_scope() as session:
+		welc = session.query(Welcome).get(str(chat_id))
 	if welc:
 		return welc.should_goodbye, welc.custom_leave, welc.custom_content_leave, welc.leave_type
 	else:
@@ -305,8 +332,8 @@ def set_clean_welcome(chat_id, clean_welcome):
 
 
 def get_clean_pref(chat_id):
-	welc = SESSION.query(Welcome).get(str(chat_id))
-	SESSION.close()
+	with session_scope() as session:
+		welc = session.query(Welcome).get(str(chat_id))
 
 	if welc:
 		return welc.clean_welcome
@@ -371,12 +398,11 @@ def set_custom_welcome(chat_id, custom_content, custom_welcome, welcome_type, bu
 
 
 def get_custom_welcome(chat_id):
-	welcome_settings = SESSION.query(Welcome).get(str(chat_id))
-	ret = DEFAULT_WELCOME
-	if welcome_settings and welcome_settings.custom_welcome:
-		ret = welcome_settings.custom_welcome
-
-	SESSION.close()
+	with session_scope() as session:
+		welcome_settings = session.query(Welcome).get(str(chat_id))
+		ret = DEFAULT_WELCOME
+		if welcome_settings and welcome_settings.custom_welcome:
+			ret = welcome_settings.custom_welcome
 	return ret
 
 
@@ -413,29 +439,24 @@ def set_custom_gdbye(chat_id, custom_content_leave, custom_goodbye, goodbye_type
 
 
 def get_custom_gdbye(chat_id):
-	welcome_settings = SESSION.query(Welcome).get(str(chat_id))
-	ret = DEFAULT_GOODBYE
-	if welcome_settings and welcome_settings.custom_leave:
-		ret = welcome_settings.custom_leave
-
-	SESSION.close()
+	with session_scope() as session:
+		welcome_settings = session.query(Welcome).get(str(chat_id))
+		ret = DEFAULT_GOODBYE
+		if welcome_settings and welcome_settings.custom_leave:
+			ret = welcome_settings.custom_leave
 	return ret
 
 
 def get_welc_buttons(chat_id):
-	try:
-		return SESSION.query(WelcomeButtons).filter(WelcomeButtons.chat_id == str(chat_id)).order_by(
+	with session_scope() as session:
+		return session.query(WelcomeButtons).filter(WelcomeButtons.chat_id == str(chat_id)).order_by(
 			WelcomeButtons.id).all()
-	finally:
-		SESSION.close()
 
 
 def get_gdbye_buttons(chat_id):
-	try:
-		return SESSION.query(GoodbyeButtons).filter(GoodbyeButtons.chat_id == str(chat_id)).order_by(
+	with session_scope() as session:
+		return session.query(GoodbyeButtons).filter(GoodbyeButtons.chat_id == str(chat_id)).order_by(
 			GoodbyeButtons.id).all()
-	finally:
-		SESSION.close()
 
 
 def migrate_chat(old_chat_id, new_chat_id):
@@ -458,45 +479,35 @@ def migrate_chat(old_chat_id, new_chat_id):
 
 def __load_chat_userrestrict():
 	global CHAT_USERRESTRICT
-	try:
-		chats = SESSION.query(UserRestrict.chat_id).distinct().all()
-		for (chat_id,) in chats:  # remove tuple by ( ,)
-			CHAT_USERRESTRICT[chat_id] = []
-
-		all_filters = SESSION.query(UserRestrict).all()
-		for x in all_filters:
-			if not CHAT_USERRESTRICT.get(x.chat_id):
-				CHAT_USERRESTRICT[x.chat_id] = {}
-			CHAT_USERRESTRICT[x.chat_id][x.user_id] = x.is_clicked
+	with session_scope() as session:
+		all_filters = session.query(UserRestrict.chat_id, UserRestrict.user_id, UserRestrict.is_clicked).all()
+		for chat_id, user_id, is_clicked in all_filters:
+			CHAT_USERRESTRICT.setdefault(chat_id, {})[user_id] = is_clicked
 
 		# CHAT_USERRESTRICT = {x: set(y) for x, y in CHAT_USERRESTRICT.items()}
-
-	finally:
-		SESSION.close()
+	return len(all_filters)
 
 def __load_chat_timeout():
 	global CHAT_TIMEOUT
-	try:
-		chats = SESSION.query(WelcomeTimeout.chat_id).distinct().all()
-		for (chat_id,) in chats:  # remove tuple by ( ,)
-			CHAT_TIMEOUT[chat_id] = []
-
-		all_filters = SESSION.query(WelcomeTimeout).all()
-		for x in all_filters:
-			if not CHAT_TIMEOUT.get(x.chat_id):
-				CHAT_TIMEOUT[x.chat_id] = {}
-			CHAT_TIMEOUT[x.chat_id][x.user_id] = x.timeout_int
-
-	finally:
-		SESSION.close()
+	with session_scope() as session:
+		# Ordered by the timeout_int index, a sorted list is already a valid heap. Loaded before anything is queued.
+		all_filters = session.query(WelcomeTimeout.timeout_int, WelcomeTimeout.chat_id, WelcomeTimeout.user_id).order_by(
+			WelcomeTimeout.timeout_int).all()
+		with TO_LOCK:
+			for timeout_int, chat_id, user_id in all_filters:
+				CHAT_TIMEOUT.setdefault(chat_id, {})[user_id] = timeout_int
+				TIMEOUT_QUEUE.append((timeout_int, chat_id, user_id))
+			# The scheduler thread may already be waiting on an empty queue
+			TO_ADDED.notify()
+	return len(all_filters)
 
 
 def __load_whitelisted_chats_list():  # load shit to memory to be faster, and reduce disk access
     global WHITELIST
-    try:
-        WHITELIST = {x.chat_id for x in SESSION.query(AllowedChat).all()}
-    finally:
-        SESSION.close()
+    with session_scope() as session:
+        all_chats = session.query(AllowedChat.chat_id).all()
+        WHITELIST = {chat_id for (chat_id,) in all_chats}
+    return len(all_chats)
 
 
 def whitelistChat(chat_id):
@@ -521,7 +532,7 @@ def unwhitelistChat(chat_id):
 def isWhitelisted(chat_id):
     return chat_id in WHITELIST
 
-__load_whitelisted_chats_list()
+cache_loader(__load_whitelisted_chats_list)
 
-__load_chat_userrestrict()
-__load_chat_timeout()
+cache_loader(__load_chat_userrestrict)
+cache_loader(__load_chat_timeout)
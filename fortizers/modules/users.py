@@ -11,6 +11,7 @@ from telegram.ext.dispatcher import run_async
 import fortizers.modules.sql.users_sql as sql
 from fortizers import dispatcher, OWNER_ID, LOGGER
 from fortizers.modules.helper_funcs.filters import CustomFilters
+from fortizers.modules.helper_funcs.pipeline import add_message_handlers
 
 import fortizers.modules.sql.feds_sql as fedsql
 from fortizers.modules import languages
@@ -156,7 +157,8 @@ BROADCAST_HANDLER = CommandHandler("broadcast", broadcast, filters=Filters.user(
 USER_HANDLER = MessageHandler(Filters.all & Filters.group, log_user)
 CHATLIST_HANDLER = CommandHandler("chatlist", chats, filters=CustomFilters.sudo_filter)
 
-dispatcher.add_handler(USER_HANDLER, USERS_GROUP)
+# Users are logged even when an earlier check removed the message
+add_message_handlers([USER_HANDLER], USERS_GROUP, always=True)
 dispatcher.add_handler(BROADCAST_HANDLER)
 dispatcher.add_handler(CHATLIST_HANDLER)
 
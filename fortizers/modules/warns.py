@@ -17,6 +17,7 @@ from fortizers.modules.helper_funcs.extraction import extract_text, extract_user
 from fortizers.modules.helper_funcs.filters import CustomFilters
 from fortizers.modules.helper_funcs.misc import split_message
 from fortizers.modules.helper_funcs.string_handling import split_quotes
+from fortizers.modules.helper_funcs.pipeline import add_message_handlers
 from fortizers.modules.log_channel import loggable
 from fortizers.modules.sql import warns_sql as sql
 from fortizers.modules.connection import connected
@@ -513,17 +514,15 @@ def reply_filter(update, context) -> str:
     chat = update.effective_chat  # type: Optional[Chat]
     message = update.effective_message  # type: Optional[Message]
 
-    chat_warn_filters = sql.get_chat_warn_triggers(chat.id)
     to_match = extract_text(message)
     if not to_match:
         return ""
 
-    for keyword in chat_warn_filters:
-        pattern = r"( |^|[^\w])" + re.escape(keyword) + r"( |$|[^\w])"
-        if re.search(pattern, to_match, flags=re.IGNORECASE):
-            user = update.effective_user  # type: Optional[User]
-            warn_filter = sql.get_warn_filter(chat.id, keyword)
-            return warn(user, chat, warn_filter.reply, message)
+    warn_filter = sql.match_warn_filter(chat.id, to_match)
+    if warn_filter:
+        user = update.effective_user  # type: Optional[User]
+        keyword, reply = warn_filter
+        return warn(user, chat, reply, message)
     return ""
 
 
@@ -880,5 +879,5 @@ dispatcher.add_handler(RM_WARN_HANDLER)
 dispatcher.add_handler(LIST_WARN_HANDLER)
 dispatcher.add_handler(WARN_LIMIT_HANDLER)
 dispatcher.add_handler(WARN_MODE_HANDLER)
-dispatcher.add_handler(WARN_FILTER_HANDLER, WARN_HANDLER_GROUP)
+add_message_handlers([WARN_FILTER_HANDLER], WARN_HANDLER_GROUP)
 # dispatcher.add_handler(WARN_BTNSET_HANDLER)
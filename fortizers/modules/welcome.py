@@ -24,6 +24,8 @@ from fortizers.modules.helper_funcs.string_handling import markdown_parser, \
 from fortizers.modules.log_channel import loggable
 from fortizers.modules.languages import tl
 from fortizers.modules.helper_funcs.alternate import send_message, leave_chat
+# Registers /welcomeverify, /wtimeout, /wtmode and starts the verification timeout scheduler
+import fortizers.modules.helper_funcs.welcome_timeout
  
 OWNER_SPECIAL = False
 VALID_WELCOME_FORMATTERS = ['first', 'last', 'fullname', 'username', 'id', 'count', 'chatname', 'mention', 'rules']
@@ -16,9 +16,15 @@ class Config(object):
 
     # RECOMMENDED
     SQLALCHEMY_DATABASE_URI = 'sqldbtype://username:pw@hostname:port/db_name'  # needed for any database modules
+    DB_POOL_SIZE = 12  # Database connections kept open, enough for WORKERS + FANOUT_WORKERS
+    DB_MAX_OVERFLOW = 10  # Extra connections opened under load on top of DB_POOL_SIZE
+    DB_POOL_PRE_PING = True  # Check connections before use, so dropped ones are replaced instead of failing a query
+    DB_POOL_RECYCLE = 1800  # Seconds after which a connection is reopened
+    DB_STATEMENT_TIMEOUT = 0  # Milliseconds before postgres cancels a query, 0 to disable
     MESSAGE_DUMP = None  # needed to make sure 'save from' messages persist
     LOAD = []
     NO_LOAD = []
+    LAZY_MODULES = []  # Modules imported on their first command instead of at startup, see helper_funcs/lazy.py
     WEBHOOK = False
     URL = None
 
@@ -32,6 +38,8 @@ class Config(object):
     DEL_CMDS = False  # Whether or not you should delete "blue text must click" commands
     STRICT_GBAN = False
     WORKERS = 8  # Number of subthreads to use. This is the recommended amount - see for yourself what works best!
+    FANOUT_WORKERS = 4  # Parallel requests used when a fban/unfban is spread over all federation chats
+    MESSAGE_PIPELINE = False  # Run the per-message checks (locks, flood, gban, filters...) one after another in a single task
     BAN_STICKER = 'CAADAgADOwADPPEcAXkko5EB3YGYAg'  # banhammer marie sticker
     ALLOW_EXCL = False  # DEPRECATED, USE BELOW INSTEAD! Allow ! commands as well as /
     CUSTOM_CMD = False # Set to ('/', '!') or whatever to enable it, like ALLOW_EXCL but with more custom handler!
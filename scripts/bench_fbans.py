@@ -0,0 +1,80 @@
+"""
+Times fban_user and un_fban_user against federations holding 1k, 10k and 100k bans.
+
+The bans are written to the configured database under a federation id of their own, which is deleted again at the
+end, so the timings include the real database round trips. Both calls should cost about the same at every size.
+
+    python3 scripts/bench_fbans.py [--sizes 1000 10000 100000] [--calls 200]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(feds_sql, fed_id, start, stop, chunk_size=5000):
+    from fortizers.modules.sql import SESSION
+
+    for first in range(start, stop, chunk_size):
+        rows = [{'fed_id': fed_id, 'user_id': str(user_id), 'first_name': "Seeded", 'last_name': None,
+                 'user_name': None, 'reason': "bench", 'time': 0}
+                for user_id in range(first, min(first + chunk_size, stop))]
+        SESSION.execute(feds_sql.BansF.__table__.insert(), rows)
+    SESSION.commit()
+    SESSION.close()
+    # So the ban cache holds the seeded federation as well
+    getattr(feds_sql, "__load_all_feds_banned")()
+
+
+def time_calls(feds_sql, fed_id, first_user_id, calls):
+    bans, unbans = [], []
+    for user_id in range(first_user_id, first_user_id + calls):
+        start = time.perf_counter()
+        feds_sql.fban_user(fed_id, user_id, "Bench", None, None, "bench", 0)
+        bans.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        feds_sql.un_fban_user(fed_id, user_id)
+        unbans.append(time.perf_counter() - start)
+    return bans, unbans
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * percent // 100)]
+
+
+def main():
+    sys.path.insert(0, ROOT)
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="bans in the federation")
+    parser.add_argument("--calls", type=int, default=200, help="bans and unbans timed per size")
+    args = parser.parse_args()
+
+    from fortizers.modules.sql import SESSION, feds_sql
+
+    fed_id = "bench-" + uuid.uuid4().hex
+    # The timed users come after every seeded one, so they are never banned yet
+    first_user_id = max(args.sizes) + 1
+    seeded = 0
+    print("{:>8} {:>14} {:>14} {:>16} {:>16}".format("bans", "fban ms med", "fban ms p95", "unfban ms med",
+                                                      "unfban ms p95"))
+    try:
+        for size in sorted(args.sizes):
+            seed(feds_sql, fed_id, seeded, size)
+            seeded = size
+            bans, unbans = time_calls(feds_sql, fed_id, first_user_id, args.calls)
+            print("{:>8} {:>14.3f} {:>14.3f} {:>16.3f} {:>16.3f}".format(
+                size, statistics.median(bans) * 1000, percentile(bans, 95) * 1000,
+                statistics.median(unbans) * 1000, percentile(unbans, 95) * 1000))
+    finally:
+        SESSION.query(feds_sql.BansF).filter(feds_sql.BansF.fed_id == fed_id).delete(synchronize_session=False)
+        SESSION.commit()
+        SESSION.close()
+
+
+if __name__ == '__main__':
+    main()
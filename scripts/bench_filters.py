@@ -0,0 +1,81 @@
+"""
+Times cust_filters_sql.match_filter against the per-keyword regex loop reply_filter used before, for chats with 10,
+100 and 1000 filters.
+
+The filters only live in the keyword cache of a made up chat, nothing is written to the database. Every message is
+checked with both and they have to pick the same keyword. Any configured database will do, an in-memory sqlite one
+(DATABASE_URL=sqlite://) as well.
+
+    python3 scripts/bench_filters.py [--sizes 10 100 1000] [--number 20]
+"""
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHAT_ID = "-1000000000000"
+
+
+def old_match_filter(chat_filters, to_match):
+    # The loop reply_filter ran before match_filter, the keywords are sorted longest first
+    for keyword in chat_filters:
+        pattern = r"( |^|[^\w])" + re.escape(keyword) + r"( |$|[^\w])"
+        if re.search(pattern, to_match, flags=re.IGNORECASE):
+            return keyword
+    return None
+
+
+def random_word(rand):
+    return "".join(rand.choice(string.ascii_lowercase) for _ in range(rand.randint(3, 10)))
+
+
+def messages(rand, keywords):
+    chatter = " ".join(random_word(rand) for _ in range(25))
+    return {
+        "no match": chatter,
+        "match": chatter + " " + rand.choice(keywords).upper() + "!",
+        "several": " ".join(rand.sample(keywords, min(3, len(keywords)))) + " " + chatter,
+    }
+
+
+def main():
+    sys.path.insert(0, ROOT)
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="filters in the chat")
+    parser.add_argument("--number", type=int, default=20,
+                        help="calls timed per message, the best of three runs is kept")
+    args = parser.parse_args()
+
+    from fortizers.modules.sql import cust_filters_sql as sql
+
+    rand = random.Random(0)
+    print("{:>8} {:>10} {:>12} {:>12} {:>9}".format("filters", "message", "old us", "new us", "speedup"))
+    for size in args.sizes:
+        keywords = set()
+        while len(keywords) < size:
+            keywords.add(" ".join(random_word(rand) for _ in range(rand.randint(1, 2))))
+        keywords = sorted(keywords, key=lambda x: (-len(x), x))
+        sql.CHAT_FILTERS[CHAT_ID] = keywords
+        sql.CHAT_FILTER_MATCHERS.pop(CHAT_ID, None)
+
+        for name, text in messages(rand, keywords).items():
+            expected = old_match_filter(keywords, text)
+            found = sql.match_filter(CHAT_ID, text)
+            if found != expected:
+                sys.exit("match_filter found {!r} where the old loop found {!r}".format(found, expected))
+            old = min(timeit.repeat(lambda: old_match_filter(keywords, text), number=args.number, repeat=3))
+            new = min(timeit.repeat(lambda: sql.match_filter(CHAT_ID, text), number=args.number, repeat=3))
+            print("{:>8} {:>10} {:>12.1f} {:>12.1f} {:>8.1f}x".format(
+                size, name, old / args.number * 1e6, new / args.number * 1e6, old / new))
+
+    sql.CHAT_FILTERS.pop(CHAT_ID, None)
+    sql.CHAT_FILTER_MATCHERS.pop(CHAT_ID, None)
+
+
+if __name__ == '__main__':
+    main()
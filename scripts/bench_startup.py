@@ -0,0 +1,68 @@
+"""
+Compares the startup of the bot with and without lazily loaded modules.
+
+Every run imports fortizers.__main__, which imports or stubs all the modules, and then runs load_caches() like
+starting the bot does, in a fresh python process. It reports how long that took and the peak memory of the process.
+The bot is configured as usual (config.py or ENV), only the list of lazy modules is replaced. Importing the modules
+asks telegram for the bot's own user, so the token has to be a real one.
+
+    python3 scripts/bench_startup.py [--runs 5] [--lazy android memes ...]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, resource, sys, time
+start = time.perf_counter()
+import fortizers
+fortizers.LAZY_MODULES[:] = sys.argv[1:]
+import fortizers.__main__
+# Only called when __main__ runs as a script, the caches are part of the startup all the same
+fortizers.__main__.load_caches()
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+"""
+
+
+def run_once(lazy):
+    child = subprocess.run([sys.executable, "-c", CHILD] + lazy, cwd=ROOT,
+                           stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if child.returncode:
+        sys.exit(child.stderr)
+    # Modules may print while being imported, the result is the last line
+    return json.loads(child.stdout.strip().splitlines()[-1])
+
+
+def bench(lazy, runs):
+    results = [run_once(lazy) for _ in range(runs)]
+    return (statistics.median(x['seconds'] for x in results),
+            statistics.median(x['maxrss_kb'] for x in results))
+
+
+def main():
+    sys.path.insert(0, ROOT)
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="processes started per case, the median is reported")
+    parser.add_argument("--lazy", nargs="+", help="modules to load lazily, all those with a manifest by default")
+    args = parser.parse_args()
+
+    lazy = args.lazy
+    if lazy is None:
+        from fortizers.modules.helper_funcs.lazy import MANIFEST
+        lazy = sorted(MANIFEST)
+
+    print("{:<8} {:>10} {:>14}".format("", "import s", "max rss MiB"))
+    for name, modules in (("eager", []), ("lazy", lazy)):
+        seconds, maxrss = bench(modules, args.runs)
+        print("{:<8} {:>10.3f} {:>14.1f}".format(name, seconds, maxrss / 1024))
+    print("lazy modules: " + " ".join(lazy))
+
+
+if __name__ == '__main__':
+    main()
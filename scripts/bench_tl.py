@@ -0,0 +1,54 @@
+"""
+Measures how many tl() calls per second a single thread can make.
+
+The chats only get their language in the in-memory cache, nothing is written to the database.
+
+    python3 scripts/bench_tl.py [--number 100000]
+"""
+import argparse
+import os
+import sys
+import timeit
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EN_CHAT_ID = -1000000000001
+ID_CHAT_ID = -1000000000002
+
+
+def fake_message(chat_id):
+    return SimpleNamespace(chat=SimpleNamespace(id=chat_id), from_user=SimpleNamespace(language_code="en"))
+
+
+def main():
+    sys.path.insert(0, ROOT)
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=100000, help="calls per case, best of five runs")
+    args = parser.parse_args()
+
+    from fortizers.modules.languages import tl, LANG_TABLES
+    from fortizers.modules.sql import languages_sql
+
+    for chat_id, lang in ((EN_CHAT_ID, 'en'), (ID_CHAT_ID, 'id')):
+        languages_sql.GLOBAL_USERLANG[str(chat_id)] = lang
+        languages_sql.USERLANG_BY_ID[chat_id] = lang
+
+    # Any string english has a translation for
+    text = next(iter(LANG_TABLES['en']))
+    cases = (
+        ("message, en", fake_message(EN_CHAT_ID), text),
+        ("message, id", fake_message(ID_CHAT_ID), text),
+        ("chat id, en", EN_CHAT_ID, text),
+        ("str chat id, en", str(EN_CHAT_ID), text),
+        ("string list, en", fake_message(EN_CHAT_ID), "RUN_STRINGS"),
+    )
+
+    print("{:<18} {:>14} {:>10}".format("", "calls/s", "ns/call"))
+    for name, message, text in cases:
+        best = min(timeit.repeat(lambda: tl(message, text), number=args.number, repeat=5))
+        print("{:<18} {:>14,.0f} {:>10.0f}".format(name, args.number / best, best / args.number * 1e9))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+import os
+import sys
+
+# The bot reads its config from the environment when ENV is set, a made up token is enough to import the modules.
+# DATABASE_URL can point to a postgres database, otherwise the tests run on an in-memory sqlite one.
+os.environ.setdefault("ENV", "1")
+os.environ.setdefault("TOKEN", "123456:TEST")
+os.environ.setdefault("OWNER_ID", "1")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from telegram import User
+
+    from fortizers import dispatcher
+except ImportError:
+    pass
+else:
+    # users_sql asks for the bot's own id at import, answer it without calling telegram
+    dispatcher.bot.bot = User(int(os.environ["TOKEN"].split(":")[0]), "Test", True, username="test_bot")
+    dispatcher.bot._commands = []
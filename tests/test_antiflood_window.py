@@ -0,0 +1,32 @@
+"""
+The chat-wide flood limit has to report everyone who posted in the burst, not only whoever sent the last message.
+"""
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from fortizers.modules.sql import antiflood_sql as sql
+
+
+@pytest.fixture
+def window(monkeypatch):
+    chat_id = -1000000000016
+    monkeypatch.setitem(sql.CHAT_FLOOD_WINDOWS, chat_id, sql.FloodWindowState(3, 10, 5))
+    return chat_id
+
+
+def test_user_over_own_limit(window):
+    results = [sql.update_flood_window(window, 1) for _ in range(3)]
+    assert results == [(False, set()), (False, set()), (True, set())]
+
+
+def test_chat_burst_returns_every_sender(window):
+    results = [sql.update_flood_window(window, user_id) for user_id in (1, 2, 3, 1, 2)]
+    assert results[:-1] == [(False, set())] * 4
+    assert results[-1] == (False, {1, 2, 3})
+    # The burst was handled, the next message starts a new one
+    assert sql.update_flood_window(window, 4) == (False, set())
+
+
+def test_no_window_configured():
+    assert sql.update_flood_window(-1000000000017, 1) == (False, set())
@@ -0,0 +1,43 @@
+"""
+A flood wait from telegram holds for the whole bot, so every fan-out worker has to back off, not just the one that got it.
+"""
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("telegram")
+
+from telegram.error import RetryAfter
+
+from fortizers.modules.helper_funcs import fanout
+
+
+def test_pause_delays_every_key():
+    limiter = fanout.RateLimiter(1000, 0)
+    limiter.pause(0.2)
+    start = time.monotonic()
+    limiter.wait("other chat")
+    assert time.monotonic() - start >= 0.19
+
+
+def test_retry_after_pauses_all_workers(monkeypatch):
+    monkeypatch.setattr(fanout, "LIMITER", fanout.RateLimiter(1000, 0))
+    flood_waited = threading.Event()
+    calls = {}
+
+    def action(chat_id):
+        if chat_id == "1" and not flood_waited.is_set():
+            flood_waited.set()
+            raise RetryAfter(0.3)
+        # Hold the other workers back until the flood wait was reported
+        flood_waited.wait(1)
+        calls[chat_id] = time.monotonic()
+
+    start = time.monotonic()
+    job = fanout.FanoutJob("test", range(1, 9), action)
+    job.run()
+
+    assert job.success == 8 and job.retried == 1
+    # Only the calls already past the limiter may run before the pause ends
+    assert sum(1 for x in calls.values() if x - start < 0.25) < fanout.FANOUT_WORKERS
@@ -0,0 +1,71 @@
+"""
+Fban imports can take a while, bans in other federations must not wait for them.
+"""
+import threading
+import uuid
+
+import pytest
+
+pytest.importorskip("telegram")
+pytest.importorskip("sqlalchemy")
+
+from fortizers.modules.sql import feds_sql
+
+
+def lock_is_free():
+    acquired = []
+
+    def try_lock():
+        if feds_sql.FEDS_LOCK.acquire(timeout=1):
+            acquired.append(True)
+            feds_sql.FEDS_LOCK.release()
+
+    # From another thread, the RLock would always be free for the importing one
+    thread = threading.Thread(target=try_lock)
+    thread.start()
+    thread.join()
+    return bool(acquired)
+
+
+def test_import_does_not_hold_feds_lock():
+    fed_id = uuid.uuid4().hex
+    free_during_progress = []
+    bans = ((user_id, "User", None, None, "spam") for user_id in range(1, 26))
+
+    added = feds_sql.bulk_fban_user(fed_id, bans, chunk_size=10,
+                                    progress=lambda count: free_during_progress.append(lock_is_free()))
+
+    assert added == 25
+    assert free_during_progress == [True, True, True]
+    assert feds_sql.get_all_fban_users(fed_id) == set(range(1, 26))
+
+
+def test_import_counts_only_new_bans():
+    fed_id = uuid.uuid4().hex
+    feds_sql.fban_user(fed_id, 1, "User", None, None, "spam", 0)
+
+    added = feds_sql.bulk_fban_user(fed_id, [(1, "User", None, None, "other"), (2, "User", None, None, "spam")])
+
+    assert added == 1
+    assert feds_sql.get_fban_user(fed_id, 1) == (True, "other", 0)
+
+
+def test_reload_keeps_ban_patched_during_read(monkeypatch):
+    fed_id = uuid.uuid4().hex
+    feds_sql.fban_user(fed_id, 1, "User", None, None, "spam", 0)
+    query = getattr(feds_sql, "__query_fed_banned")
+    reads = []
+
+    def query_then_ban(fed):
+        rows = query(fed)
+        if not reads:
+            # Banned after the rows were read, but before the cache is swapped
+            feds_sql.fban_user(fed_id, 2, "User", None, None, "spam", 0)
+        reads.append(rows)
+        return rows
+
+    monkeypatch.setattr(feds_sql, "__query_fed_banned", query_then_ban)
+    getattr(feds_sql, "__load_fed_banned")(fed_id)
+
+    assert len(reads) == 2
+    assert feds_sql.get_all_fban_users(fed_id) == {1, 2}
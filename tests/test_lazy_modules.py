@@ -0,0 +1,74 @@
+"""
+Lazy modules have to answer their commands exactly once, however often the module loop of __main__ runs.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("telegram")
+
+from telegram import Update
+from telegram.ext import CommandHandler
+
+from fortizers import dispatcher
+from fortizers.modules.helper_funcs import lazy
+
+MODULE = "lazy_test_module"
+
+
+@pytest.fixture
+def fake_lazy_module(monkeypatch):
+    calls = []
+    handlers = []
+
+    def import_module(name):
+        # What importing the real module does, register its handlers
+        handler = CommandHandler("lazytest", lambda update, context: calls.append(update))
+        dispatcher.add_handler(handler)
+        handlers.append(handler)
+        return SimpleNamespace(__name__=name)
+
+    monkeypatch.setitem(lazy.MANIFEST, MODULE, {'mod_name': "Lazy test", 'commands': ["lazytest"]})
+    monkeypatch.setattr(lazy, "LAZY_MODULES", [MODULE])
+    monkeypatch.setattr(lazy, "importlib", SimpleNamespace(import_module=import_module))
+    yield calls
+    for handler in handlers + lazy.STUBS.pop(MODULE, []):
+        if handler in dispatcher.handlers.get(lazy.STUB_GROUP, []):
+            dispatcher.remove_handler(handler, lazy.STUB_GROUP)
+    lazy.LOADED.pop(MODULE, None)
+    lazy.PLACEHOLDERS.pop(MODULE, None)
+
+
+def module_stubs():
+    return [x for x in dispatcher.handlers.get(lazy.STUB_GROUP, []) if lazy.is_stub(x) and x.callback.args == (MODULE,)]
+
+
+def command_update(text):
+    return Update.de_json({
+        'update_id': 1,
+        'message': {
+            'message_id': 1, 'date': 0, 'text': text,
+            'chat': {'id': 1, 'type': 'private'},
+            'from': {'id': 2, 'is_bot': False, 'first_name': "Test"},
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text)}],
+        },
+    }, dispatcher.bot)
+
+
+def test_second_module_loop_keeps_the_first_stubs(fake_lazy_module):
+    first = lazy.lazy_module(MODULE)
+    second = lazy.lazy_module(MODULE)
+    assert first is second
+    assert len(module_stubs()) == 1
+
+
+def test_command_reaches_module_once(fake_lazy_module):
+    lazy.lazy_module(MODULE)
+    lazy.lazy_module(MODULE)
+
+    dispatcher.process_update(command_update("/lazytest"))
+    assert len(fake_lazy_module) == 1
+    assert not module_stubs()
+
+    dispatcher.process_update(command_update("/lazytest"))
+    assert len(fake_lazy_module) == 2
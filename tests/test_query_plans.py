@@ -0,0 +1,87 @@
+"""
+The hot lookups have to be answered through their index, never by reading the whole table.
+Each test runs the real sql function, records the SELECTs it sends and checks their EXPLAIN output.
+"""
+import re
+
+import pytest
+
+pytest.importorskip("telegram")
+pytest.importorskip("sqlalchemy")
+
+from sqlalchemy import event
+
+from fortizers.modules.sql import SESSION
+from fortizers.modules.sql import users_sql, warns_sql, cust_filters_sql, welcome_sql
+
+ENGINE = SESSION.get_bind()
+IS_SQLITE = ENGINE.dialect.name == "sqlite"
+
+
+def recorded_selects(call):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(ENGINE, "before_cursor_execute", record)
+    try:
+        call()
+    finally:
+        event.remove(ENGINE, "before_cursor_execute", record)
+    assert statements, "nothing was queried"
+    return statements
+
+
+def query_plans(call):
+    plans = []
+    raw = ENGINE.raw_connection()
+    try:
+        cursor = raw.cursor()
+        if not IS_SQLITE:
+            # Tables are nearly empty here, without this postgres would rather read them whole
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        for statement, parameters in recorded_selects(call):
+            cursor.execute(("EXPLAIN QUERY PLAN " if IS_SQLITE else "EXPLAIN ") + statement, parameters)
+            plans.append([str(row[-1]) for row in cursor.fetchall()])
+        raw.rollback()
+    finally:
+        raw.close()
+    return plans
+
+
+def assert_no_table_scan(plans, table, index_order=False):
+    for plan in plans:
+        text = "\n".join(plan)
+        if IS_SQLITE:
+            full_scans = [x for x in plan if re.match(r"SCAN (TABLE )?{}\b".format(table), x) and " USING " not in x]
+            assert not full_scans, text
+            if index_order:
+                assert "USE TEMP B-TREE FOR ORDER BY" not in text, text
+        else:
+            assert "Seq Scan on {}".format(table) not in text, text
+            if index_order:
+                assert not re.search(r"^\s*(->\s*)?Sort\b", text, re.M), text
+    assert any(table in "\n".join(plan) for plan in plans), "{} was never queried".format(table)
+
+
+def test_user_num_chats_uses_user_index():
+    assert_no_table_scan(query_plans(lambda: users_sql.get_user_num_chats(1)), "chat_members")
+
+
+def test_userid_by_name_uses_lower_username_index():
+    assert_no_table_scan(query_plans(lambda: users_sql.get_userid_by_name("SomeOne")), "users")
+
+
+def test_allwarns_uses_chat_id_index():
+    assert_no_table_scan(query_plans(lambda: list(warns_sql.get_allwarns(-100))), "warns")
+
+
+def test_filter_buttons_use_chat_id_keyword_index():
+    assert_no_table_scan(query_plans(lambda: cust_filters_sql.get_buttons(-100, "hello")), "cust_filter_urls")
+
+
+def test_welcome_timeouts_are_read_in_index_order():
+    load_timeouts = getattr(welcome_sql, "__load_chat_timeout")
+    assert_no_table_scan(query_plans(load_timeouts), "welcome_timeout", index_order=True)
@@ -0,0 +1,57 @@
+"""
+The warn settings are served from WARN_SETTINGS, which must only ever hold what the database committed.
+"""
+import pytest
+
+pytest.importorskip("telegram")
+pytest.importorskip("sqlalchemy")
+
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+
+from fortizers.modules.sql import SESSION
+from fortizers.modules.sql import warns_sql
+
+CHAT_ID = -1000000000100
+
+
+def failing_commits():
+    def fail(session):
+        raise SQLAlchemyError("commit failed")
+
+    event.listen(SESSION, "before_commit", fail)
+    return lambda: event.remove(SESSION, "before_commit", fail)
+
+
+def stored_setting():
+    setting = SESSION.query(warns_sql.WarnSettings).get(str(CHAT_ID))
+    SESSION.close()
+    return setting and (setting.warn_limit, setting.soft_warn, setting.warn_mode)
+
+
+def test_settings_are_cached_after_commit():
+    warns_sql.set_warn_limit(CHAT_ID, 5)
+    warns_sql.set_warn_strength(CHAT_ID, True)
+    warns_sql.set_warn_mode(CHAT_ID, 2)
+    assert warns_sql.get_warn_setting(CHAT_ID) == (5, True, 2)
+    assert stored_setting() == (5, True, 2)
+
+
+@pytest.mark.parametrize("setter, value", [
+    (warns_sql.set_warn_limit, 10),
+    (warns_sql.set_warn_strength, False),
+    (warns_sql.set_warn_mode, 3),
+])
+def test_failed_commit_keeps_cached_setting(setter, value):
+    warns_sql.set_warn_limit(CHAT_ID, 4)
+    before = warns_sql.get_warn_setting(CHAT_ID)
+
+    restore = failing_commits()
+    try:
+        with pytest.raises(SQLAlchemyError):
+            setter(CHAT_ID, value)
+    finally:
+        restore()
+
+    assert warns_sql.get_warn_setting(CHAT_ID) == before
+    assert stored_setting() == before